@@ -7,7 +7,7 @@ main_bp = Blueprint("main", __name__)
 @main_bp.route('/')
 def main_page():
     device_config = current_app.config['DEVICE_CONFIG']
-    return render_template('inky.html', config=device_config.get_config(), plugins=device_config.get_plugins())
+    return render_template('inky.html', config=device_config.get_snapshot().config, plugins=device_config.get_plugins())
 
 @main_bp.route('/api/current_image')
 def get_current_image():
@@ -33,10 +33,6 @@ def add_plugin():
         if not refresh_type or refresh_type not in ["interval", "scheduled"]:
             return jsonify({"error": "Refresh type is required"}), 400
 
-        existing = playlist_manager.find_plugin(plugin_id, instance_name)
-        if existing:
-            return jsonify({"error": f"Plugin instance '{instance_name}' already exists"}), 400
-
         if refresh_type == "interval":
             unit, interval = refresh_settings.get('unit'), refresh_settings.get("interval")
             if not unit or unit not in ["minute", "hour", "day"]:
@@ -58,11 +54,16 @@ def add_plugin():
             "plugin_settings": plugin_settings,
             "name": instance_name
         }
-        result = playlist_manager.add_plugin_to_playlist(playlist, plugin_dict)
-        if not result:
-            return jsonify({"error": "Failed to add to playlist"}), 500
-
-        device_config.write_config()
+        with device_config.writer():
+            # checked under the writer lock, so two requests can't both add the same instance
+            if playlist_manager.find_plugin(plugin_id, instance_name):
+                return jsonify({"error": f"Plugin instance '{instance_name}' already exists"}), 400
+            result = playlist_manager.add_plugin_to_playlist(playlist, plugin_dict)
+            if not result:
+                return jsonify({"error": "Failed to add to playlist"}), 500
+
+            device_config.write_config()
+        refresh_task.signal_config_change()
     except Exception as e:
         return jsonify({"error": f"An error occurred: {str(e)}"}), 500
     return jsonify({"success": True, "message": "Scheduled refresh configured."})
@@ -70,18 +71,18 @@ def add_plugin():
 @playlist_bp.route('/playlist')
 def playlists():
     device_config = current_app.config['DEVICE_CONFIG']
-    playlist_manager = device_config.get_playlist_manager()
-    refresh_info = device_config.get_refresh_info()
+    snapshot = device_config.get_snapshot()
 
     return render_template(
         'playlist.html',
-        playlist_config=playlist_manager.to_dict(),
-        refresh_info=refresh_info.to_dict()
+        playlist_config=snapshot.playlist_config,
+        refresh_info=snapshot.refresh_info
     )
 
 @playlist_bp.route('/create_playlist', methods=['POST'])
 def create_playlist():
     device_config = current_app.config['DEVICE_CONFIG']
+    refresh_task = current_app.config['REFRESH_TASK']
     playlist_manager = device_config.get_playlist_manager()
 
     data = request.json
@@ -95,16 +96,19 @@ def create_playlist():
         return jsonify({"error": "Start time and End time are required"}), 400
 
     try:
-        playlist = playlist_manager.get_playlist(playlist_name)
-        if playlist:
-            return jsonify({"error": f"Playlist with name '{playlist_name}' already exists"}), 400
+        with device_config.writer():
+            playlist = playlist_manager.get_playlist(playlist_name)
+            if playlist:
+                return jsonify({"error": f"Playlist with name '{playlist_name}' already exists"}), 400
 
-        result = playlist_manager.add_playlist(playlist_name, start_time, end_time)
-        if not result:
-            return jsonify({"error": "Failed to create playlist"}), 500
+            result = playlist_manager.add_playlist(playlist_name, start_time, end_time)
+            if not result:
+                return jsonify({"error": "Failed to create playlist"}), 500
 
-        # save changes to device config file
-        device_config.write_config()
+            # save changes to device config file
+            device_config.write_config()
+        # wake the background thread so it reschedules around the new playlist window
+        refresh_task.signal_config_change()
 
     except Exception as e:
         logger.exception("EXCEPTION CAUGHT: " + str(e))
@@ -116,6 +120,7 @@ def create_playlist():
 @playlist_bp.route('/update_playlist/<string:playlist_name>', methods=['PUT'])
 def update_playlist(playlist_name):
     device_config = current_app.config['DEVICE_CONFIG']
+    refresh_task = current_app.config['REFRESH_TASK']
     playlist_manager = device_config.get_playlist_manager()
 
     data = request.get_json()
@@ -126,34 +131,49 @@ def update_playlist(playlist_name):
     if not new_name or not start_time or not end_time:
         return jsonify({"success": False, "error": "Missing required fields"}), 400
     
-    playlist = playlist_manager.get_playlist(playlist_name)
-    if not playlist:
-        return jsonify({"error": f"Playlist '{playlist_name}' does not exist"}), 400
+    with device_config.writer():
+        playlist = playlist_manager.get_playlist(playlist_name)
+        if not playlist:
+            return jsonify({"error": f"Playlist '{playlist_name}' does not exist"}), 400
 
-    result = playlist_manager.update_playlist(playlist_name, new_name, start_time, end_time)
-    if not result:
-        return jsonify({"error": "Failed to delete playlist"}), 500
-    device_config.write_config()
+        result = playlist_manager.update_playlist(playlist_name, new_name, start_time, end_time)
+        if not result:
+            return jsonify({"error": "Failed to delete playlist"}), 500
+        device_config.write_config()
+    refresh_task.signal_config_change()
 
     return jsonify({"success": True, "message": f"Updated playlist '{playlist_name}'!"})
 
 @playlist_bp.route('/delete_playlist/<string:playlist_name>', methods=['DELETE'])
 def delete_playlist(playlist_name):
     device_config = current_app.config['DEVICE_CONFIG']
+    refresh_task = current_app.config['REFRESH_TASK']
     playlist_manager = device_config.get_playlist_manager()
 
     if not playlist_name:
         return jsonify({"error": f"Playlist name is required"}), 400
     
-    playlist = playlist_manager.get_playlist(playlist_name)
-    if not playlist:
-        return jsonify({"error": f"Playlist '{playlist_name}' does not exist"}), 400
+    with device_config.writer():
+        playlist = playlist_manager.get_playlist(playlist_name)
+        if not playlist:
+            return jsonify({"error": f"Playlist '{playlist_name}' does not exist"}), 400
 
-    playlist_manager.delete_playlist(playlist_name)
-    device_config.write_config()
+        playlist_manager.delete_playlist(playlist_name)
+        device_config.write_config()
+    refresh_task.signal_config_change()
 
     return jsonify({"success": True, "message": f"Deleted playlist '{playlist_name}'!"})
 
+@playlist_bp.route('/api/schedule')
+def get_schedule():
+    """Lists the upcoming display refresh, playlist transitions and plugin instance refreshes."""
+    refresh_task = current_app.config['REFRESH_TASK']
+    try:
+        return jsonify(refresh_task.get_schedule())
+    except Exception as e:
+        logger.exception("EXCEPTION CAUGHT: " + str(e))
+        return jsonify({"error": f"An error occurred: {str(e)}"}), 500
+
 @playlist_bp.app_template_filter('format_relative_time')
 def format_relative_time(iso_date_string):
     # Parse the input ISO date string
@@ -2,6 +2,7 @@ from flask import Blueprint, request, jsonify, current_app, render_template, sen
 from plugins.plugin_registry import get_plugin_instance
 from utils.app_utils import resolve_path, handle_request_files, parse_form
 from refresh_task import ManualRefresh, PlaylistRefresh
+import copy
 import json
 import os
 import logging
@@ -23,18 +24,20 @@ def plugin_page(plugin_id):
             plugin = get_plugin_instance(plugin_config)
             template_params = plugin.generate_settings_template()
 
-            # retrieve plugin instance from the query parameters if updating existing plugin instance
-            plugin_instance_name = request.args.get('instance')
-            if plugin_instance_name:
-                plugin_instance = playlist_manager.find_plugin(plugin_id, plugin_instance_name)
-                if not plugin_instance:
-                    return jsonify({"error": f"Plugin instance: {plugin_instance_name} does not exist"}), 500
+            # the refresh thread updates the playlists and instance settings, read them under the config lock
+            with device_config.lock:
+                # retrieve plugin instance from the query parameters if updating existing plugin instance
+                plugin_instance_name = request.args.get('instance')
+                if plugin_instance_name:
+                    plugin_instance = playlist_manager.find_plugin(plugin_id, plugin_instance_name)
+                    if not plugin_instance:
+                        return jsonify({"error": f"Plugin instance: {plugin_instance_name} does not exist"}), 500
 
-                # add plugin instance settings to the template to prepopulate
-                template_params["plugin_settings"] = plugin_instance.settings
-                template_params["plugin_instance"] = plugin_instance_name
+                    # add plugin instance settings to the template to prepopulate
+                    template_params["plugin_settings"] = copy.deepcopy(plugin_instance.settings)
+                    template_params["plugin_instance"] = plugin_instance_name
 
-            template_params["playlists"] = playlist_manager.get_playlist_names()
+                template_params["playlists"] = playlist_manager.get_playlist_names()
         except Exception as e:
             logger.exception("EXCEPTION CAUGHT: " + str(e))
             return jsonify({"error": f"An error occurred: {str(e)}"}), 500
@@ -73,6 +76,7 @@ def image(plugin_id, filename):
 @plugin_bp.route('/delete_plugin_instance', methods=['POST'])
 def delete_plugin_instance():
     device_config = current_app.config['DEVICE_CONFIG']
+    refresh_task = current_app.config['REFRESH_TASK']
     playlist_manager = device_config.get_playlist_manager()
 
     data = request.json
@@ -81,16 +85,18 @@ def delete_plugin_instance():
     plugin_instance = data.get("plugin_instance")
 
     try:
-        playlist = playlist_manager.get_playlist(playlist_name)
-        if not playlist:
-            return jsonify({"success": False, "message": "Playlist not found"}), 400
+        with device_config.writer():
+            playlist = playlist_manager.get_playlist(playlist_name)
+            if not playlist:
+                return jsonify({"success": False, "message": "Playlist not found"}), 400
 
-        result = playlist.delete_plugin(plugin_id, plugin_instance)
-        if not result:
-            return jsonify({"success": False, "message": "Plugin instance not found"}), 400
+            result = playlist.delete_plugin(plugin_id, plugin_instance)
+            if not result:
+                return jsonify({"success": False, "message": "Plugin instance not found"}), 400
 
-        # save changes to device config file
-        device_config.write_config()
+            # save changes to device config file
+            device_config.write_config()
+        refresh_task.signal_config_change()
 
     except Exception as e:
         logger.exception("EXCEPTION CAUGHT: " + str(e))
@@ -101,6 +107,7 @@ def delete_plugin_instance():
 @plugin_bp.route('/update_plugin_instance/<string:instance_name>', methods=['PUT'])
 def update_plugin_instance(instance_name):
     device_config = current_app.config['DEVICE_CONFIG']
+    refresh_task = current_app.config['REFRESH_TASK']
     playlist_manager = device_config.get_playlist_manager()
 
     try:
@@ -112,12 +119,20 @@ def update_plugin_instance(instance_name):
         plugin_settings.update(handle_request_files(request.files, request.form))
 
         plugin_id = plugin_settings.pop("plugin_id")
-        plugin_instance = playlist_manager.find_plugin(plugin_id, instance_name)
-        if not plugin_instance:
-            return jsonify({"error": f"Plugin instance: {instance_name} does not exist"}), 500
-
-        plugin_instance.settings = plugin_settings
-        device_config.write_config()
+        with device_config.writer():
+            plugin_instance = playlist_manager.find_plugin(plugin_id, instance_name)
+            if not plugin_instance:
+                return jsonify({"error": f"Plugin instance: {instance_name} does not exist"}), 500
+
+            plugin_instance.settings = plugin_settings
+            plugin_instance.runtime_settings = set()
+            # output declared valid by the plugin no longer matches the new settings, and the new settings may
+            # fix whatever made previous refreshes fail
+            plugin_instance.valid_until = None
+            plugin_instance.failure_count = 0
+            plugin_instance.breaker_open_until = None
+            device_config.write_config()
+        refresh_task.signal_config_change()
     except Exception as e:
         return jsonify({"error": f"An error occurred: {str(e)}"}), 500
     return jsonify({"success": True, "message": f"Updated plugin instance {instance_name}."})
@@ -134,11 +149,12 @@ def display_plugin_instance():
     plugin_instance_name = data.get("plugin_instance")
 
     try:
-        playlist = playlist_manager.get_playlist(playlist_name)
+        # looked up under the config lock, the refresh itself runs without it on the refresh thread
+        with device_config.lock:
+            playlist = playlist_manager.get_playlist(playlist_name)
+            plugin_instance = playlist.find_plugin(plugin_id, plugin_instance_name) if playlist else None
         if not playlist:
             return jsonify({"success": False, "message": f"Playlist {playlist_name} not found"}), 400
-
-        plugin_instance = playlist.find_plugin(plugin_id, plugin_instance_name)
         if not plugin_instance:
             return jsonify({"success": False, "message": f"Plugin instance '{plugin_instance_name}' not found"}), 400
 
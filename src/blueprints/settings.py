@@ -5,7 +5,12 @@ import os
 import pytz
 import logging
 import io
-import requests
+import threading
+from utils.http_client import get_http_client
+from utils.connectivity import get_connectivity_monitor
+from utils.data_cache import get_data_cache
+from utils.quota import get_quota_manager
+from plugins.plugin_registry import PLUGIN_CLASSES
 
 # Try to import cysystemd for journal reading (Linux only)
 try:
@@ -31,17 +36,28 @@ def get_device_config():
     """Get device configuration including default location."""
     device_config = current_app.config['DEVICE_CONFIG']
     try:
-        config = device_config.get_config()  # 返回整个config
+        config = device_config.get_snapshot().config  # 返回整个config
         return jsonify(config)
     except Exception as e:
         logger.error(f"Error getting device config: {e}")
         return jsonify({"error": str(e)}), 500
 
+@settings_bp.route('/api/network_stats', methods=['GET'])
+def get_network_stats():
+    """Get per-host request counts, latency and bytes received by the shared HTTP client, plugin data cache hits and
+    connectivity status."""
+    return jsonify({
+        "hosts": get_http_client().get_stats(),
+        "data_cache": get_data_cache().get_stats(),
+        "connectivity": get_connectivity_monitor().get_status()
+    })
+
 @settings_bp.route('/settings')
 def settings_page():
     device_config = current_app.config['DEVICE_CONFIG']
     timezones = sorted(pytz.all_timezones_set)
-    return render_template('settings.html', device_settings=device_config.get_config(), timezones = timezones)
+    quotas = get_quota_manager().get_status()
+    return render_template('settings.html', device_settings=device_config.get_snapshot().config, timezones = timezones, quotas=quotas)
 
 @settings_bp.route('/save_settings', methods=['POST'])
 def save_settings():
@@ -174,7 +190,7 @@ def get_ip_location():
             "output": "json"
         }
 
-        response = requests.get(url, params=params, timeout=10)
+        response = get_http_client().get(url, params=params, timeout=10)
 
         if response.status_code != 200:
             logger.error(f"Amap API request failed: {response.status_code}")
@@ -218,6 +234,13 @@ def get_ip_location():
         logger.error(f"Error getting IP location: {e}")
         return jsonify({"error": str(e)}), 500
 
+def prefetch_location(device_config, lat, lng):
+    for plugin in PLUGIN_CLASSES.values():
+        try:
+            plugin.prefetch_location(device_config, lat, lng)
+        except Exception as e:
+            logger.warning(f"Failed to prefetch location data for {plugin.get_plugin_id()}: {e}")
+
 @settings_bp.route('/api/amap/save_default_location', methods=['POST'])
 def save_default_location():
     """Save latitude and longitude as default values in device config."""
@@ -248,6 +271,9 @@ def save_default_location():
             }
         })
 
+        # resolve place names for the new location ahead of the next weather refresh
+        threading.Thread(target=prefetch_location, args=(device_config, lat, lng), daemon=True).start()
+
         return jsonify({
             "success": True,
             "message": "Default location saved successfully",
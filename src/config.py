@@ -1,12 +1,27 @@
 import os
+import copy
 import json
 import logging
+import threading
+from collections import namedtuple
+from contextlib import contextmanager
 from dotenv import load_dotenv
 from model import PlaylistManager, RefreshInfo
+from runtime_state import RuntimeStateStore
 
 logger = logging.getLogger(__name__)
 
+# Point-in-time, read-only view of the device config and the playlist / refresh state, published after every write.
+ConfigSnapshot = namedtuple("ConfigSnapshot", ["config", "playlist_config", "refresh_info"])
+
 class Config:
+    """Device configuration shared by the refresh thread and the web server threads.
+
+    Concurrency model: all mutations of the config and of the model objects (playlists, plugin instances, refresh
+    info) happen while holding the single writer lock, taken with `writer()`. The config dict itself is copy-on-write,
+    so a dict returned by `get_config()` is never modified afterwards. Readers that need a consistent view of the
+    playlists use `get_snapshot()`, which is rebuilt whenever a writer finishes.
+    """
     # Base path for the project directory
     BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 
@@ -20,10 +35,13 @@ class Config:
     plugin_image_dir = os.path.join(BASE_DIR, "static", "images", "plugins")
 
     def __init__(self):
+        self.lock = threading.RLock()
         self.config = self.read_config()
         self.plugins_list = self.read_plugins_list()
         self.playlist_manager = self.load_playlist_manager()
         self.refresh_info = self.load_refresh_info()
+        self.runtime_state = self.load_runtime_state()
+        self.snapshot = self.build_snapshot()
 
     def read_config(self):
         """Reads the device config JSON file and returns it as a dictionary."""
@@ -53,12 +71,65 @@ class Config:
         return plugins_list
 
     def write_config(self):
-        """Updates the cached config from the model objects and writes to the config file."""
-        logger.debug(f"Writing device config to {self.config_file}")
-        self.update_value("playlist_config", self.playlist_manager.to_dict())
-        self.update_value("refresh_info", self.refresh_info.to_dict())
-        with open(self.config_file, 'w') as outfile:
-            json.dump(self.config, outfile, indent=4)
+        """Updates the cached config from the model objects and writes to the config file.
+
+        Runtime scheduler state is excluded from the config file and synced to the runtime state store instead."""
+        with self.writer():
+            logger.debug(f"Writing device config to {self.config_file}")
+            config = dict(self.config, playlist_config=self.playlist_manager.to_dict(include_runtime=False))
+            config.pop("refresh_info", None)
+            self.config = config
+            with open(self.config_file, 'w') as outfile:
+                json.dump(self.config, outfile, indent=4)
+            self.write_runtime_state(prune=True)
+
+    def write_runtime_state(self, prune=False):
+        """Journals scheduler state that changed since the last write. Used on the refresh path instead of
+        write_config. When prune is set, state for deleted playlists and plugin instances is dropped."""
+        with self.writer():
+            state = self.get_runtime_state()
+            changed = self.runtime_state.update(state)
+            if prune:
+                for key in set(self.runtime_state.keys()) - set(state):
+                    self.runtime_state.delete(key)
+            logger.debug(f"Wrote runtime state. | changed_keys: {changed}")
+
+    def get_runtime_state(self):
+        """Collects the high-churn scheduler state from the model objects, keyed for the runtime state store."""
+        state = {
+            "refresh_info": self.refresh_info.to_dict(),
+            "active_playlist": self.playlist_manager.active_playlist
+        }
+        for playlist in self.playlist_manager.playlists:
+            state[f"playlist:{playlist.name}"] = {"current_plugin_index": playlist.current_plugin_index}
+            for plugin_instance in playlist.plugins:
+                instance_key = f"instance:{plugin_instance.plugin_id}:{plugin_instance.name}"
+                state[instance_key] = plugin_instance.get_runtime_state()
+        return state
+
+    @contextmanager
+    def writer(self):
+        """Holds the writer lock while mutating the config or model objects, then publishes a new snapshot.
+
+        The lock is reentrant, so writers may call write_config() and other mutators from inside the block."""
+        with self.lock:
+            try:
+                yield self
+            finally:
+                self.snapshot = self.build_snapshot()
+
+    def build_snapshot(self):
+        """Builds a deep-copied snapshot of the config, playlists and latest refresh info."""
+        with self.lock:
+            return ConfigSnapshot(
+                config=copy.deepcopy(self.config),
+                playlist_config=copy.deepcopy(self.playlist_manager.to_dict()),
+                refresh_info=self.refresh_info.to_dict()
+            )
+
+    def get_snapshot(self):
+        """Returns the latest published snapshot. Callers must treat it as read-only."""
+        return self.snapshot
 
     def get_config(self, key=None, default={}):
         """Gets the value of a specific configuration key or returns the entire config if none provided."""
@@ -82,14 +153,16 @@ class Config:
 
     def update_config(self, config):
         """Updates the config with the new values provided and writes to the config file."""
-        self.config.update(config)
-        self.write_config()
+        with self.writer():
+            self.config = {**self.config, **config}
+            self.write_config()
 
     def update_value(self, key, value, write=False):
         """Updates a specific key in the configuration with a new value and optionally writes it to the config file."""
-        self.config[key] = value
-        if write:
-            self.write_config()
+        with self.writer():
+            self.config = {**self.config, key: value}
+            if write:
+                self.write_config()
 
     def load_env_key(self, key):
         """Loads an environment variable using dotenv and returns its value."""
@@ -107,6 +180,26 @@ class Config:
         """Loads the refresh information from the config."""
         return RefreshInfo.from_dict(self.get_config("refresh_info"))
 
+    def load_runtime_state(self):
+        """Opens the runtime state journal and applies its state to the model objects.
+
+        Values missing from the journal (EG: on first start after upgrading) keep what was read from the config file."""
+        runtime_state = RuntimeStateStore(os.path.splitext(self.config_file)[0] + "_state.jsonl")
+
+        if runtime_state.get("refresh_info") is not None:
+            self.refresh_info = RefreshInfo.from_dict(runtime_state.get("refresh_info"))
+        if runtime_state.get("active_playlist") is not None:
+            self.playlist_manager.active_playlist = runtime_state.get("active_playlist")
+        for playlist in self.playlist_manager.playlists:
+            playlist_state = runtime_state.get(f"playlist:{playlist.name}")
+            if playlist_state is not None:
+                playlist.current_plugin_index = playlist_state.get("current_plugin_index")
+            for plugin_instance in playlist.plugins:
+                instance_state = runtime_state.get(f"instance:{plugin_instance.plugin_id}:{plugin_instance.name}")
+                if instance_state is not None:
+                    plugin_instance.apply_runtime_state(instance_state)
+        return runtime_state
+
     def get_playlist_manager(self):
         """Returns the playlist manager."""
         return self.playlist_manager
@@ -21,6 +21,7 @@ import random
 import time
 import sys
 import json
+import signal
 import logging
 import threading
 import argparse
@@ -36,11 +37,18 @@ from blueprints.plugin import plugin_bp
 from blueprints.playlist import playlist_bp
 from jinja2 import ChoiceLoader, FileSystemLoader
 from plugins.plugin_registry import load_plugins
+from utils.quota import get_quota_manager
+from utils.data_cache import get_data_cache
+from utils.connectivity import get_connectivity_monitor, parse_probe_target
+from utils.http_client import get_http_client
 from waitress import serve
 
 
 logger = logging.getLogger(__name__)
 
+# Config access is guarded by a writer lock with read-only snapshots, so requests can be served concurrently
+WEB_SERVER_THREADS = 4
+
 # Parse command line arguments
 parser = argparse.ArgumentParser(description='InkyPi Display Server')
 parser.add_argument('--dev', action='store_true', help='Run in development mode')
@@ -70,6 +78,13 @@ display_manager = DisplayManager(device_config)
 refresh_task = RefreshTask(device_config, display_manager)
 
 load_plugins(device_config.get_plugins())
+get_quota_manager().configure(device_config.get_config("api_quotas", default={}))
+# optional "host:port" probed to detect the connection returning, instead of the host of the latest failed request
+get_connectivity_monitor().probe_target = parse_probe_target(device_config.get_config("connectivity_probe"))
+# serve last-known-good data while offline and regenerate stale images once the connection returns
+get_data_cache().connectivity = get_connectivity_monitor()
+get_http_client().connectivity = get_connectivity_monitor()
+get_connectivity_monitor().add_listener(refresh_task.handle_reconnect)
 
 # Store dependencies
 app.config['DEVICE_CONFIG'] = device_config
@@ -89,6 +104,7 @@ if __name__ == '__main__':
 
     # start the background refresh task
     refresh_task.start()
+    get_connectivity_monitor().start()
 
     # display default inkypi image on startup
     if device_config.get_config("startup") is True:
@@ -97,6 +113,9 @@ if __name__ == '__main__':
         display_manager.display_image(img)
         device_config.update_value("startup", False, write=True)
 
+    # systemd stops the service with SIGTERM, exit normally so the state below is saved
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+
     try:
         # Run the Flask app
         app.secret_key = str(random.randint(100000,999999))
@@ -113,6 +132,8 @@ if __name__ == '__main__':
             except:
                 pass  # Ignore if we can't get the IP
             
-        serve(app, host=args.host, port=PORT, threads=1)
+        serve(app, host=args.host, port=PORT, threads=WEB_SERVER_THREADS)
     finally:
-        refresh_task.stop()
\ No newline at end of file
+        refresh_task.stop()
+        # tokens spent since the last periodic save would otherwise be refilled on restart
+        get_quota_manager().save()
\ No newline at end of file
@@ -1,10 +1,18 @@
 import os
 import json
 import logging
+from bisect import bisect_right
 from datetime import datetime, timedelta
 
 logger = logging.getLogger(__name__)
 
+MINUTES_PER_DAY = 24 * 60
+
+def parse_time_minutes(time_str):
+    """Converts an 'HH:MM' string to minutes since midnight. '24:00' maps to 1440."""
+    hours, minutes = time_str.split(":")
+    return int(hours) * 60 + int(minutes)
+
 class RefreshInfo:
     """Keeps track of refresh metadata.
 
@@ -71,6 +79,7 @@ class PlaylistManager:
         """Initialize PlaylistManager with a list of playlists."""
         self.playlists = playlists
         self.active_playlist = active_playlist
+        self.timeline = None
 
     def get_playlist_names(self):
         """Returns a list of all playlist names."""
@@ -78,6 +87,7 @@ class PlaylistManager:
 
     def add_default_playlist(self):
         """Add a default playlist to the manager, called when no playlists exist."""
+        self.timeline = None
         return self.playlists.append(
             Playlist("Default", PlaylistManager.DEFAULT_PLAYLIST_START, PlaylistManager.DEFAULT_PLAYLIST_END, []))
 
@@ -89,20 +99,33 @@ class PlaylistManager:
                 return plugin
         return None
 
+    def get_timeline(self):
+        """Returns the compiled playlist timeline, rebuilding it if the playlists changed."""
+        if self.timeline is None:
+            self.timeline = PlaylistTimeline(self.playlists)
+        return self.timeline
+
     def determine_active_playlist(self, current_datetime):
         """Determine the active playlist based on the current time."""
-        current_time = current_datetime.strftime("%H:%M")  # Get current time in "HH:MM" format
-
-        # get active playlists that have plugins
-        active_playlists = [p for p in self.playlists if p.is_active(current_time)]
-        if not active_playlists:
+        current_minute = current_datetime.hour * 60 + current_datetime.minute
+        return self.get_timeline().get_active_playlist(current_minute)
+
+    def get_next_transition(self, current_datetime):
+        """Returns the datetime at which the active playlist next changes, or None if it never changes."""
+        current_minute = current_datetime.hour * 60 + current_datetime.minute
+        minutes = self.get_timeline().get_minutes_until_transition(current_minute)
+        if minutes is None:
             return None
+        return current_datetime.replace(second=0, microsecond=0) + timedelta(minutes=minutes)
 
-        # Sort playlists by priority
-        active_playlists.sort(key=lambda p: p.get_priority())
-        playlist = active_playlists[0]
-
-        return playlist
+    def get_transitions(self, current_datetime, until_datetime):
+        """Returns (datetime, playlist) tuples for each active playlist change between the two datetimes."""
+        transitions = []
+        transition_dt = self.get_next_transition(current_datetime)
+        while transition_dt and transition_dt <= until_datetime:
+            transitions.append((transition_dt, self.determine_active_playlist(transition_dt)))
+            transition_dt = self.get_next_transition(transition_dt)
+        return transitions
 
     def get_playlist(self, playlist_name):
         """Returns the playlist with the specified name."""
@@ -126,6 +149,7 @@ class PlaylistManager:
         if not end_time:
             end_time = PlaylistManager.DEFAULT_PLAYLIST_END
         self.playlists.append(Playlist(name, start_time, end_time))
+        self.timeline = None
         return True
 
     def update_playlist(self, old_name, new_name, start_time, end_time):
@@ -135,6 +159,7 @@ class PlaylistManager:
             playlist.name = new_name
             playlist.start_time = start_time
             playlist.end_time = end_time
+            self.timeline = None
             return True
         logger.warning(f"Playlist '{old_name}' not found.")
         return False
@@ -142,12 +167,14 @@ class PlaylistManager:
     def delete_playlist(self, name):
         """Deletes the playlist with the specified name."""
         self.playlists = [p for p in self.playlists if p.name != name]
+        self.timeline = None
 
-    def to_dict(self):
-        return {
-            "playlists": [p.to_dict() for p in self.playlists],
-            "active_playlist": self.active_playlist
-        }
+    def to_dict(self, include_runtime=True):
+        """Serializes the playlists. Runtime scheduler state is omitted when include_runtime is False."""
+        playlist_dict = {"playlists": [p.to_dict(include_runtime) for p in self.playlists]}
+        if include_runtime:
+            playlist_dict["active_playlist"] = self.active_playlist
+        return playlist_dict
 
     @classmethod
     def from_dict(cls, data):
@@ -237,28 +264,31 @@ class Playlist:
 
     def get_time_range_minutes(self):
         """Calculate the time difference in minutes between start_time and end_time."""
-        start = datetime.strptime(self.start_time, "%H:%M")
-        # Handle '24:00' by converting it to '00:00' of the next day
-        if self.end_time != "24:00":
-            end = datetime.strptime(self.end_time, "%H:%M")
-        else:
-            end = datetime.strptime("00:00", "%H:%M")
-            end += timedelta(days=1)
+        start, end = parse_time_minutes(self.start_time), parse_time_minutes(self.end_time)
 
         # If the window wraps past midnight (EG: 21:00 -> 03:00), treat end as next day
         if end < start:
-            end += timedelta(days=1)
-            
-        return int((end - start).total_seconds() // 60)
+            end += MINUTES_PER_DAY
 
-    def to_dict(self):
-        return {
+        return end - start
+
+    def is_active_minute(self, minute):
+        """Check if the playlist is active at the given minute of the day."""
+        start, end = parse_time_minutes(self.start_time), parse_time_minutes(self.end_time)
+        if start <= end:
+            return start <= minute < end
+        return minute >= start or minute < end
+
+    def to_dict(self, include_runtime=True):
+        playlist_dict = {
             "name": self.name,
             "start_time": self.start_time,
             "end_time": self.end_time,
-            "plugins": [p.to_dict() for p in self.plugins],
-            "current_plugin_index": self.current_plugin_index
+            "plugins": [p.to_dict(include_runtime) for p in self.plugins],
         }
+        if include_runtime:
+            playlist_dict["current_plugin_index"] = self.current_plugin_index
+        return playlist_dict
 
     @classmethod
     def from_dict(cls, data):
@@ -270,6 +300,57 @@ class Playlist:
             current_plugin_index=data.get("current_plugin_index", None)
         )
 
+class PlaylistTimeline:
+    """Minute-of-day index answering which playlist is active and when that next changes.
+
+    Playlist start and end times split the day into segments. Each segment is assigned the highest priority
+    (shortest) playlist active during it, and adjacent segments with the same playlist are merged, so both
+    lookups are a binary search over the segment boundaries. Windows wrapping past midnight are handled by
+    treating the day as circular.
+
+    Attributes:
+        boundaries (list): Sorted minute offsets at which a segment starts, always beginning with 0.
+        segments (list): Active Playlist (or None) for the segment starting at the matching boundary.
+        transitions (list): Sorted minute offsets at which the active playlist actually changes.
+    """
+
+    def __init__(self, playlists):
+        points = {0}
+        for playlist in playlists:
+            if playlist.get_time_range_minutes() > 0:
+                points.add(parse_time_minutes(playlist.start_time) % MINUTES_PER_DAY)
+                points.add(parse_time_minutes(playlist.end_time) % MINUTES_PER_DAY)
+
+        # sorting is stable, so playlists with equal priority keep their configured order
+        by_priority = sorted(playlists, key=lambda p: p.get_priority())
+
+        self.boundaries = []
+        self.segments = []
+        for minute in sorted(points):
+            playlist = next((p for p in by_priority if p.is_active_minute(minute)), None)
+            if self.segments and self.segments[-1] is playlist:
+                continue
+            self.boundaries.append(minute)
+            self.segments.append(playlist)
+
+        self.transitions = list(self.boundaries)
+        if len(self.segments) == 1 or self.segments[0] is self.segments[-1]:
+            # the last segment continues past midnight, so 00:00 is not a change
+            self.transitions.pop(0)
+
+    def get_active_playlist(self, minute):
+        """Returns the playlist active at the given minute of the day, or None."""
+        return self.segments[bisect_right(self.boundaries, minute) - 1]
+
+    def get_minutes_until_transition(self, minute):
+        """Returns the number of minutes from the given minute until the active playlist changes, or None."""
+        if not self.transitions:
+            return None
+        index = bisect_right(self.transitions, minute)
+        if index < len(self.transitions):
+            return self.transitions[index] - minute
+        return self.transitions[0] + MINUTES_PER_DAY - minute
+
 class PluginInstance:
     """Represents an individual plugin instance within a playlist.
 
@@ -279,14 +360,31 @@ class PluginInstance:
         settings (dict): Settings associated with the plugin.
         refresh (dict): Refresh settings, such as interval and scheduled time.
         latest_refresh (str): ISO-formatted string representing the last refresh time.
+        valid_until (datetime): Time until which the plugin declared its latest output valid, or None.
+        failure_count (int): Number of consecutive failed refreshes.
+        breaker_open_until (datetime): Time before which no refresh is attempted after failures, or None.
+        stale_since (datetime): Fetch time of the oldest cached data the latest image was rendered from because
+            it could not be refetched (EG: while offline), or None.
     """
 
+    # Backoff after consecutive failed refreshes, doubling from BREAKER_BASE_SECONDS up to BREAKER_MAX_SECONDS
+    BREAKER_BASE_SECONDS = 60
+    BREAKER_MAX_SECONDS = 2 * 60 * 60
+
     def __init__(self, plugin_id, name, settings, refresh, latest_refresh_time=None):
         self.plugin_id = plugin_id
         self.name = name
         self.settings = settings
         self.refresh = refresh
         self.latest_refresh_time = latest_refresh_time
+        self.valid_until = None
+        self.failure_count = 0
+        self.breaker_open_until = None
+        self.stale_since = None
+        # settings keys the plugin added or changed during a refresh (EG: ImageUpload's rotation index), persisted
+        # with the runtime state rather than the user-edited device config
+        self.runtime_settings = set()
+        self._latest_refresh_cache = (None, None)
 
     def update(self, updated_data):
         """Update attributes of the class with the dictionary values."""
@@ -295,58 +393,113 @@ class PluginInstance:
 
     def should_refresh(self, current_time):
         """Checks whether the plugin should be refreshed based on its refresh settings and the current time."""
-        latest_refresh_dt = self.get_latest_refresh_dt()
-        if not latest_refresh_dt:
-            return True
-
-        # Check for interval-based refresh
-        if "interval" in self.refresh:
-            interval = self.refresh.get("interval")
-            if interval and (current_time - latest_refresh_dt) >= timedelta(seconds=interval):
-                return True
+        next_refresh_dt = self.get_next_refresh_dt(current_time)
+        return next_refresh_dt is not None and next_refresh_dt <= current_time
 
-        # Check for scheduled refresh (HH:MM format)
-        if "scheduled" in self.refresh:
-            scheduled_time_str = self.refresh.get("scheduled")
-            latest_refresh_str = latest_refresh_dt.strftime("%H:%M")
+    def get_next_refresh_dt(self, current_time):
+        """Returns when this instance is next due for a refresh based on its refresh settings.
 
-            # If the latest refresh is before the scheduled time today
-            if latest_refresh_str < scheduled_time_str:
-                return True
-        
-        if "scheduled" in self.refresh:
-            scheduled_time_str = self.refresh.get("scheduled")
-            scheduled_time = datetime.strptime(scheduled_time_str, "%H:%M").time()
-            
-            latest_refresh_date = latest_refresh_dt.date()
-            current_date = current_time.date()
-
-            # Determine if a refresh is needed based on scheduled time and last refresh
-            if (latest_refresh_date < current_date and current_time.time() >= scheduled_time) or \
-            (latest_refresh_date == current_date and latest_refresh_dt.time() < scheduled_time <= current_time.time()):
-                return True
+        Returns current_time if the instance has never been refreshed. A refresh is never due before the
+        valid_until time declared by the plugin for its latest output, nor while the circuit breaker is open."""
+        latest_refresh_dt = self.get_latest_refresh_dt()
+        if not latest_refresh_dt:
+            return max(current_time, self.breaker_open_until) if self.breaker_open_until else current_time
 
-        return False
+        next_refresh_dt = self.get_next_scheduled_dt(latest_refresh_dt)
+        if next_refresh_dt is None:
+            return None
+        if self.valid_until and self.valid_until > next_refresh_dt:
+            next_refresh_dt = self.valid_until
+        if self.breaker_open_until and self.breaker_open_until > next_refresh_dt:
+            next_refresh_dt = self.breaker_open_until
+        return next_refresh_dt
+
+    def get_next_scheduled_dt(self, since_dt):
+        """Returns when the refresh settings next call for a refresh after one made at since_dt, or None if they
+        never do."""
+        next_refresh_dts = []
+        interval = self.refresh.get("interval")
+        if interval:
+            next_refresh_dts.append(since_dt + timedelta(seconds=interval))
+
+        scheduled_time_str = self.refresh.get("scheduled")
+        if scheduled_time_str:
+            scheduled_minutes = parse_time_minutes(scheduled_time_str)
+            scheduled_dt = since_dt.replace(
+                hour=scheduled_minutes // 60, minute=scheduled_minutes % 60, second=0, microsecond=0)
+            if scheduled_dt <= since_dt:
+                scheduled_dt += timedelta(days=1)
+            next_refresh_dts.append(scheduled_dt)
+
+        return min(next_refresh_dts) if next_refresh_dts else None
+
+    def record_failure(self, current_time):
+        """Records a failed refresh and opens the circuit breaker with exponential backoff. Returns the time until
+        which the breaker stays open."""
+        self.failure_count += 1
+        backoff = min(PluginInstance.BREAKER_BASE_SECONDS * 2 ** (self.failure_count - 1), PluginInstance.BREAKER_MAX_SECONDS)
+        self.breaker_open_until = current_time + timedelta(seconds=backoff)
+        return self.breaker_open_until
+
+    def is_breaker_open(self, current_time):
+        """Checks whether refreshes are suspended after recent failures."""
+        return self.breaker_open_until is not None and current_time < self.breaker_open_until
 
     def get_image_path(self):
         """Formats the image path for this plugin instance."""
         return f"{self.plugin_id}_{self.name.replace(' ', '_')}.png"
 
     def get_latest_refresh_dt(self):
-        """Returns the latest refresh time as a datetime object, or None if not set."""
-        latest_refresh = None
-        if self.latest_refresh_time:
-            latest_refresh = datetime.fromisoformat(self.latest_refresh_time)
-        return latest_refresh
+        """Returns the latest refresh time as a datetime object, or None if not set.
+
+        The parsed value is cached until latest_refresh_time changes."""
+        if self._latest_refresh_cache[0] != self.latest_refresh_time:
+            latest_refresh = None
+            if self.latest_refresh_time:
+                latest_refresh = datetime.fromisoformat(self.latest_refresh_time)
+            self._latest_refresh_cache = (self.latest_refresh_time, latest_refresh)
+        return self._latest_refresh_cache[1]
     
-    def to_dict(self):
+    def get_runtime_state(self):
+        """Returns the scheduler-owned state of this instance as a dictionary."""
         return {
+            "latest_refresh_time": self.latest_refresh_time,
+            "valid_until": self.valid_until.isoformat() if self.valid_until else None,
+            "settings": {k: self.settings[k] for k in self.runtime_settings if k in self.settings},
+            "failure_count": self.failure_count,
+            "breaker_open_until": self.breaker_open_until.isoformat() if self.breaker_open_until else None,
+            "stale_since": self.stale_since.isoformat() if self.stale_since else None
+        }
+
+    def apply_runtime_state(self, state):
+        """Restores scheduler-owned state previously returned by get_runtime_state. Missing failure fields mean
+        the latest refresh succeeded, closing the circuit breaker."""
+        self.latest_refresh_time = state.get("latest_refresh_time")
+        valid_until = state.get("valid_until")
+        self.valid_until = datetime.fromisoformat(valid_until) if valid_until else None
+        runtime_settings = state.get("settings", {})
+        self.settings.update(runtime_settings)
+        self.runtime_settings.update(runtime_settings)
+        self.failure_count = state.get("failure_count", 0)
+        breaker_open_until = state.get("breaker_open_until")
+        self.breaker_open_until = datetime.fromisoformat(breaker_open_until) if breaker_open_until else None
+        stale_since = state.get("stale_since")
+        self.stale_since = datetime.fromisoformat(stale_since) if stale_since else None
+
+    def to_dict(self, include_runtime=True):
+        if include_runtime:
+            settings = self.settings
+        else:
+            settings = {k: v for k, v in self.settings.items() if k not in self.runtime_settings}
+        plugin_dict = {
             "plugin_id": self.plugin_id,
             "name": self.name,
-            "plugin_settings": self.settings,
+            "plugin_settings": settings,
             "refresh": self.refresh,
-            "latest_refresh_time": self.latest_refresh_time,
         }
+        if include_runtime:
+            plugin_dict["latest_refresh_time"] = self.latest_refresh_time
+        return plugin_dict
 
     @classmethod
     def from_dict(cls, data):
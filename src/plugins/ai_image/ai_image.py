@@ -3,8 +3,11 @@ from openai import OpenAI
 from PIL import Image
 from io import BytesIO
 import base64
-import requests
 import logging
+import os
+from utils.http_client import get_http_client
+from utils.data_cache import QuotaExceededError
+from utils.generation_queue import GenerationQueue, make_key, get_default_generation_dir
 
 logger = logging.getLogger(__name__)
 
@@ -12,7 +15,22 @@ IMAGE_MODELS = ["dall-e-3", "dall-e-2", "gpt-image-1"]
 DEFAULT_IMAGE_MODEL = "dall-e-3"
 DEFAULT_IMAGE_QUALITY = "standard"
 
+def save_image(image, path):
+    image.save(path, format="PNG")
+
+def load_image(path):
+    image = Image.open(path)
+    image.load()
+    return image
+
 class AIImage(BasePlugin):
+    def __init__(self, config, **dependencies):
+        super().__init__(config, **dependencies)
+        # the next image for each settings is generated in the background, one ahead
+        self.queue = GenerationQueue("ai_image", suffix=".png", save_fn=save_image, load_fn=load_image)
+        # latest image generated for each settings, shown again while the OpenAI quota is exhausted
+        self.last_image_dir = os.path.join(get_default_generation_dir(), "ai_image_last")
+
     def generate_settings_template(self):
         template_params = super().generate_settings_template()
         template_params['api_key'] = {
@@ -23,10 +41,21 @@ class AIImage(BasePlugin):
         return template_params
 
     def generate_image(self, settings, device_config):
+        key, generate_fn = self.get_generator(settings, device_config)
+        return self.queue.take(key, generate_fn)
 
+    def get_data_sources(self, settings, device_config):
+        key, generate_fn = self.get_generator(settings, device_config)
+        # generated on the queue's own thread, not on the fetch workers shared with other plugins
+        return {"next_image": (self.queue.fill_in_background, (key, generate_fn), None)}
+
+    def get_generator(self, settings, device_config):
+        """Returns the backlog key for these settings and a function generating a new image for them."""
         api_key = device_config.load_env_key("OPEN_AI_SECRET")
         if not api_key:
             raise RuntimeError("OPEN AI API Key not configured.")
+        # points the client at an OpenAI compatible endpoint instead, EG: a local stand-in for testing
+        base_url = device_config.load_env_key("OPEN_AI_BASE_URL") or None
 
         text_prompt = settings.get("textPrompt", "")
 
@@ -35,24 +64,44 @@ class AIImage(BasePlugin):
             raise RuntimeError("Invalid Image Model provided.")
         image_quality = settings.get('quality', "medium" if image_model == "gpt-image-1" else "standard")
         randomize_prompt = settings.get('randomizePrompt') == 'true'
+        orientation = device_config.get_config("orientation")
 
-        image = None
-        try:
-            ai_client = OpenAI(api_key = api_key)
-            if randomize_prompt:
-                text_prompt = AIImage.fetch_image_prompt(ai_client, text_prompt)
-
-            image = AIImage.fetch_image(
-                ai_client,
-                text_prompt,
-                model=image_model,
-                quality=image_quality,
-                orientation=device_config.get_config("orientation")
-            )
-        except Exception as e:
-            logger.error(f"Failed to make Open AI request: {str(e)}")
-            raise RuntimeError("Open AI request failure, please check logs.")
-        return image
+        key = make_key(base_url, text_prompt, image_model, image_quality, randomize_prompt, orientation)
+        last_image_path = os.path.join(self.last_image_dir, f"{key}.png")
+
+        def fetch():
+            # a randomized prompt costs a chat completion on top of the image
+            if not self.get_quota("openai", api_key).try_acquire(2 if randomize_prompt else 1):
+                raise QuotaExceededError("Open AI quota exhausted, try again later.")
+
+            try:
+                ai_client = OpenAI(api_key = api_key, base_url = base_url)
+                prompt = text_prompt
+                if randomize_prompt:
+                    prompt = AIImage.fetch_image_prompt(ai_client, text_prompt)
+
+                image = AIImage.fetch_image(
+                    ai_client,
+                    prompt,
+                    model=image_model,
+                    quality=image_quality,
+                    orientation=orientation
+                )
+            except Exception as e:
+                logger.error(f"Failed to make Open AI request: {str(e)}")
+                raise RuntimeError("Open AI request failure, please check logs.")
+
+            os.makedirs(self.last_image_dir, exist_ok=True)
+            tmp_path = f"{last_image_path}.tmp"
+            save_image(image, tmp_path)
+            os.replace(tmp_path, last_image_path)
+            return {"path": last_image_path}
+
+        def generate():
+            # never fresh, the cache entry only stands in for a new image once the quota is exhausted
+            return load_image(self.get_cached_data(f"image_{key}", fetch, ttl=0)["path"])
+
+        return key, generate
 
     @staticmethod
     def fetch_image(ai_client, prompt, model="dall-e-3", quality="standard", orientation="horizontal"):
@@ -81,7 +130,7 @@ class AIImage(BasePlugin):
         response = ai_client.images.generate(**args)
         if model in ["dall-e-3", "dall-e-2"]:
             image_url = response.data[0].url
-            response = requests.get(image_url)
+            response = get_http_client().get(image_url)
             img = Image.open(BytesIO(response.content))
         elif model == "gpt-image-1":
             image_base64 = response.data[0].b64_json
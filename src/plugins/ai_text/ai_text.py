@@ -9,10 +9,16 @@ import requests
 import logging
 import textwrap
 import os
+from utils.generation_queue import GenerationQueue, make_key
 
 logger = logging.getLogger(__name__)
 
 class AIText(BasePlugin):
+    def __init__(self, config, **dependencies):
+        super().__init__(config, **dependencies)
+        # the next response for each settings is generated in the background ahead of its refresh
+        self.queue = GenerationQueue("ai_text")
+
     def generate_settings_template(self):
         template_params = super().generate_settings_template()
         template_params['api_key'] = {
@@ -24,26 +30,12 @@ class AIText(BasePlugin):
         return template_params
 
     def generate_image(self, settings, device_config):
-        api_key = device_config.load_env_key("OPEN_AI_SECRET")
-        if not api_key:
-            raise RuntimeError("OPEN AI API Key not configured.")
-
         title = settings.get("title")
 
-        text_model = settings.get('textModel')
-        if not text_model:
-            raise RuntimeError("Text Model is required.")
-
-        text_prompt = settings.get('textPrompt', '')
-        if not text_prompt.strip():
-            raise RuntimeError("Text Prompt is required.")
-
-        try:
-            ai_client = OpenAI(api_key = api_key)
-            prompt_response = AIText.fetch_text_prompt(ai_client, text_model, text_prompt)
-        except Exception as e:
-            logger.error(f"Failed to make Open AI request: {str(e)}")
-            raise RuntimeError("Open AI request failure, please check logs.")
+        key, generate_fn = self.get_generator(settings, device_config)
+        # responses are keyed by date, so one generated now may never be shown (EG: by a daily instance). The
+        # prefetcher generates the response ahead of each scheduled refresh instead.
+        prompt_response = self.queue.take(key, generate_fn, refill=False)
 
         dimensions = device_config.get_resolution()
         if device_config.get_config("orientation") == "vertical":
@@ -58,6 +50,46 @@ class AIText(BasePlugin):
         image = self.render_image(dimensions, "ai_text.html", "ai_text.css", image_template_params)
 
         return image
+
+    def get_data_sources(self, settings, device_config):
+        key, generate_fn = self.get_generator(settings, device_config)
+        # generated on the queue's own thread, not on the fetch workers shared with other plugins
+        return {"next_response": (self.queue.fill_in_background, (key, generate_fn), None)}
+
+    def get_generator(self, settings, device_config):
+        """Returns the backlog key for these settings and a function fetching a new response for them."""
+        api_key = device_config.load_env_key("OPEN_AI_SECRET")
+        if not api_key:
+            raise RuntimeError("OPEN AI API Key not configured.")
+        # points the client at an OpenAI compatible endpoint instead, EG: a local stand-in for testing
+        base_url = device_config.load_env_key("OPEN_AI_BASE_URL") or None
+
+        text_model = settings.get('textModel')
+        if not text_model:
+            raise RuntimeError("Text Model is required.")
+
+        text_prompt = settings.get('textPrompt', '')
+        if not text_prompt.strip():
+            raise RuntimeError("Text Prompt is required.")
+
+        settings_key = make_key(base_url, text_model, text_prompt)
+        # responses are told today's date, so they are not kept past the day
+        key = make_key(settings_key, datetime.today().strftime('%Y-%m-%d'))
+
+        def fetch():
+            try:
+                ai_client = OpenAI(api_key = api_key, base_url = base_url)
+                return AIText.fetch_text_prompt(ai_client, text_model, text_prompt)
+            except Exception as e:
+                logger.error(f"Failed to make Open AI request: {str(e)}")
+                raise RuntimeError("Open AI request failure, please check logs.")
+
+        def generate():
+            # never fresh, the cache entry only stands in for a new response once the quota is exhausted, even if
+            # it was generated on an earlier day
+            return self.get_cached_data(f"response_{settings_key}", fetch, ttl=0, quota=self.get_quota("openai", api_key))
+
+        return key, generate
     
     @staticmethod
     def fetch_text_prompt(ai_client, model, text_prompt):
@@ -7,15 +7,32 @@ For the API key, set `NASA_SECRET={API_KEY}` in your .env file.
 
 from plugins.base_plugin.base_plugin import BasePlugin
 from PIL import Image
-from io import BytesIO
-import requests
 import logging
+import threading
+import hashlib
 from random import randint
 from datetime import datetime, timedelta
+import pytz
+from utils.time_utils import get_next_midnight
+from utils.image_utils import localize_image
+from utils.picture_pool import PicturePool
 
 logger = logging.getLogger(__name__)
 
+# a new picture is published every day at midnight US Eastern time
+APOD_TIMEZONE = pytz.timezone("America/New_York")
+TODAY_APOD_CACHE_SECONDS = 3 * 60 * 60
+PAST_APOD_CACHE_SECONDS = 30 * 24 * 60 * 60
+# the regular APOD image is about 1000px wide, the HD one is only needed for larger screens
+HD_MIN_SIZE = 1024
+
 class Apod(BasePlugin):
+    def __init__(self, config, **dependencies):
+        super().__init__(config, **dependencies)
+        self.lock = threading.Lock()
+        # API key -> pool of random pictures
+        self.random_pools = {}
+
     def generate_settings_template(self):
         template_params = super().generate_settings_template()
         template_params['api_key'] = {
@@ -33,35 +50,88 @@ class Apod(BasePlugin):
         if not api_key:
             raise RuntimeError("NASA API Key not configured.")
 
-        params = {"api_key": api_key}
+        dimensions = self.get_dimensions(device_config)
+        if settings.get("randomizeApod") == "true":
+            # random pictures are resolved and downloaded ahead of time
+            image_path = self.get_random_pool(api_key).take(dimensions)
+        else:
+            data = self.fetch_apod(api_key, settings.get("customDate"))
+            if data.get("media_type") != "image":
+                raise RuntimeError("APOD is not an image today.")
+            image_url = self.get_image_url(data, dimensions)
+            try:
+                image_path = localize_image(image_url, dimensions, cover=True)
+            except Exception as e:
+                logger.error(f"Failed to load APOD image: {str(e)}")
+                raise RuntimeError("Failed to load APOD image.")
+
+        return Image.open(image_path)
 
+    def get_valid_until(self, settings, device_config, current_dt):
+        # a random picture is expected on every refresh, otherwise the picture only changes daily
         if settings.get("randomizeApod") == "true":
-            start = datetime(2015, 1, 1)
-            end = datetime.today()
-            delta_days = (end - start).days
-            random_date = start + timedelta(days=randint(0, delta_days))
-            params["date"] = random_date.strftime("%Y-%m-%d")
-        elif settings.get("customDate"):
-            params["date"] = settings["customDate"]
+            return None
+        return get_next_midnight(current_dt.astimezone(APOD_TIMEZONE)).astimezone(current_dt.tzinfo)
 
-        response = requests.get("https://api.nasa.gov/planetary/apod", params=params)
+    def get_data_sources(self, settings, device_config):
+        api_key = device_config.load_env_key("NASA_SECRET")
+        if not api_key or settings.get("randomizeApod") != "true":
+            return {}
+        pool = self.get_random_pool(api_key)
+        # filled on the pool's own thread, not on the fetch workers shared with other plugins
+        return {"random_pool": (pool.fill_in_background, (self.get_dimensions(device_config),), None)}
 
-        if response.status_code != 200:
-            logger.error(f"NASA API error: {response.text}")
-            raise RuntimeError("Failed to retrieve NASA APOD.")
+    def get_dimensions(self, device_config):
+        dimensions = device_config.get_resolution()
+        if device_config.get_config("orientation") == "vertical":
+            dimensions = dimensions[::-1]
+        return dimensions
 
-        data = response.json()
+    def get_random_pool(self, api_key):
+        with self.lock:
+            pool = self.random_pools.get(api_key)
+            if pool is None:
+                # the pool is saved under a hash of the key, never the key itself
+                name = f"apod_{hashlib.sha1(api_key.encode('utf-8')).hexdigest()[:8]}"
+                pool = PicturePool(name, lambda max_size: self.resolve_random_apod(api_key, max_size), cover=True)
+                self.random_pools[api_key] = pool
+            return pool
 
+    def resolve_random_apod(self, api_key, max_size):
+        """Returns the image URL of the picture of a random date, raising if that picture is not an image."""
+        start = datetime(2015, 1, 1)
+        end = datetime.today()
+        delta_days = (end - start).days
+        random_date = start + timedelta(days=randint(0, delta_days))
+        data = self.fetch_apod(api_key, random_date.strftime("%Y-%m-%d"))
         if data.get("media_type") != "image":
-            raise RuntimeError("APOD is not an image today.")
+            raise RuntimeError(f"APOD of {random_date.strftime('%Y-%m-%d')} is not an image.")
+        return self.get_image_url(data, max_size)
+
+    def fetch_apod(self, api_key, apod_date=None):
+        """Returns the APOD metadata of apod_date (YYYY-MM-DD), or of today."""
+        params = {"api_key": api_key}
+        if apod_date:
+            params["date"] = apod_date
+
+        def fetch_apod():
+            response = self.http.get("https://api.nasa.gov/planetary/apod", params=params)
+
+            if response.status_code != 200:
+                logger.error(f"NASA API error: {response.text}")
+                raise RuntimeError("Failed to retrieve NASA APOD.")
 
-        image_url = data.get("hdurl") or data.get("url")
+            return response.json()
 
-        try:
-            img_data = requests.get(image_url)
-            image = Image.open(BytesIO(img_data.content))
-        except Exception as e:
-            logger.error(f"Failed to load APOD image: {str(e)}")
-            raise RuntimeError("Failed to load APOD image.")
+        # past pictures never change, today's is cached for a few hours in case it is published late
+        quota = self.get_quota("nasa", api_key)
+        if apod_date:
+            return self.get_cached_data(f"apod_{apod_date}", fetch_apod, PAST_APOD_CACHE_SECONDS, quota=quota)
+        today = datetime.now(APOD_TIMEZONE).date()
+        return self.get_cached_data(f"apod_{today.isoformat()}", fetch_apod,
+                                    TODAY_APOD_CACHE_SECONDS, quota=quota)
 
-        return image
\ No newline at end of file
+    def get_image_url(self, data, max_size):
+        if max(max_size) > HD_MIN_SIZE:
+            return data.get("hdurl") or data.get("url")
+        return data.get("url") or data.get("hdurl")
@@ -1,11 +1,20 @@
 import logging
 import os
+import time
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
 from utils.app_utils import resolve_path, get_fonts
-from utils.image_utils import take_screenshot_html
+from utils.image_utils import take_screenshot_html, find_remote_images, localize_image
+from utils.http_client import get_http_client
+from utils.data_cache import get_data_cache, get_data_expiry
+from utils.quota import get_quota_manager
 from jinja2 import Environment, FileSystemLoader, select_autoescape
 from pathlib import Path
+from datetime import datetime
 import asyncio
 import base64
+import html
+import re
 
 logger = logging.getLogger(__name__)
 
@@ -14,6 +23,13 @@ PLUGINS_DIR = resolve_path("plugins")
 BASE_PLUGIN_DIR =  os.path.join(PLUGINS_DIR, "base_plugin")
 BASE_PLUGIN_RENDER_DIR = os.path.join(BASE_PLUGIN_DIR, "render")
 
+# bounded pool shared by all plugins for concurrent API requests, matching the HTTP client's pool size
+FETCH_EXECUTOR = ThreadPoolExecutor(max_workers=4, thread_name_prefix="plugin-fetch")
+# seconds a refresh waits for all endpoints before continuing with what it has
+FETCH_DEADLINE_SECONDS = 15
+# fallback marking a call whose failure fails the refresh
+REQUIRED = object()
+
 FRAME_STYLES = [
     {
         "name": "None",
@@ -37,6 +53,10 @@ class BasePlugin:
     """Base class for all plugins."""
     def __init__(self, config, **dependencies):
         self.config = config
+        # shared pooled HTTP client with default timeouts, retries and conditional GET
+        self.http = get_http_client()
+        # shared two-tier data cache, keys are namespaced by plugin id
+        self.data_cache = get_data_cache()
 
         self.render_dir = self.get_plugin_dir("render")
         if os.path.exists(self.render_dir):
@@ -50,6 +70,83 @@ class BasePlugin:
     def generate_image(self, settings, device_config):
         raise NotImplementedError("generate_image must be implemented by subclasses")
 
+    def get_valid_until(self, settings, device_config, current_dt):
+        """Optional hook returning the datetime until which the image just generated for these settings stays
+        correct (EG: the next midnight for a plugin that changes daily). The scheduler does not regenerate the
+        plugin instance before then, even if its refresh interval has elapsed. Returns None when unknown."""
+        return None
+
+    def get_data_sources(self, settings, device_config):
+        """Optional hook returning the API calls generate_image makes for these settings, in the format accepted
+        by fetch_concurrently. The calls must cache what they fetch (EG: through get_cached_data). The prefetcher runs them in the
+        background shortly before the plugin instance is due, so generate_image reads warm data."""
+        return {}
+
+    def prefetch_data(self, settings, device_config):
+        """Fetches the data sources for these settings into the data cache. Failures are logged, not raised."""
+        try:
+            sources = self.get_data_sources(settings, device_config)
+        except Exception as e:
+            logger.warning(f"Failed to prefetch {self.get_plugin_id()} data: {e}")
+            return
+        if sources:
+            self.fetch_concurrently({name: (func, args, None) for name, (func, args, _) in sources.items()})
+
+    def prefetch_location(self, device_config, lat, long):
+        """Optional hook called in the background when the user saves a default location, so location-based plugins
+        can resolve and cache data for it (EG: its place name) before their first refresh."""
+        pass
+
+    def fetch_concurrently(self, calls, deadline=FETCH_DEADLINE_SECONDS):
+        """Runs independent API calls on the shared pool and returns their results by name.
+
+        calls maps a name to (function, args, fallback). A call that fails or misses the deadline returns its
+        fallback, unless the fallback is REQUIRED in which case an error is raised. Calls still running after the
+        deadline are left to finish in the background, filling the data cache for the next refresh."""
+        # each call runs in a copy of the current context so stale data it reads is tracked for this refresh
+        futures = {name: FETCH_EXECUTOR.submit(contextvars.copy_context().run, func, *args)
+                   for name, (func, args, _) in calls.items()}
+        end_time = time.monotonic() + deadline
+
+        results = {}
+        for name, future in futures.items():
+            fallback = calls[name][2]
+            try:
+                results[name] = future.result(timeout=max(end_time - time.monotonic(), 0))
+            except FutureTimeoutError:
+                if fallback is REQUIRED:
+                    raise RuntimeError(f"Timed out fetching {name}.")
+                logger.warning(f"Timed out fetching {name} after {deadline}s, continuing without it")
+                results[name] = fallback
+            except Exception as e:
+                if fallback is REQUIRED:
+                    raise
+                logger.warning(f"Failed to fetch {name}: {e}")
+                results[name] = fallback
+        return results
+
+    def get_cached_data(self, key, fetch_fn, ttl, stale_ttl=0, negative_ttl=60, quota=None):
+        """Returns data cached under key, calling fetch_fn() to fetch it when missing or expired.
+
+        ttl is how many seconds fetched data stays fresh. Within stale_ttl seconds after expiry the stale data is
+        returned immediately and refetched in the background. Failures are remembered for negative_ttl seconds, and
+        the error is raised again without calling fetch_fn. Every fetch takes a token from quota (see get_quota),
+        cached data of any age is returned once it is exhausted. The data must be JSON-serializable."""
+        return self.data_cache.get(f"{self.get_plugin_id()}:{key}", fetch_fn, ttl, stale_ttl, negative_ttl, quota)
+
+    def get_quota(self, provider, api_key=None):
+        """Returns the token bucket limiting requests to provider with api_key, shared by all plugins."""
+        return get_quota_manager().get_bucket(provider, api_key)
+
+    def get_data_expiry(self, current_dt):
+        """Returns the datetime at which the earliest cached data read by the image just generated expires, for
+        get_valid_until. Returns None when no cached data was read or it already expired (EG: stale data served
+        while refreshing in the background), so the image is not declared valid past that data."""
+        expires_at = get_data_expiry()
+        if expires_at is None or expires_at <= current_dt.timestamp():
+            return None
+        return datetime.fromtimestamp(expires_at, current_dt.tzinfo)
+
     def get_plugin_id(self):
         return self.config.get("id")
 
@@ -85,5 +182,28 @@ class BasePlugin:
         # load and render the given html template
         template = self.env.get_template(html_file)
         rendered_html = template.render(template_params)
+        rendered_html = self.localize_remote_images(rendered_html, dimensions)
 
         return take_screenshot_html(rendered_html, dimensions)
+
+    def localize_remote_images(self, rendered_html, dimensions):
+        """Replaces remote images in rendered HTML with local copies downscaled to the screen size, downloaded
+        concurrently before rendering so the browser never waits on the network. Images that fail to download keep
+        their remote URL, for the browser to try again."""
+        image_urls = find_remote_images(rendered_html)
+        if not image_urls:
+            return rendered_html
+
+        # URLs in the HTML are entity-escaped by the templates
+        calls = {url: (localize_image, (html.unescape(url), tuple(dimensions)), None) for url in image_urls}
+        local_paths = self.fetch_concurrently(calls)
+        failed_urls = [url for url, path in local_paths.items() if path is None]
+        if failed_urls:
+            logger.warning(f"Failed to localize {len(failed_urls)} of {len(image_urls)} images, keeping their remote "
+                           f"URLs: {failed_urls}")
+        if len(failed_urls) == len(image_urls):
+            return rendered_html
+        # a single pass, longest first, so a URL that prefixes another one doesn't break it. Failed URLs are matched
+        # too and written back unchanged
+        pattern = re.compile("|".join(re.escape(url) for url in sorted(local_paths, key=len, reverse=True)))
+        return pattern.sub(lambda match: local_paths[match.group(0)] or match.group(0), rendered_html)
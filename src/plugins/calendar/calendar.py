@@ -1,19 +1,41 @@
 import os
+import time
+import hashlib
+import threading
+import requests
+from collections import OrderedDict
 from utils.app_utils import resolve_path, get_font
-from plugins.base_plugin.base_plugin import BasePlugin
+from plugins.base_plugin.base_plugin import BasePlugin, REQUIRED
+from utils.data_cache import record_stale_data
 from plugins.calendar.constants import LOCALE_MAP, FONT_SIZES
 from PIL import Image, ImageColor, ImageDraw, ImageFont
 import icalendar
 import recurring_ical_events
 from io import BytesIO
 import logging
-import requests
 from datetime import datetime, timedelta
 import pytz
 
 logger = logging.getLogger(__name__)
 
+# parsed feeds kept in memory, keyed by a hash of their content
+MAX_PARSED_CALENDARS = 8
+# expanded occurrences kept in memory, keyed by feed content, timezone and view range
+MAX_OCCURRENCE_RANGES = 32
+# large shared calendars can take a while to download on a Pi
+FETCH_DEADLINE_SECONDS = 60
+
 class Calendar(BasePlugin):
+    def __init__(self, config, **dependencies):
+        super().__init__(config, **dependencies)
+        self.lock = threading.Lock()
+        # url -> validators, content hash and fetch time of the latest download
+        self.feeds = {}
+        # content hash -> parsed icalendar.Calendar, least recently used first
+        self.parsed_calendars = OrderedDict()
+        # (content hash, timezone, start, end) -> events parsed from the expanded occurrences
+        self.occurrences = OrderedDict()
+
     def generate_settings_template(self):
         template_params = super().generate_settings_template()
         template_params['style_settings'] = True
@@ -70,29 +92,52 @@ class Calendar(BasePlugin):
             raise RuntimeError("Failed to take screenshot, please check logs.")
         return image
     
+    def get_data_sources(self, settings, device_config):
+        # downloading and parsing the feeds ahead of time leaves a quick revalidation for the refresh
+        calendar_urls = settings.get('calendarURLs[]') or []
+        return {str(i): (self.fetch_calendar, (url,), REQUIRED) for i, url in enumerate(calendar_urls) if url.strip()}
+
     def fetch_ics_events(self, calendar_urls, colors, tz, start_range, end_range):
-        parsed_events = []
+        # feeds are independent, download them concurrently
+        calls = {str(i): (self.fetch_calendar, (url,), REQUIRED) for i, url in enumerate(calendar_urls)}
+        calendars = self.fetch_concurrently(calls, deadline=FETCH_DEADLINE_SECONDS)
 
-        for calendar_url, color in zip(calendar_urls, colors):
-            cal = self.fetch_calendar(calendar_url)
-            events = recurring_ical_events.of(cal).between(start_range, end_range)
+        parsed_events = []
+        for i, color in enumerate(colors[:len(calendar_urls)]):
+            content_hash, cal = calendars[str(i)]
             contrast_color = self.get_contrast_color(color)
-
-            for event in events:
-                start, end, all_day = self.parse_data_points(event, tz)
-                parsed_event = {
-                    "title": str(event.get("summary")),
-                    "start": start,
-                    "backgroundColor": color,
-                    "textColor": contrast_color,
-                    "allDay": all_day
-                }
-                if end:
-                    parsed_event['end'] = end
-
-                parsed_events.append(parsed_event)
+            for event in self.get_occurrences(content_hash, cal, tz, start_range, end_range):
+                parsed_events.append(dict(event, backgroundColor=color, textColor=contrast_color))
 
         return parsed_events
+
+    def get_occurrences(self, content_hash, cal, tz, start_range, end_range):
+        """Returns the events of a parsed feed occurring between start_range and end_range. Expanding recurrences is
+        slow for calendars with years of history, so the result is kept until the feed or the range changes."""
+        key = (content_hash, tz.zone, start_range.isoformat(), end_range.isoformat())
+        with self.lock:
+            events = self.occurrences.get(key)
+            if events is not None:
+                self.occurrences.move_to_end(key)
+                return events
+
+        events = []
+        for event in recurring_ical_events.of(cal).between(start_range, end_range):
+            start, end, all_day = self.parse_data_points(event, tz)
+            parsed_event = {
+                "title": str(event.get("summary")),
+                "start": start,
+                "allDay": all_day
+            }
+            if end:
+                parsed_event['end'] = end
+            events.append(parsed_event)
+
+        with self.lock:
+            self.occurrences[key] = events
+            while len(self.occurrences) > MAX_OCCURRENCE_RANGES:
+                self.occurrences.popitem(last=False)
+        return events
     
     def get_view_range(self, view, current_dt, settings):
         start = datetime(current_dt.year, current_dt.month, current_dt.day)
@@ -107,8 +152,9 @@ class Calendar(BasePlugin):
                 start = datetime(start.year, start.month, start.day)
             end = start + timedelta(days=7)
         elif view == "dayGrid":
-            start = current_dt - timedelta(weeks=1)
-            end = current_dt + timedelta(weeks=int(settings.get("displayWeeks") or 4))
+            # whole days, so the range and its cached occurrences only change daily
+            end = start + timedelta(days=1, weeks=int(settings.get("displayWeeks") or 4))
+            start = start - timedelta(weeks=1)
         elif view == "dayGridMonth":
             start = datetime(current_dt.year, current_dt.month, 1) - timedelta(weeks=1)
             end = datetime(current_dt.year, current_dt.month, 1) + timedelta(weeks=6)
@@ -138,13 +184,61 @@ class Calendar(BasePlugin):
         return start, end, all_day
 
     def fetch_calendar(self, calendar_url):
+        """Downloads a feed and returns (content hash, parsed calendar). The previous download is revalidated with
+        its ETag / Last-Modified, and a feed is only parsed again when its content changed. When the feed can't be
+        reached (EG: while offline), the previous download is returned and recorded as stale data."""
+        with self.lock:
+            feed = self.feeds.get(calendar_url)
+            cal = self.parsed_calendars.get(feed["hash"]) if feed else None
+
+        # feeds can be several MB, they are revalidated here rather than kept by the shared HTTP client
+        headers = {}
+        if cal is not None:
+            if feed.get("etag"):
+                headers["If-None-Match"] = feed["etag"]
+            if feed.get("last_modified"):
+                headers["If-Modified-Since"] = feed["last_modified"]
         try:
-            response = requests.get(calendar_url)
+            response = self.http.get(calendar_url, headers=headers, conditional=False)
+            if response.status_code == 304 and cal is not None:
+                logger.debug(f"Calendar not modified. | url: {calendar_url}")
+                with self.lock:
+                    feed["fetched_at"] = time.time()
+                return feed["hash"], cal
             response.raise_for_status()
-            return icalendar.Calendar.from_ical(response.text)
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+            if cal is None:
+                raise RuntimeError(f"Failed to fetch iCalendar url: {str(e)}")
+            logger.warning(f"Calendar unreachable, using the previous download. | url: {calendar_url} | error: {e}")
+            record_stale_data(feed["fetched_at"])
+            return feed["hash"], cal
         except Exception as e:
             raise RuntimeError(f"Failed to fetch iCalendar url: {str(e)}")
 
+        content_hash = hashlib.sha256(response.content).hexdigest()
+        with self.lock:
+            self.feeds[calendar_url] = {
+                "etag": response.headers.get("ETag"),
+                "last_modified": response.headers.get("Last-Modified"),
+                "hash": content_hash,
+                "fetched_at": time.time()
+            }
+            cal = self.parsed_calendars.get(content_hash)
+            if cal is not None:
+                self.parsed_calendars.move_to_end(content_hash)
+                return content_hash, cal
+
+        try:
+            cal = icalendar.Calendar.from_ical(response.text)
+        except Exception as e:
+            raise RuntimeError(f"Failed to parse iCalendar url: {str(e)}")
+
+        with self.lock:
+            self.parsed_calendars[content_hash] = cal
+            while len(self.parsed_calendars) > MAX_PARSED_CALENDARS:
+                self.parsed_calendars.popitem(last=False)
+        return content_hash, cal
+
     def get_contrast_color(self, color):
         """
         Returns '#000000' (black) or '#ffffff' (white) depending on the contrast
@@ -1,5 +1,6 @@
 import os
 from utils.app_utils import resolve_path, get_font
+from utils.time_utils import get_next_minute
 from plugins.base_plugin.base_plugin import BasePlugin
 from PIL import Image, ImageColor, ImageDraw, ImageFont
 from io import BytesIO
@@ -77,6 +78,10 @@ class Clock(BasePlugin):
             raise RuntimeError("Failed to display clock.")
         return img
     
+    def get_valid_until(self, settings, device_config, current_dt):
+        # every clock face shows hours and minutes only
+        return get_next_minute(current_dt)
+
     def draw_digital_clock(self, dimensions, time, primary_color=(255,255,255), secondary_color=(0,0,0)):
         w,h = dimensions
         time_str = Clock.format_time(time.hour, time.minute, zero_pad = True)
@@ -1,10 +1,14 @@
-from plugins.base_plugin.base_plugin import BasePlugin
+from plugins.base_plugin.base_plugin import BasePlugin, REQUIRED
 from PIL import Image, ImageDraw, ImageFont
 
-import requests
-
 from .comic_parser import COMICS, get_panel
 from utils.app_utils import get_font
+from utils.image_utils import localize_image
+
+# comics publish at most daily, the feed is checked hourly and revalidated with a conditional GET
+PANEL_CACHE_SECONDS = 60 * 60
+# a strip's image never changes once published
+PANEL_IMAGE_CACHE_SECONDS = 30 * 24 * 60 * 60
 
 class Comic(BasePlugin):
     def generate_settings_template(self):
@@ -20,7 +24,7 @@ class Comic(BasePlugin):
         is_caption = settings.get("titleCaption") == "true"
         caption_font_size = settings.get("fontSize")
 
-        comic_panel = get_panel(comic)
+        comic_panel = self.get_cached_panel(comic)
 
         dimensions = device_config.get_resolution()
         if device_config.get_config("orientation") == "vertical":
@@ -29,11 +33,20 @@ class Comic(BasePlugin):
 
         return self._compose_image(comic_panel, is_caption, caption_font_size, width, height)
 
+    def get_data_sources(self, settings, device_config):
+        comic = settings.get("comic")
+        return {"panel": (self.get_cached_panel, (comic,), REQUIRED)} if comic in COMICS else {}
+
+    def get_cached_panel(self, comic):
+        """Returns the latest panel of a comic, resolved from its feed at most every PANEL_CACHE_SECONDS."""
+        return self.get_cached_data(f"panel_{comic}", lambda: get_panel(comic), PANEL_CACHE_SECONDS,
+                                    stale_ttl=24 * 60 * 60)
+
     def _compose_image(self, comic_panel, is_caption, caption_font_size, width, height):
-        response = requests.get(comic_panel["image_url"], stream=True)
-        response.raise_for_status()
+        # downloaded once per strip and screen size, then read from disk
+        image_path = localize_image(comic_panel["image_url"], (width, height), max_age=PANEL_IMAGE_CACHE_SECONDS)
 
-        with Image.open(response.raw) as img:
+        with Image.open(image_path) as img:
             background = Image.new("RGB", (width, height), "white")
             font = get_font("Jost", font_size=int(caption_font_size))
             draw = ImageDraw.Draw(background)
@@ -1,6 +1,7 @@
 import feedparser
 import html
 import re
+from utils.http_client import get_http_client
 
 
 COMICS = {
@@ -64,7 +65,9 @@ COMICS = {
 
 
 def get_panel(comic_name):
-    feed = feedparser.parse(COMICS[comic_name]["feed"])
+    response = get_http_client().get(COMICS[comic_name]["feed"])
+    response.raise_for_status()
+    feed = feedparser.parse(response.content)
     try:
         element = COMICS[comic_name]["element"](feed)
     except IndexError:
@@ -1,6 +1,7 @@
 from plugins.base_plugin.base_plugin import BasePlugin
 from PIL import Image
 from datetime import datetime, timezone
+from utils.time_utils import get_next_midnight
 import logging
 import pytz
 
@@ -41,4 +42,9 @@ class Countdown(BasePlugin):
         }
 
         image = self.render_image(dimensions, "countdown.html", "countdown.css", template_params)
-        return image
\ No newline at end of file
+        return image
+
+    def get_valid_until(self, settings, device_config, current_dt):
+        # the day count only changes at midnight in the device timezone
+        tz = pytz.timezone(device_config.get_config("timezone", default="America/New_York"))
+        return get_next_midnight(current_dt.astimezone(tz))
\ No newline at end of file
@@ -1,26 +1,16 @@
-import requests
+import json
+import hashlib
 import logging
+import numpy as np
+from collections import OrderedDict
 from datetime import datetime, date, timedelta
+from .github_graphql import fetch_user_data
 
 logger = logging.getLogger(__name__)
 
-GRAPHQL_QUERY = """
-query($username: String!) {
-  user(login: $username) {
-    contributionsCollection {
-      contributionCalendar {
-        totalContributions
-        weeks {
-          contributionDays {
-            contributionCount
-            date
-          }
-        }
-      }
-    }
-  }
-}
-"""
+# grids and metrics computed from a response, reused until the response or the day changes
+MAX_CACHED_GRIDS = 8
+_grid_cache = OrderedDict()
 
 def contributions_generate_image(plugin_instance, settings, device_config):
     dimensions = device_config.get_resolution()
@@ -36,10 +26,8 @@ def contributions_generate_image(plugin_instance, settings, device_config):
     if not github_username:
         raise RuntimeError("GitHub username is required.")
 
-    data = fetch_contributions(github_username, api_key)
-    grid, month_positions = parse_contributions(data, colors)
-    metrics = calculate_metrics(data)
-
+    data = fetch_user_data(plugin_instance, github_username, api_key)
+    grid, month_positions, metrics = get_grid_and_metrics(data, colors)
     template_params = {
         "username": github_username,
         "grid": grid,
@@ -59,29 +47,38 @@ def contributions_generate_image(plugin_instance, settings, device_config):
 # Helper functions
 # -------------------------
 
-def fetch_contributions(username, api_key):
-    url = "https://api.github.com/graphql"
-    headers = {"Authorization": f"Bearer {api_key}"}
-    variables = {"username": username}
-    resp = requests.post(url, json={"query": GRAPHQL_QUERY, "variables": variables}, headers=headers)
-    resp.raise_for_status()
-    return resp.json()
+def get_grid_and_metrics(data, colors):
+    """Returns the grid, month positions and metrics of a response. They only change with the response, so they
+    are kept by its hash and recomputed only when the contributions changed."""
+    response_hash = hashlib.sha1(json.dumps(data, sort_keys=True).encode("utf-8")).hexdigest()
+    key = (response_hash, tuple(colors), date.today().isoformat())
+    cached = _grid_cache.get(key)
+    if cached is None:
+        grid, month_positions = parse_contributions(data, colors)
+        cached = (grid, month_positions, calculate_metrics(data))
+        _grid_cache[key] = cached
+        while len(_grid_cache) > MAX_CACHED_GRIDS:
+            _grid_cache.popitem(last=False)
+    return cached
 
 def parse_contributions(data, colors):
     weeks = data["data"]["user"]["contributionsCollection"]["contributionCalendar"]["weeks"]
 
-    grid = [[day for day in week["contributionDays"]] for week in weeks]
-    max_contrib = max(day["contributionCount"] for week in grid for day in week)
+    grid = [[dict(day) for day in week["contributionDays"]] for week in weeks]
+    counts = np.array([day["contributionCount"] for week in grid for day in week])
+    max_contrib = counts.max() if counts.size else 0
 
-    def get_color(count):
-        if max_contrib == 0 or count == 0:
-            return colors[0]
-        level = int((count / max_contrib) * (len(colors) - 1))
-        return colors[max(1, level)]
+    # color level of every day at once, zero days get the first color
+    if max_contrib == 0:
+        levels = np.zeros(counts.shape, dtype=int)
+    else:
+        levels = np.maximum(1, (counts / max_contrib * (len(colors) - 1)).astype(int))
+        levels[counts == 0] = 0
 
+    day_levels = iter(levels.tolist())
     for week in grid:
         for day in week:
-            day["color"] = get_color(day["contributionCount"])
+            day["color"] = colors[next(day_levels)]
 
     month_positions = []
     seen_months = set()
@@ -101,25 +98,30 @@ def parse_contributions(data, colors):
 def calculate_metrics(data):
     weeks = data["data"]["user"]["contributionsCollection"]["contributionCalendar"]["weeks"]
     days = [day for week in weeks for day in week["contributionDays"]]
-    days = sorted(days, key=lambda d: d["date"])
-
-    total = sum(day["contributionCount"] for day in days)
-    streak, longest_streak, current_streak = 0, 0, 0
-    today = date.today()
-    yesterday = today - timedelta(days=1)
-    in_current_streak = False
-
-    for day in days:
-        day_date = date.fromisoformat(day["date"])
-        if day["contributionCount"] > 0:
-            streak += 1
-            longest_streak = max(longest_streak, streak)
-            if day_date in (today, yesterday) or in_current_streak:
-                current_streak = streak
-                in_current_streak = True
-        else:
-            streak = 0
-            in_current_streak = False
+
+    # counts indexed by date
+    dates = np.array([day["date"] for day in days], dtype="datetime64[D]")
+    counts = np.array([day["contributionCount"] for day in days])
+    order = np.argsort(dates, kind="stable")
+    dates, counts = dates[order], counts[order]
+
+    total = int(counts.sum())
+
+    # runs of consecutive days with contributions, as [start, end) indexes
+    active = np.concatenate(([0], (counts > 0).astype(np.int8), [0]))
+    edges = np.flatnonzero(np.diff(active))
+    starts, ends = edges[::2], edges[1::2]
+    lengths = ends - starts
+    longest_streak = int(lengths.max()) if lengths.size else 0
+
+    # the current streak is the run that reaches today or yesterday
+    today = np.datetime64(date.today(), "D")
+    yesterday = today - np.timedelta64(1, "D")
+    current_streak = 0
+    for start, end, length in zip(starts[::-1], ends[::-1], lengths[::-1]):
+        if dates[start] <= today and dates[end - 1] >= yesterday:
+            current_streak = int(length)
+            break
 
     return [
         {"title": "Contributions", "value": total},
@@ -0,0 +1,76 @@
+import logging
+from utils.http_client import get_http_client
+
+logger = logging.getLogger(__name__)
+
+GRAPHQL_URL = "https://api.github.com/graphql"
+CONTRIBUTIONS_FIELDS = """
+    contributionsCollection {
+      contributionCalendar {
+        totalContributions
+        weeks {
+          contributionDays {
+            contributionCount
+            date
+          }
+        }
+      }
+    }
+"""
+# only readable with a token of the user themselves, or one allowed to see their sponsorships
+SPONSORS_FIELDS = """
+    sponsorshipsAsMaintainer(first: 100) {
+      totalCount
+      nodes {
+        createdAt
+        sponsorEntity {
+          ... on User {
+            login
+            name
+          }
+          ... on Organization {
+            login
+            name
+          }
+        }
+        tier {
+          name
+          monthlyPriceInCents
+        }
+      }
+    }
+    estimatedNextSponsorsPayoutInCents
+"""
+QUERY_TEMPLATE = """
+query($username: String!) {
+  user(login: $username) {%s  }
+}
+"""
+# every field the contributions and sponsors views need, so all instances for a user share one request
+USER_QUERY = QUERY_TEMPLATE % (CONTRIBUTIONS_FIELDS + SPONSORS_FIELDS)
+CONTRIBUTIONS_QUERY = QUERY_TEMPLATE % CONTRIBUTIONS_FIELDS
+USER_DATA_CACHE_SECONDS = 15 * 60
+
+def fetch_user_data(plugin_instance, username, api_key):
+    """Returns the GraphQL response for a user, fetched at most every USER_DATA_CACHE_SECONDS. The response may
+    hold partial data alongside errors (EG: sponsorships not visible to the token), callers check their fields."""
+    def post(query):
+        headers = {"Authorization": f"Bearer {api_key}"}
+        variables = {"username": username}
+        resp = get_http_client().post(GRAPHQL_URL, json={"query": query, "variables": variables}, headers=headers)
+        resp.raise_for_status()
+        return resp.json()
+
+    def fetch():
+        data = post(USER_QUERY)
+        if not (data.get("data") or {}).get("user"):
+            # a token that can't read the sponsor fields can still read the contributions
+            logger.warning(f"GitHub API returned errors for {username}, retrying without sponsor fields: "
+                           f"{data.get('errors')}")
+            data = post(CONTRIBUTIONS_QUERY)
+        if not (data.get("data") or {}).get("user"):
+            raise RuntimeError(f"GitHub API returned errors: {data.get('errors')}")
+        return data
+
+    quota = plugin_instance.get_quota("github", api_key)
+    return plugin_instance.get_cached_data(f"user_{username.lower()}", fetch, USER_DATA_CACHE_SECONDS, quota=quota)
@@ -1,36 +1,8 @@
-import requests
 import logging
+from .github_graphql import fetch_user_data
 
 logger = logging.getLogger(__name__)
 
-GRAPHQL_QUERY = """
-query($username: String!) {
-  user(login: $username) {
-    sponsorshipsAsMaintainer(first: 100) {
-      totalCount
-      nodes {
-        createdAt
-        sponsorEntity {
-          ... on User {
-            login
-            name
-          }
-          ... on Organization {
-            login
-            name
-          }
-        }
-        tier {
-          name
-          monthlyPriceInCents
-        }
-      }
-    }
-    estimatedNextSponsorsPayoutInCents
-  }
-}
-"""
-
 def sponsors_generate_image(plugin_instance, settings, device_config):
     dimensions = device_config.get_resolution()
     if device_config.get_config("orientation") == "vertical":
@@ -44,7 +16,7 @@ def sponsors_generate_image(plugin_instance, settings, device_config):
     if not github_username:
         raise RuntimeError("GitHub username is required.")
 
-    data = fetch_sponsorships(github_username, api_key)
+    data = fetch_sponsorships(plugin_instance, github_username, api_key)
     total_per_month = calculate_monthly_total(data)
 
     template_params = {
@@ -64,17 +36,11 @@ def sponsors_generate_image(plugin_instance, settings, device_config):
 # Helper functions
 # -------------------------
 
-def fetch_sponsorships(username, api_key):
-    url = "https://api.github.com/graphql"
-    headers = {"Authorization": f"Bearer {api_key}"}
-    variables = {"username": username}
-
-    resp = requests.post(url, json={"query": GRAPHQL_QUERY, "variables": variables}, headers=headers)
-    resp.raise_for_status()
-    data = resp.json()
-
-    if "errors" in data:
-        raise RuntimeError(f"GitHub API returned errors: {data['errors']}")
+def fetch_sponsorships(plugin_instance, username, api_key):
+    data = fetch_user_data(plugin_instance, username, api_key)
+    # the contributions in the shared response can be served with sponsorship errors, sponsors can't
+    if not data["data"]["user"].get("sponsorshipsAsMaintainer"):
+        raise RuntimeError(f"GitHub API returned errors: {data.get('errors')}")
 
     logger.debug(f"Fetched sponsor data for {username}: {data}")
     return data
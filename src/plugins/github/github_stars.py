@@ -1,8 +1,10 @@
 import logging
-import requests
+from utils.http_client import get_http_client
 
 logger = logging.getLogger(__name__)
 
+STARS_CACHE_SECONDS = 10 * 60
+
 def stars_generate_image(plugin_instance, settings, device_config):
     username = settings.get('githubUsername')
     repository = settings.get('githubRepository')
@@ -16,7 +18,9 @@ def stars_generate_image(plugin_instance, settings, device_config):
         raise RuntimeError("GitHub repository is required.")
 
     try:
-        stars = fetch_stars(github_repository)
+        stars = plugin_instance.get_cached_data(f"stars_{github_repository.lower()}",
+                                                lambda: fetch_stars(github_repository), STARS_CACHE_SECONDS,
+                                                quota=plugin_instance.get_quota("github_public"))
     except Exception as e:
         logger.error(f"GitHub graphql request failed: {str(e)}")
         raise RuntimeError(f"GitHub request failure, please check logs")
@@ -35,15 +39,13 @@ def stars_generate_image(plugin_instance, settings, device_config):
     )
 
 def fetch_stars(github_repository):
-    global data
     url = f"https://api.github.com/repos/{github_repository}"
     headers = {"Accept": "application/json"}
 
-    response = requests.get(url, headers=headers)
-    if response.status_code == 200:
-        data = response.json()
-    else:
+    # the shared client revalidates with the ETag, an unchanged repository costs a 304 without a body
+    response = get_http_client().get(url, headers=headers)
+    if response.status_code != 200:
         logger.error(f"GitHub Stars Plugin: Error: {response.status_code} - {response.text}")
+        response.raise_for_status()
 
-    return data['stargazers_count']
-
+    return response.json()['stargazers_count']
@@ -1,25 +1,42 @@
 from plugins.base_plugin.base_plugin import BasePlugin
 from PIL import Image, ImageOps, ImageColor
+import threading
 import logging
 import os
-import random
 
 from utils.image_utils import pad_image_blur
+from utils.folder_index import FolderIndex
 
 logger = logging.getLogger(__name__)
 
-def list_files_in_folder(folder_path):
-    """Return a list of image file paths in the given folder, excluding hidden files."""
-    image_extensions = ('.jpg', '.jpeg', '.png', '.gif', '.bmp', '.tiff', '.webp', '.heif', '.heic')
-    image_files = []
-    for root, dirs, files in os.walk(folder_path):
-        for f in files:
-            if f.lower().endswith(image_extensions) and not f.startswith('.'):
-                image_files.append(os.path.join(root, f))
+EXIF_ORIENTATION_TAG = 0x0112
 
-    return image_files
+def read_image_info(image_path):
+    """Returns the width, height and EXIF orientation of an image, reading only its header."""
+    with Image.open(image_path) as img:
+        return img.width, img.height, img.getexif().get(EXIF_ORIENTATION_TAG, 1)
 
 class ImageFolder(BasePlugin):
+    def __init__(self, config, **dependencies):
+        super().__init__(config, **dependencies)
+        self.lock = threading.Lock()
+        # folder path -> FolderIndex
+        self.indexes = {}
+
+    def get_index(self, folder_path):
+        with self.lock:
+            index = self.indexes.get(folder_path)
+            if index is None:
+                index = self.indexes[folder_path] = FolderIndex(folder_path, read_image_info)
+            return index
+
+    def get_data_sources(self, settings, device_config):
+        folder_path = settings.get('folder_path')
+        if not folder_path or not os.path.isdir(folder_path):
+            return {}
+        # rescanning ahead of the refresh keeps a changed folder off the refresh path
+        return {"index": (self.get_index(folder_path).refresh, (), None)}
+
     def generate_image(self, settings, device_config):
         folder_path = settings.get('folder_path')
         if not folder_path:
@@ -37,11 +54,18 @@ class ImageFolder(BasePlugin):
 
         logger.info(f"Grabbing a random image from: {folder_path}")
 
-        image_files = list_files_in_folder(folder_path)
-        if not image_files:
+        index = self.get_index(folder_path)
+        image_url = None
+        if settings.get('matchOrientation') == "true":
+            shape = "landscape" if dimensions[0] >= dimensions[1] else "portrait"
+            image_url = index.draw(shape)
+            if not image_url:
+                logger.warning(f"No {shape} images found in folder, using any image")
+        if not image_url:
+            image_url = index.draw()
+        if not image_url:
             raise RuntimeError(f"No image files found in folder: {folder_path}")
 
-        image_url = random.choice(image_files)
         logger.info(f"Random image selected {image_url}")
 
         img = None
@@ -1,6 +1,6 @@
 from plugins.base_plugin.base_plugin import BasePlugin
 from datetime import datetime, timedelta
-from utils.image_utils import get_image
+from utils.image_utils import localize_image
 from PIL import Image
 import logging
 from plugins.newspaper.constants import NEWSPAPERS
@@ -8,6 +8,15 @@ from plugins.newspaper.constants import NEWSPAPERS
 logger = logging.getLogger(__name__)
 
 FREEDOM_FORUM_URL = "https://cdn.freedomforum.org/dfp/jpg{}/lg/{}.jpg"
+# a newer front page may be published later in the day
+FRONT_PAGE_CACHE_SECONDS = 60 * 60
+
+def get_localized_size(resolution):
+    """Returns the size front pages are localized to. The display keeps the full page width whichever way it is
+    oriented, so the page must stay at least as wide as the longest side of the display to never be upscaled."""
+    side = max(resolution)
+    return side, side
+
 class Newspaper(BasePlugin):
     def generate_image(self, settings, device_config):
         newspaper_slug = settings.get('newspaperSlug')
@@ -19,39 +28,48 @@ class Newspaper(BasePlugin):
         # Get today's date
         today = datetime.today()
 
+        front_page = self.get_cached_data(f"front_page_{newspaper_slug}_{today.strftime('%Y-%m-%d')}",
+                                          lambda: self.find_front_page(newspaper_slug, today),
+                                          FRONT_PAGE_CACHE_SECONDS, negative_ttl=15 * 60)
+
+        dimensions = device_config.get_resolution()
+        if device_config.get_config("orientation") == "horizontal":
+            dimensions = dimensions[::-1]
+
+        # downloaded once and decoded at reduced size, the front pages are several thousand pixels tall
+        image = Image.open(localize_image(front_page["url"], get_localized_size(dimensions), cover=True))
+
+        # expand height if newspaper is wider than resolution
+        img_width, img_height = image.size
+
+        desired_width, desired_height = dimensions
+
+        img_ratio = img_width / img_height
+        desired_ratio = desired_width / desired_height
+
+        if img_ratio < desired_ratio:
+            new_height =  int((img_width*desired_width) / desired_height)
+            new_image = Image.new("RGB", (img_width, new_height), (255, 255, 255))
+            new_image.paste(image, (0, 0))
+            image = new_image
+
+        return image
+
+    def find_front_page(self, newspaper_slug, today):
+        """Probes the candidate dates concurrently and returns the date and URL of the newest front page."""
         # check the next day, then today, then prior day
         days = [today + timedelta(days=diff) for diff in [1,0,-1,-2]]
+        image_urls = [FREEDOM_FORUM_URL.format(date.day, newspaper_slug) for date in days]
+        found = self.fetch_concurrently({url: (self._front_page_exists, (url,), False) for url in image_urls})
 
-        image = None
-        for date in days:
-            image_url = FREEDOM_FORUM_URL.format(date.day, newspaper_slug)
-            image = get_image(image_url)
-            if image:
-                logging.info(f"Found {newspaper_slug} front cover for {date.strftime('%Y-%m-%d')}")
-                break
-
-        if image:
-            # expand height if newspaper is wider than resolution
-            img_width, img_height = image.size
-
-            dimensions = device_config.get_resolution()
-            if device_config.get_config("orientation") == "horizontal":
-                dimensions = dimensions[::-1]
-
-            desired_width, desired_height = dimensions
-
-            img_ratio = img_width / img_height
-            desired_ratio = desired_width / desired_height
-
-            if img_ratio < desired_ratio:
-                new_height =  int((img_width*desired_width) / desired_height)
-                new_image = Image.new("RGB", (img_width, new_height), (255, 255, 255))
-                new_image.paste(image, (0, 0))
-                image = new_image
-        else:
-            raise RuntimeError("Newspaper front cover not found.")
-    
-        return image
+        for date, image_url in zip(days, image_urls):
+            if found[image_url]:
+                logger.info(f"Found {newspaper_slug} front cover for {date.strftime('%Y-%m-%d')}")
+                return {"date": date.strftime('%Y-%m-%d'), "url": image_url}
+        raise RuntimeError("Newspaper front cover not found.")
+
+    def _front_page_exists(self, image_url):
+        return self.http.head(image_url).status_code == 200
     
     def generate_settings_template(self):
         template_params = super().generate_settings_template()
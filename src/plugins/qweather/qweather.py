@@ -1,9 +1,8 @@
-from plugins.base_plugin.base_plugin import BasePlugin
+from plugins.base_plugin.base_plugin import BasePlugin, REQUIRED
+from utils.data_cache import make_request_key, get_geo_cache
 from PIL import Image
 import os
-import requests
 import logging
-import json
 from datetime import datetime, timezone, date, timedelta
 from astral import moon
 import pytz
@@ -151,6 +150,16 @@ QWEATHER_DAY_TO_NIGHT = {
     "104": "154",  # Overcast -> Overcast night
 }
 
+# seconds each QWeather response stays fresh, roughly how often the API publishes new data
+CACHE_TTLS = {
+    "now": 10 * 60,
+    "minutely": 5 * 60,
+    "hourly": 30 * 60,
+    "daily": 60 * 60,
+    "aqi": 30 * 60,
+    "alerts": 5 * 60
+}
+
 class QWeather(BasePlugin):
     def generate_settings_template(self):
         template_params = super().generate_settings_template()
@@ -162,56 +171,6 @@ class QWeather(BasePlugin):
         template_params['style_settings'] = True
         return template_params
 
-    def _get_cache_dir(self):
-        """Get the cache directory path."""
-        cache_dir = os.path.join(self.get_plugin_dir(), 'cache')
-        os.makedirs(cache_dir, exist_ok=True)
-        return cache_dir
-
-    def _get_cached_data(self, cache_key, api_func, cache_minutes):
-        """
-        Get data from cache or fetch from API.
-
-        Args:
-            cache_key: Unique identifier for the cache file
-            api_func: Function to call if cache is expired/missing
-            cache_minutes: Cache expiration time in minutes
-
-        Returns:
-            Cached or fresh data
-        """
-        cache_dir = self._get_cache_dir()
-        cache_file = os.path.join(cache_dir, f'{cache_key}.json')
-
-        # Check if cache exists and is valid
-        if os.path.exists(cache_file):
-            try:
-                with open(cache_file, 'r') as f:
-                    cached = json.load(f)
-                    cache_time = datetime.fromisoformat(cached.get('time', ''))
-                    if datetime.now() - cache_time < timedelta(minutes=cache_minutes):
-                        logger.info(f"Using cached data for {cache_key} (age: {(datetime.now() - cache_time).seconds} seconds)")
-                        return cached['data']
-            except (json.JSONDecodeError, ValueError, KeyError) as e:
-                logger.warning(f"Failed to read cache for {cache_key}: {e}")
-
-        # Fetch fresh data
-        logger.info(f"Fetching fresh data for {cache_key}")
-        data = api_func()
-
-        # Save to cache
-        try:
-            with open(cache_file, 'w') as f:
-                json.dump({
-                    'time': datetime.now().isoformat(),
-                    'data': data
-                }, f)
-            logger.info(f"Cached data for {cache_key} for {cache_minutes} minutes")
-        except Exception as e:
-            logger.warning(f"Failed to cache data for {cache_key}: {e}")
-
-        return data
-
     def generate_image(self, settings, device_config):
         # Store settings for debug access
         self.current_settings = settings
@@ -237,11 +196,6 @@ class QWeather(BasePlugin):
         if display_style not in ['default', 'nothing', 'qweather']:
             display_style = 'default'
 
-        api_key = device_config.load_env_key("QWEATHER_API_KEY")
-        if not api_key:
-            raise RuntimeError("QWeather API Key not configured.")
-
-        host = settings.get('qweatherHost') or device_config.load_env_key("QWEATHER_HOST") or 'https://devapi.qweather.com'
         title = settings.get('customTitle', '')
 
         mock_alert_headline = settings.get('mockAlertHeadline', '')
@@ -256,21 +210,14 @@ class QWeather(BasePlugin):
         tz = pytz.timezone(timezone)
 
         try:
-            location_id = self.get_location_id(host, api_key, lat, long)
-
-            weather_data = self.get_weather_data(host, api_key, location_id, units)
-            daily_forecast = self.get_daily_forecast(host, api_key, location_id, units)
-            hourly_forecast = self.get_hourly_forecast(host, api_key, location_id, units)
-
-            # Only call minutely API if mergeMinutelyData is enabled
-            merge_minutely = settings.get("mergeMinutelyData", "false").lower() == "true"
-            if merge_minutely:
-                minutely_forecast = self.get_minutely_forecast(host, api_key, location_id)
-            else:
-                minutely_forecast = []
+            results = self.fetch_concurrently(self.get_data_sources(settings, device_config))
 
-            air_quality = self.get_air_quality(host, api_key, location_id)
-            weather_alerts = self.get_weather_alerts(host, api_key, lat, long)
+            weather_data = results["weather_data"]
+            daily_forecast = results["daily_forecast"]
+            hourly_forecast = results["hourly_forecast"]
+            minutely_forecast = results.get("minutely_forecast", [])
+            air_quality = results["air_quality"]
+            weather_alerts = results["weather_alerts"]
 
             if mock_alert_headline:
                 logger.info(f"Using mock weather alert: {mock_alert_headline}, severity: {mock_alert_severity}")
@@ -278,8 +225,8 @@ class QWeather(BasePlugin):
                 logger.info(f"Mock weather alerts created: {weather_alerts}")
 
             if not title:
-                # Try to get location name from GeoAPI
-                location_name = self.get_location_name(host, api_key, lat, long)
+                # Location name from GeoAPI
+                location_name = results.get("location_name", "")
                 if location_name:
                     title = location_name
                 else:
@@ -347,11 +294,59 @@ class QWeather(BasePlugin):
             raise RuntimeError("Failed to take screenshot, please check logs.")
         return image
 
+    def get_data_sources(self, settings, device_config):
+        lat = settings.get('latitude')
+        long = settings.get('longitude')
+        if not lat or not long:
+            raise RuntimeError("Latitude and Longitude are required.")
+
+        api_key = device_config.load_env_key("QWEATHER_API_KEY")
+        if not api_key:
+            raise RuntimeError("QWeather API Key not configured.")
+
+        units = settings.get('units', 'metric')
+        language = settings.get('language', 'zh')
+        if language not in ['zh', 'en']:
+            language = 'zh'
+        host = self.get_host(settings, device_config)
+        location_id = self.get_location_id(host, api_key, lat, long)
+
+        # Forecasts are required, the optional endpoints fall back to an empty value so a slow one doesn't hold up
+        # the refresh.
+        calls = {
+            "weather_data": (self.get_weather_data, (host, api_key, location_id, units), REQUIRED),
+            "daily_forecast": (self.get_daily_forecast, (host, api_key, location_id, units), REQUIRED),
+            "hourly_forecast": (self.get_hourly_forecast, (host, api_key, location_id, units), REQUIRED),
+            "air_quality": (self.get_air_quality, (host, api_key, location_id), {}),
+            "weather_alerts": (self.get_weather_alerts, (host, api_key, lat, long), [])
+        }
+        # Only call minutely API if mergeMinutelyData is enabled
+        if settings.get("mergeMinutelyData", "false").lower() == "true":
+            calls["minutely_forecast"] = (self.get_minutely_forecast, (host, api_key, location_id), [])
+        if not settings.get('customTitle', ''):
+            calls["location_name"] = (self.get_location_name, (host, api_key, lat, long, language), "")
+        return calls
+
+    def get_valid_until(self, settings, device_config, current_dt):
+        # redrawing before the responses the image was rendered from are refetched would show the same data
+        return self.get_data_expiry(current_dt)
+
+    def prefetch_location(self, device_config, lat, long):
+        api_key = device_config.load_env_key("QWEATHER_API_KEY")
+        if not api_key:
+            return
+        host = self.get_host({}, device_config)
+        for language in LABELS:
+            self.get_location_name(host, api_key, lat, long, language)
+
+    def get_host(self, settings, device_config):
+        return settings.get('qweatherHost') or device_config.load_env_key("QWEATHER_HOST") or 'https://devapi.qweather.com'
+
     def get_location_id(self, host, api_key, lat, long):
         return f"{long},{lat}"
 
-    def get_location_name(self, host, api_key, lat, long):
-        """Get location name from coordinates using QWeather GeoAPI"""
+    def get_location_name(self, host, api_key, lat, long, language="zh"):
+        """Get location name from coordinates using QWeather GeoAPI. Names are kept in the permanent geo cache."""
         # Format coordinates to 2 decimal places as required by QWeather API
         lat_formatted = f"{float(lat):.2f}"
         long_formatted = f"{float(long):.2f}"
@@ -368,38 +363,45 @@ class QWeather(BasePlugin):
 
         params = {
             "location": f"{long_formatted},{lat_formatted}",
-            "key": api_key
+            "key": api_key,
+            "lang": language
         }
-        logger.info(f"Requesting location name from: {url} with location: {params['location']}")
 
-        try:
-            response = requests.get(url, params=params, timeout=10)
+        def fetch_location_name():
+            logger.info(f"Requesting location name from: {url} with location: {params['location']}")
+            response = self.http.get(url, params=params, timeout=10)
             logger.info(f"Location API response status: {response.status_code}")
-            if response.status_code == 200:
-                data = response.json()
-                logger.info(f"Location API response: {data}")
-                if data.get('code') == '200' and data.get('location') and len(data['location']) > 0:
-                    loc = data['location'][0]
-                    # Build location name from name, adm2, adm1
-                    # Example: "东城 北京 北京市" or "Beijing Beijing"
-                    parts = []
-                    name = loc.get('name', '')
-                    adm2 = loc.get('adm2', '')
-                    adm1 = loc.get('adm1', '')
-
-                    # Add unique parts (avoid duplication)
-                    if name and name not in parts:
-                        parts.append(name)
-                    if adm2 and adm2 not in parts and adm2 != name:
-                        parts.append(adm2)
-                    if adm1 and adm1 not in parts and adm1 != adm2:
-                        parts.append(adm1)
-
-                    location_name = ' '.join(parts) if parts else loc.get('country', '')
-                    logger.info(f"Found location name: {location_name}")
-                    return location_name
-                else:
-                    logger.warning(f"Location API returned code: {data.get('code')}, locations: {data.get('location')}")
+            if response.status_code != 200:
+                raise RuntimeError(f"Location API returned status {response.status_code}")
+
+            data = response.json()
+            logger.info(f"Location API response: {data}")
+            if data.get('code') == '200' and data.get('location') and len(data['location']) > 0:
+                loc = data['location'][0]
+                # Build location name from name, adm2, adm1
+                # Example: "东城 北京 北京市" or "Beijing Beijing"
+                parts = []
+                name = loc.get('name', '')
+                adm2 = loc.get('adm2', '')
+                adm1 = loc.get('adm1', '')
+
+                # Add unique parts (avoid duplication)
+                if name and name not in parts:
+                    parts.append(name)
+                if adm2 and adm2 not in parts and adm2 != name:
+                    parts.append(adm2)
+                if adm1 and adm1 not in parts and adm1 != adm2:
+                    parts.append(adm1)
+
+                location_name = ' '.join(parts) if parts else loc.get('country', '')
+                logger.info(f"Found location name: {location_name}")
+                return location_name
+
+            logger.warning(f"Location API returned code: {data.get('code')}, locations: {data.get('location')}")
+            return ""
+
+        try:
+            return get_geo_cache().lookup("qweather", lat, long, fetch_location_name, language)
         except Exception as e:
             logger.error(f"Failed to get location name: {e}")
 
@@ -412,37 +414,40 @@ class QWeather(BasePlugin):
             "key": api_key,
             "unit": "m" if units == "metric" else "i"
         }
-        logger.info(f"Requesting weather data from: {url} with params: {params}")
-        response = requests.get(url, params=params)
-        logger.info(f"Response status: {response.status_code}")
 
-        if response.status_code != 200:
-            logger.error(f"Failed to retrieve weather data. Status: {response.status_code}, Content: {response.content}")
-            raise RuntimeError(f"Failed to retrieve weather data. Status: {response.status_code}")
+        def fetch_now():
+            logger.info(f"Requesting weather data from: {url} with location: {location_id}")
+            response = self.http.get(url, params=params)
+            logger.info(f"Response status: {response.status_code}")
 
-        try:
-            data = response.json()
-        except Exception as e:
-            logger.error(f"Failed to parse JSON response: {e}, Content: {response.text}")
-            raise RuntimeError("Failed to parse weather data.")
+            if response.status_code != 200:
+                logger.error(f"Failed to retrieve weather data. Status: {response.status_code}, Content: {response.content}")
+                raise RuntimeError(f"Failed to retrieve weather data. Status: {response.status_code}")
+
+            try:
+                data = response.json()
+            except Exception as e:
+                logger.error(f"Failed to parse JSON response: {e}, Content: {response.text}")
+                raise RuntimeError("Failed to parse weather data.")
 
-        if data.get('code') != '200':
-            logger.error(f"Invalid weather response: {data}")
-            raise RuntimeError("Failed to get valid weather data.")
+            if data.get('code') != '200':
+                logger.error(f"Invalid weather response: {data}")
+                raise RuntimeError("Failed to get valid weather data.")
 
-        return data['now']
+            return data['now']
+
+        return self._get_cached("now", url, params, fetch_now)
 
     def get_daily_forecast(self, host, api_key, location_id, units):
-        cache_key = f"daily_{location_id}_{units}"
+        url = f"{host}/v7/weather/7d"
+        params = {
+            "location": location_id,
+            "key": api_key,
+            "unit": "m" if units == "metric" else "i"
+        }
 
         def fetch_daily():
-            url = f"{host}/v7/weather/7d"
-            params = {
-                "location": location_id,
-                "key": api_key,
-                "unit": "m" if units == "metric" else "i"
-            }
-            response = requests.get(url, params=params)
+            response = self.http.get(url, params=params)
 
             if response.status_code != 200:
                 logger.error(f"Failed to retrieve daily forecast. Status: {response.status_code}, Content: {response.content}")
@@ -460,8 +465,7 @@ class QWeather(BasePlugin):
 
             return data['daily']
 
-        # Cache for 1 hour (60 minutes)
-        return self._get_cached_data(cache_key, fetch_daily, 60)
+        return self._get_cached("daily", url, params, fetch_daily)
 
     def get_hourly_forecast(self, host, api_key, location_id, units):
         url = f"{host}/v7/weather/24h"
@@ -470,23 +474,27 @@ class QWeather(BasePlugin):
             "key": api_key,
             "unit": "m" if units == "metric" else "i"
         }
-        response = requests.get(url, params=params)
 
-        if response.status_code != 200:
-            logger.error(f"Failed to retrieve hourly forecast. Status: {response.status_code}, Content: {response.content}")
-            raise RuntimeError("Failed to retrieve hourly forecast.")
+        def fetch_hourly():
+            response = self.http.get(url, params=params)
 
-        try:
-            data = response.json()
-        except Exception as e:
-            logger.error(f"Failed to parse JSON response: {e}, Content: {response.text}")
-            raise RuntimeError("Failed to parse hourly forecast data.")
+            if response.status_code != 200:
+                logger.error(f"Failed to retrieve hourly forecast. Status: {response.status_code}, Content: {response.content}")
+                raise RuntimeError("Failed to retrieve hourly forecast.")
+
+            try:
+                data = response.json()
+            except Exception as e:
+                logger.error(f"Failed to parse JSON response: {e}, Content: {response.text}")
+                raise RuntimeError("Failed to parse hourly forecast data.")
+
+            if data.get('code') != '200':
+                logger.error(f"Invalid hourly forecast response: {data}")
+                raise RuntimeError("Failed to get valid hourly forecast data.")
 
-        if data.get('code') != '200':
-            logger.error(f"Invalid hourly forecast response: {data}")
-            raise RuntimeError("Failed to get valid hourly forecast data.")
+            return data['hourly']
 
-        return data['hourly']
+        return self._get_cached("hourly", url, params, fetch_hourly)
 
     def get_minutely_forecast(self, host, api_key, location_id):
         url = f"{host}/v7/minutely/5m"
@@ -494,82 +502,83 @@ class QWeather(BasePlugin):
             "location": location_id,
             "key": api_key
         }
-        response = requests.get(url, params=params)
 
-        if response.status_code != 200:
-            logger.warning(f"Failed to retrieve minutely forecast. Status: {response.status_code}, falling back to hourly only")
-            return []
+        def fetch_minutely():
+            response = self.http.get(url, params=params)
+
+            if response.status_code != 200:
+                raise RuntimeError(f"Failed to retrieve minutely forecast. Status: {response.status_code}")
 
-        try:
             data = response.json()
-        except Exception as e:
-            logger.warning(f"Failed to parse minutely JSON response: {e}, falling back to hourly only")
-            return []
+            if data.get('code') != '200':
+                raise RuntimeError(f"Invalid minutely forecast response: {data}")
 
-        if data.get('code') != '200':
-            logger.warning(f"Invalid minutely forecast response: {data}, falling back to hourly only")
-            return []
+            return data.get('minutely', [])
 
-        return data.get('minutely', [])
+        try:
+            return self._get_cached("minutely", url, params, fetch_minutely)
+        except Exception as e:
+            logger.warning(f"{e}, falling back to hourly only")
+            return []
 
     def get_air_quality(self, host, api_key, location_id):
-        cache_key = f"aqi_{location_id}"
+        long, lat = location_id.split(',')
+        url = f"{host}/airquality/v1/current/{lat}/{long}"
+        params = {
+            "key": api_key
+        }
 
         def fetch_aqi():
-            long, lat = location_id.split(',')
-            url = f"{host}/airquality/v1/current/{lat}/{long}"
-            params = {
-                "key": api_key
-            }
-            response = requests.get(url, params=params)
+            response = self.http.get(url, params=params)
 
             if response.status_code != 200:
-                logger.error(f"Failed to get air quality data: {response.content}")
-                return {}
-
-            try:
-                data = response.json()
-                if data.get('indexes') and len(data['indexes']) > 0:
-                    cn_mee = data['indexes'][0]
-                    return {
-                        'aqi': cn_mee.get('aqi', 'N/A'),
-                        'category': cn_mee.get('category', '')
-                    }
-            except Exception as e:
-                logger.error(f"Failed to parse air quality response: {e}")
+                raise RuntimeError(f"Failed to get air quality data: {response.content}")
 
+            data = response.json()
+            if data.get('indexes') and len(data['indexes']) > 0:
+                cn_mee = data['indexes'][0]
+                return {
+                    'aqi': cn_mee.get('aqi', 'N/A'),
+                    'category': cn_mee.get('category', '')
+                }
             return {}
 
-        # Cache for 30 minutes
-        return self._get_cached_data(cache_key, fetch_aqi, 30)
+        try:
+            return self._get_cached("aqi", url, params, fetch_aqi)
+        except Exception as e:
+            logger.error(f"Failed to get air quality data: {e}")
+            return {}
 
     def get_weather_alerts(self, host, api_key, lat, long):
-        cache_key = f"alerts_{lat}_{long}"
+        url = f"{host}/weatheralert/v1/current/{lat}/{long}"
+        params = {
+            "key": api_key
+        }
 
         def fetch_alerts():
-            url = f"{host}/weatheralert/v1/current/{lat}/{long}"
-            params = {
-                "key": api_key
-            }
-            response = requests.get(url, params=params)
+            response = self.http.get(url, params=params)
 
             if response.status_code != 200:
-                logger.error(f"Failed to get weather alerts: {response.content}")
-                return []
+                raise RuntimeError(f"Failed to get weather alerts: {response.content}")
 
-            try:
-                data = response.json()
-                alerts = data.get('alerts', [])
-                if alerts:
-                    logger.info(f"Found {len(alerts)} weather alert(s)")
-                return alerts
-            except Exception as e:
-                logger.error(f"Failed to parse weather alerts response: {e}")
+            data = response.json()
+            alerts = data.get('alerts', [])
+            if alerts:
+                logger.info(f"Found {len(alerts)} weather alert(s)")
+            return alerts
 
+        try:
+            return self._get_cached("alerts", url, params, fetch_alerts)
+        except Exception as e:
+            logger.error(f"Failed to get weather alerts: {e}")
             return []
 
-        # Cache for 5 minutes
-        return self._get_cached_data(cache_key, fetch_alerts, 5)
+    def _get_cached(self, kind, url, params, fetch_fn):
+        """Returns a QWeather response from the data cache, serving it stale for one more TTL while refetching.
+        Responses are keyed by request, so instances showing the same location share them."""
+        ttl = CACHE_TTLS[kind]
+        quota = self.get_quota("qweather", params.get("key"))
+        return self.get_cached_data(make_request_key(url, params), fetch_fn, ttl, stale_ttl=ttl, quota=quota)
 
     def create_mock_alert(self, headline, description, severity):
         return [{
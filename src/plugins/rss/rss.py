@@ -1,9 +1,12 @@
-from plugins.base_plugin.base_plugin import BasePlugin
+from plugins.base_plugin.base_plugin import BasePlugin, REQUIRED
 from PIL import Image
 from io import BytesIO
+from collections import OrderedDict
 import feedparser
-import requests
+import threading
+import hashlib
 import logging
+import json
 import html
 
 logger = logging.getLogger(__name__)
@@ -15,8 +18,20 @@ FONT_SIZES = {
     "large": 1.1,
     "x-large": 1.3
 }
+# items shown, the rest of the feed is not processed
+MAX_ITEMS = 10
+# rendered images kept in memory, keyed by their template parameters
+MAX_RENDERED_IMAGES = 4
 
 class Rss(BasePlugin):
+    def __init__(self, config, **dependencies):
+        super().__init__(config, **dependencies)
+        self.lock = threading.Lock()
+        # feed url -> ((content hash, max items), parsed items) of the latest download
+        self.parsed_feeds = {}
+        # hash of the template parameters and dimensions -> rendered image, least recently used first
+        self.rendered_images = OrderedDict()
+
     def generate_settings_template(self):
         template_params = super().generate_settings_template()
         template_params['style_settings'] = True
@@ -28,7 +43,7 @@ class Rss(BasePlugin):
         if not feed_url:
             raise RuntimeError("RSS Feed Url is required.")
         
-        items = self.parse_rss_feed(feed_url)
+        items = self.parse_rss_feed(feed_url, max_items=MAX_ITEMS)
 
         dimensions = device_config.get_resolution()
         if device_config.get_config("orientation") == "vertical":
@@ -37,23 +52,50 @@ class Rss(BasePlugin):
         template_params = {
             "title": title,
             "include_images": settings.get("includeImages") == "true",
-            "items": items[:10],
+            "items": items,
             "font_scale": FONT_SIZES.get(settings.get('fontSize', 'normal'), 1),
             "plugin_settings": settings
         }
 
+        # unchanged items and settings render the same image, skip the screenshot
+        render_key = hashlib.sha256(json.dumps([dimensions, template_params], sort_keys=True, default=str).encode("utf-8")).hexdigest()
+        with self.lock:
+            image = self.rendered_images.get(render_key)
+            if image is not None:
+                logger.info("RSS items unchanged, reusing the rendered image.")
+                self.rendered_images.move_to_end(render_key)
+                return image.copy()
+
         image = self.render_image(dimensions, "rss.html", "rss.css", template_params)
+        if image:
+            with self.lock:
+                self.rendered_images[render_key] = image.copy()
+                while len(self.rendered_images) > MAX_RENDERED_IMAGES:
+                    self.rendered_images.popitem(last=False)
         return image
     
-    def parse_rss_feed(self, url, timeout=10):
-        resp = requests.get(url, timeout=timeout, headers={"User-Agent": "Mozilla/5.0"})
+    def get_data_sources(self, settings, device_config):
+        feed_url = settings.get("feedUrl")
+        return {"items": (self.parse_rss_feed, (feed_url,), REQUIRED)} if feed_url else {}
+
+    def parse_rss_feed(self, url, timeout=10, max_items=MAX_ITEMS):
+        """Returns the first max_items items of the feed. The shared HTTP client revalidates the feed with its
+        ETag / Last-Modified, and items are only parsed again when the feed content changed."""
+        resp = self.http.get(url, timeout=timeout, headers={"User-Agent": "Mozilla/5.0"})
         resp.raise_for_status()
-        
+
+        content_hash = hashlib.sha256(resp.content).hexdigest()
+        with self.lock:
+            cached = self.parsed_feeds.get(url)
+        if cached and cached[0] == (content_hash, max_items):
+            logger.debug(f"RSS feed unchanged, using parsed items. | url: {url}")
+            return cached[1]
+
         # Parse the feed content
         feed = feedparser.parse(resp.content)
         items = []
 
-        for entry in feed.entries:
+        for entry in feed.entries[:max_items]:
             item = {
                 "title": html.unescape(entry.get("title", "")),
                 "description": html.unescape(entry.get("description", "")),
@@ -72,4 +114,6 @@ class Rss(BasePlugin):
 
             items.append(item)
 
+        with self.lock:
+            self.parsed_feeds[url] = ((content_hash, max_items), items)
         return items
\ No newline at end of file
@@ -1,47 +1,131 @@
-from plugins.base_plugin.base_plugin import BasePlugin
-from PIL import Image
-from io import BytesIO
+from plugins.base_plugin.base_plugin import BasePlugin, FETCH_EXECUTOR
+from PIL import Image, ImageOps
+from collections import OrderedDict, deque
+from urllib.parse import urlencode
 import requests
+import threading
 import logging
 import random
 
+from utils.image_utils import localize_image
+from utils.data_cache import make_request_key
+
 logger = logging.getLogger(__name__)
 
-def grab_image(image_url, dimensions, timeout_ms=40000):
-    """Grab an image from a URL and resize it to the specified dimensions."""
-    try:
-        response = requests.get(image_url, timeout=timeout_ms / 1000)
-        response.raise_for_status()
-        img = Image.open(BytesIO(response.content))
-        img = img.resize(dimensions, Image.LANCZOS)
-        return img
-    except Exception as e:
-        logger.error(f"Error grabbing image from {image_url}: {e}")
-        return None
+# photos requested per API call, the ones not shown yet are kept for the next refreshes
+POOL_SIZE = 5
+# upcoming photos downloaded in the background so a refresh never waits on a download
+PREFETCHED_PHOTOS = 2
+# pools kept for settings and screen sizes, the least recently used ones are dropped
+MAX_POOLS = 8
+
+def get_rendition_url(raw_url, dimensions):
+    """Returns the URL of a JPEG rendition of an Unsplash photo cropped to dimensions, served by imgix."""
+    width, height = dimensions
+    params = urlencode({"w": width, "h": height, "fit": "crop", "crop": "entropy", "fm": "jpg", "q": 85})
+    separator = "&" if "?" in raw_url else "?"
+    return f"{raw_url}{separator}{params}"
 
 class Unsplash(BasePlugin):
+    def __init__(self, config, **dependencies):
+        super().__init__(config, **dependencies)
+        self.lock = threading.Lock()
+        # (request, dimensions) -> (rendition URLs of the photos not shown yet, lock held while fetching a batch)
+        self.pools = OrderedDict()
+
     def generate_image(self, settings, device_config):
         access_key = device_config.load_env_key("UNSPLASH_ACCESS_KEY")
         if not access_key:
             raise RuntimeError("'Unsplash Access Key' not found.")
 
+        dimensions = device_config.get_resolution()
+        if device_config.get_config("orientation") == "vertical":
+            dimensions = dimensions[::-1]
+
+        image_url = self.next_photo(settings, access_key, dimensions)
+        logger.info(f"Grabbing image from: {image_url}")
+
+        try:
+            image = Image.open(localize_image(image_url, dimensions))
+        except Exception as e:
+            logger.error(f"Error grabbing image from {image_url}: {e}")
+            raise RuntimeError("Failed to load image, please check logs.")
+
+        if image.size != tuple(dimensions):
+            image = ImageOps.fit(image, dimensions, Image.LANCZOS)
+        return image
+
+    def get_data_sources(self, settings, device_config):
+        access_key = device_config.load_env_key("UNSPLASH_ACCESS_KEY")
+        if not access_key:
+            return {}
+        dimensions = device_config.get_resolution()
+        if device_config.get_config("orientation") == "vertical":
+            dimensions = dimensions[::-1]
+        return {"photos": (self.fill_pool, (settings, access_key, dimensions), None)}
+
+    def next_photo(self, settings, access_key, dimensions):
+        """Takes the next photo from the pool for these settings, fetching a new batch when it is empty, and starts
+        downloading the photos after it."""
+        pool = self.fill_pool(settings, access_key, dimensions)
+        with self.lock:
+            if not pool:
+                # emptied by a concurrent refresh
+                raise RuntimeError("No Unsplash photos available, try again later.")
+            image_url = pool.popleft()
+            upcoming = list(pool)[:PREFETCHED_PHOTOS]
+        for url in upcoming:
+            FETCH_EXECUTOR.submit(self._download, url, dimensions)
+        return image_url
+
+    def fill_pool(self, settings, access_key, dimensions):
+        """Returns the pool of upcoming photos for these settings, fetching a new batch from the API if it is
+        empty. The first photos of a new batch are downloaded right away."""
+        url, params = self.get_request(settings, access_key)
+        pool_key = (url, tuple(sorted((k, v) for k, v in params.items() if k != "client_id")), tuple(dimensions))
+        with self.lock:
+            if pool_key not in self.pools:
+                self.pools[pool_key] = (deque(), threading.Lock())
+                while len(self.pools) > MAX_POOLS:
+                    self.pools.popitem(last=False)
+            self.pools.move_to_end(pool_key)
+            pool, fetch_lock = self.pools[pool_key]
+
+        # one batch in flight per pool, a refresh waits for the prefetcher's batch rather than fetching another
+        with fetch_lock:
+            with self.lock:
+                if pool:
+                    return pool
+
+            photo_urls = [get_rendition_url(raw_url, dimensions)
+                          for raw_url in self.fetch_photos(url, params, access_key)]
+            if not photo_urls:
+                raise RuntimeError("Unsplash returned no photos for these settings.")
+            self.fetch_concurrently({photo_url: (self._download, (photo_url, dimensions), None)
+                                     for photo_url in photo_urls[:PREFETCHED_PHOTOS]})
+            with self.lock:
+                pool.extend(photo_urls)
+        return pool
+
+    def get_request(self, settings, access_key):
         search_query = settings.get('search_query')
         collections = settings.get('collections')
         content_filter = settings.get('content_filter', 'low')
         color = settings.get('color')
         orientation = settings.get('orientation')
-        
+
         params = {
             'client_id': access_key,
             'content_filter': content_filter,
-            'per_page': 100,
         }
 
         if search_query:
             url = f"https://api.unsplash.com/search/photos"
             params['query'] = search_query
+            params['per_page'] = 100
         else:
             url = f"https://api.unsplash.com/photos/random"
+            params['count'] = POOL_SIZE
 
         if collections:
             params['collections'] = collections
@@ -49,35 +133,37 @@ class Unsplash(BasePlugin):
             params['color'] = color
         if orientation:
             params['orientation'] = orientation
+        return url, params
 
-        try:
-            response = requests.get(url, params=params)
-            response.raise_for_status()
-            data = response.json()
-            if search_query:
-                results = data.get("results")
-                if not results:
-                    raise RuntimeError("No images found for the given search query.")
-                image_url = random.choice(results)["urls"]["full"]
-            else:
-                image_url = data["urls"]["full"]
-        except requests.exceptions.RequestException as e:
-            logger.error(f"Error fetching image from Unsplash API: {e}")
-            raise RuntimeError("Failed to fetch image from Unsplash API, please check logs.")
-        except (KeyError, IndexError) as e:
-            logger.error(f"Error parsing Unsplash API response: {e}")
-            raise RuntimeError("Failed to parse Unsplash API response, please check logs.")
-
-
-        dimensions = device_config.get_resolution()
-        if device_config.get_config("orientation") == "vertical":
-            dimensions = dimensions[::-1]
-
-        logger.info(f"Grabbing image from: {image_url}")
+    def fetch_photos(self, url, params, access_key):
+        """Returns the raw URLs of a batch of POOL_SIZE photos, in random order. The previous batch for the same
+        request is returned again while the API quota is exhausted."""
+        def fetch():
+            try:
+                response = self.http.get(url, params=params)
+                response.raise_for_status()
+                data = response.json()
+                if "query" in params:
+                    results = data.get("results")
+                    if not results:
+                        raise RuntimeError("No images found for the given search query.")
+                    photos = random.sample(results, min(POOL_SIZE, len(results)))
+                else:
+                    photos = data
+                return [photo["urls"]["raw"] for photo in photos]
+            except requests.exceptions.RequestException as e:
+                logger.error(f"Error fetching image from Unsplash API: {e}")
+                raise RuntimeError("Failed to fetch image from Unsplash API, please check logs.")
+            except (KeyError, IndexError, TypeError) as e:
+                logger.error(f"Error parsing Unsplash API response: {e}")
+                raise RuntimeError("Failed to parse Unsplash API response, please check logs.")
 
-        image = grab_image(image_url, dimensions, timeout_ms=40000)
+        # never fresh, the cache entry only stands in for a new batch once the quota is exhausted
+        return self.get_cached_data(make_request_key(url, params), fetch, ttl=0,
+                                    quota=self.get_quota("unsplash", access_key))
 
-        if not image:
-            raise RuntimeError("Failed to load image, please check logs.")
-
-        return image
+    def _download(self, image_url, dimensions):
+        try:
+            localize_image(image_url, dimensions)
+        except Exception as e:
+            logger.warning(f"Failed to download Unsplash photo {image_url}: {e}")
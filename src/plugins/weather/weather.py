@@ -1,7 +1,7 @@
-from plugins.base_plugin.base_plugin import BasePlugin
+from plugins.base_plugin.base_plugin import BasePlugin, REQUIRED
+from utils.data_cache import make_request_key, get_geo_cache
 from PIL import Image
 import os
-import requests
 import logging
 from datetime import datetime, timezone, date
 from astral import moon
@@ -57,6 +57,15 @@ OPEN_METEO_UNIT_PARAMS = {
     "imperial": "temperature_unit=fahrenheit&wind_speed_unit=mph&precipitation_unit=inch"
 }
 
+# seconds each response stays fresh, matching how often the providers update their data
+CACHE_TTLS = {
+    "openweathermap": 10 * 60,
+    "openweathermap_aqi": 60 * 60,
+    "open_meteo": 15 * 60,
+    "open_meteo_aqi": 60 * 60
+}
+OPEN_METEO_FORECAST_DAYS = 7
+
 class Weather(BasePlugin):
     def generate_settings_template(self):
         template_params = super().generate_settings_template()
@@ -86,14 +95,11 @@ class Weather(BasePlugin):
         tz = pytz.timezone(timezone)
 
         try:
+            results = self.fetch_concurrently(self.get_data_sources(settings, device_config))
             if weather_provider == "OpenWeatherMap":
-                api_key = device_config.load_env_key("OPEN_WEATHER_MAP_SECRET")
-                if not api_key:
-                    raise RuntimeError("Open Weather Map API Key not configured.")
-                weather_data = self.get_weather_data(api_key, units, lat, long)
-                aqi_data = self.get_air_quality(api_key, lat, long)
-                if settings.get('titleSelection', 'location') == 'location':
-                    title = self.get_location(api_key, lat, long)
+                weather_data = results["weather_data"]
+                aqi_data = results["aqi_data"]
+                title = results.get("title", title)
                 if settings.get('weatherTimeZone', 'locationTimeZone') == 'locationTimeZone':
                     logger.info("Using location timezone for OpenWeatherMap data.")
                     wtz = self.parse_timezone(weather_data)
@@ -101,13 +107,10 @@ class Weather(BasePlugin):
                 else:
                     logger.info("Using configured timezone for OpenWeatherMap data.")
                     template_params = self.parse_weather_data(weather_data, aqi_data, tz, units, time_format)
-            elif weather_provider == "OpenMeteo":
-                forecast_days = 7
-                weather_data = self.get_open_meteo_data(lat, long, units, forecast_days + 1)
-                aqi_data = self.get_open_meteo_air_quality(lat, long)
-                template_params = self.parse_open_meteo_data(weather_data, aqi_data, tz, units, time_format)
             else:
-                raise RuntimeError(f"Unknown weather provider: {weather_provider}")
+                weather_data = results["weather_data"]
+                aqi_data = results["aqi_data"]
+                template_params = self.parse_open_meteo_data(weather_data, aqi_data, tz, units, time_format)
 
             template_params['title'] = title
         except Exception as e:
@@ -134,6 +137,36 @@ class Weather(BasePlugin):
             raise RuntimeError("Failed to take screenshot, please check logs.")
         return image
 
+    def get_data_sources(self, settings, device_config):
+        lat = settings.get('latitude')
+        long = settings.get('longitude')
+        if not lat or not long:
+            raise RuntimeError("Latitude and Longitude are required.")
+        units = settings.get('units')
+
+        weather_provider = settings.get('weatherProvider', 'OpenWeatherMap')
+        if weather_provider == "OpenWeatherMap":
+            api_key = device_config.load_env_key("OPEN_WEATHER_MAP_SECRET")
+            if not api_key:
+                raise RuntimeError("Open Weather Map API Key not configured.")
+            calls = {
+                "weather_data": (self.get_weather_data, (api_key, units, lat, long), REQUIRED),
+                "aqi_data": (self.get_air_quality, (api_key, lat, long), REQUIRED)
+            }
+            if settings.get('titleSelection', 'location') == 'location':
+                calls["title"] = (self.get_location, (api_key, lat, long), REQUIRED)
+            return calls
+        elif weather_provider == "OpenMeteo":
+            return {
+                "weather_data": (self.get_open_meteo_data, (lat, long, units, OPEN_METEO_FORECAST_DAYS + 1), REQUIRED),
+                "aqi_data": (self.get_open_meteo_air_quality, (lat, long), REQUIRED)
+            }
+        raise RuntimeError(f"Unknown weather provider: {weather_provider}")
+
+    def get_valid_until(self, settings, device_config, current_dt):
+        # redrawing before the provider responses the image was rendered from are refetched would show the same data
+        return self.get_data_expiry(current_dt)
+
     def parse_weather_data(self, weather_data, aqi_data, tz, units, time_format):
         current = weather_data.get("current")
         dt = datetime.fromtimestamp(current.get('dt'), tz=timezone.utc).astimezone(tz)
@@ -591,55 +624,87 @@ class Weather(BasePlugin):
 
     def get_weather_data(self, api_key, units, lat, long):
         url = WEATHER_URL.format(lat=lat, long=long, units=units, api_key=api_key)
-        response = requests.get(url)
-        if not 200 <= response.status_code < 300:
-            logging.error(f"Failed to retrieve weather data: {response.content}")
-            raise RuntimeError("Failed to retrieve weather data.")
 
-        return response.json()
+        def fetch_weather():
+            response = self.http.get(url)
+            if not 200 <= response.status_code < 300:
+                logging.error(f"Failed to retrieve weather data: {response.content}")
+                raise RuntimeError("Failed to retrieve weather data.")
+
+            return response.json()
+
+        return self._get_cached("openweathermap", url, fetch_weather, api_key)
 
     def get_air_quality(self, api_key, lat, long):
         url = AIR_QUALITY_URL.format(lat=lat, long=long, api_key=api_key)
-        response = requests.get(url)
 
-        if not 200 <= response.status_code < 300:
-            logging.error(f"Failed to get air quality data: {response.content}")
-            raise RuntimeError("Failed to retrieve air quality data.")
+        def fetch_air_quality():
+            response = self.http.get(url)
 
-        return response.json()
+            if not 200 <= response.status_code < 300:
+                logging.error(f"Failed to get air quality data: {response.content}")
+                raise RuntimeError("Failed to retrieve air quality data.")
+
+            return response.json()
+
+        return self._get_cached("openweathermap_aqi", url, fetch_air_quality, api_key)
 
     def get_location(self, api_key, lat, long):
-        url = GEOCODING_URL.format(lat=lat, long=long, api_key=api_key)
-        response = requests.get(url)
+        def fetch_location():
+            url = GEOCODING_URL.format(lat=lat, long=long, api_key=api_key)
+            response = self.http.get(url)
 
-        if not 200 <= response.status_code < 300:
-            logging.error(f"Failed to get location: {response.content}")
-            raise RuntimeError("Failed to retrieve location.")
+            if not 200 <= response.status_code < 300:
+                logging.error(f"Failed to get location: {response.content}")
+                raise RuntimeError("Failed to retrieve location.")
 
-        location_data = response.json()[0]
-        location_str = f"{location_data.get('name')}, {location_data.get('state', location_data.get('country'))}"
+            location_data = response.json()[0]
+            return f"{location_data.get('name')}, {location_data.get('state', location_data.get('country'))}"
 
-        return location_str
+        # place names don't change, keep them in the permanent geo cache
+        return get_geo_cache().lookup("openweathermap", lat, long, fetch_location)
 
-    def get_open_meteo_data(self, lat, long, units, forecast_days):
+    def prefetch_location(self, device_config, lat, long):
+        api_key = device_config.load_env_key("OPEN_WEATHER_MAP_SECRET")
+        if api_key:
+            self.get_location(api_key, lat, long)
+
+    def get_open_meteo_url(self, lat, long, units, forecast_days):
         unit_params = OPEN_METEO_UNIT_PARAMS[units]
-        url = OPEN_METEO_FORECAST_URL.format(lat=lat, long=long, forecast_days=forecast_days) + f"&{unit_params}"
-        response = requests.get(url)
-        
-        if not 200 <= response.status_code < 300:
-            logging.error(f"Failed to retrieve Open-Meteo weather data: {response.content}")
-            raise RuntimeError("Failed to retrieve Open-Meteo weather data.")
-        
-        return response.json()
+        return OPEN_METEO_FORECAST_URL.format(lat=lat, long=long, forecast_days=forecast_days) + f"&{unit_params}"
+
+    def get_open_meteo_data(self, lat, long, units, forecast_days):
+        url = self.get_open_meteo_url(lat, long, units, forecast_days)
+
+        def fetch_weather():
+            response = self.http.get(url)
+
+            if not 200 <= response.status_code < 300:
+                logging.error(f"Failed to retrieve Open-Meteo weather data: {response.content}")
+                raise RuntimeError("Failed to retrieve Open-Meteo weather data.")
+
+            return response.json()
+
+        return self._get_cached("open_meteo", url, fetch_weather)
 
     def get_open_meteo_air_quality(self, lat, long):
         url = OPEN_METEO_AIR_QUALITY_URL.format(lat=lat, long=long)
-        response = requests.get(url)
-        if not 200 <= response.status_code < 300:
-            logging.error(f"Failed to retrieve Open-Meteo air quality data: {response.content}")
-            raise RuntimeError("Failed to retrieve Open-Meteo air quality data.")
-        
-        return response.json()
+
+        def fetch_air_quality():
+            response = self.http.get(url)
+            if not 200 <= response.status_code < 300:
+                logging.error(f"Failed to retrieve Open-Meteo air quality data: {response.content}")
+                raise RuntimeError("Failed to retrieve Open-Meteo air quality data.")
+
+            return response.json()
+
+        return self._get_cached("open_meteo_aqi", url, fetch_air_quality)
+
+    def _get_cached(self, kind, url, fetch_fn, api_key=None):
+        """Returns a provider response from the data cache, serving it stale for one more TTL while refetching."""
+        ttl = CACHE_TTLS[kind]
+        quota = self.get_quota("open_meteo" if kind.startswith("open_meteo") else "openweathermap", api_key)
+        return self.get_cached_data(make_request_key(url), fetch_fn, ttl, stale_ttl=ttl, quota=quota)
     
     def format_time(self, dt, time_format, hour_only=False, include_am_pm=True):
         """Format datetime based on 12h or 24h preference"""
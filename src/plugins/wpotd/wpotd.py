@@ -8,7 +8,7 @@ It supports optional manual date selection or random dates and can resize the im
 Wikipedia API Documentation: https://www.mediawiki.org/wiki/API:Main_page
 Picture of the Day example: https://www.mediawiki.org/wiki/API:Picture_of_the_day_viewer
 Github Repository: https://github.com/wikimedia/mediawiki-api-demos/tree/master/apps/picture-of-the-day-viewer
-Wikimedia requires a User Agent header for API requests, which is set in the SESSION headers:
+Wikimedia requires a User Agent header for API requests, which is set in the HEADERS passed with each request:
 https://foundation.wikimedia.org/wiki/Policy:Wikimedia_Foundation_User-Agent_Policy
 
 Flow:
@@ -16,27 +16,37 @@ Flow:
 1. Fetch the date to use for the Picture of the Day (POTD) based on settings. (_determine_date)
 2. Make an API request to fetch the POTD data for that date. (_fetch_potd)
 3. Extract the image filename from the response. (_fetch_potd)
-4. Make another API request to get the image URL. (_fetch_image_src)
+4. Make another API request to get the image URL and a thumbnail URL sized for the device. (_fetch_image_src)
 5. Download the image from the URL. (_download_image)
 6. Optionally resize the image to fit the device dimensions. (_shrink_to_fit))
+
+Random pictures go through the same steps ahead of time in a background pool, so showing one is a local read.
 """
 
 from plugins.base_plugin.base_plugin import BasePlugin
 from PIL import Image, UnidentifiedImageError
-from io import BytesIO
-import requests
 import logging
 from random import randint
-from datetime import datetime, timedelta, date
+from datetime import datetime, timedelta, timezone, date
+from utils.time_utils import get_next_midnight
+from utils.image_utils import localize_image
+from utils.picture_pool import PicturePool
 from functools import lru_cache
-from typing import Dict, Any
+from typing import Dict, Any, Tuple
 
 logger = logging.getLogger(__name__)
 
 class Wpotd(BasePlugin):
-    SESSION = requests.Session()
     HEADERS = {'User-Agent': 'InkyPi/0.0 (https://github.com/fatihak/InkyPi/)'}
     API_URL = "https://en.wikipedia.org/w/api.php"
+    TODAY_CACHE_SECONDS = 3 * 60 * 60
+    PAST_CACHE_SECONDS = 30 * 24 * 60 * 60
+    # thumbnail widths served by Wikimedia, the smallest covering the screen is downloaded
+    THUMB_WIDTHS = (330, 500, 960, 1280, 1920, 3840)
+
+    def __init__(self, config, **dependencies):
+        super().__init__(config, **dependencies)
+        self.random_pool = PicturePool("wpotd", self._resolve_random_potd)
 
     def generate_settings_template(self) -> Dict[str, Any]:
         template_params = super().generate_settings_template()
@@ -45,27 +55,63 @@ class Wpotd(BasePlugin):
 
     def generate_image(self, settings: Dict[str, Any], device_config: Dict[str, Any]) -> Image.Image:
         logger.info(f"WPOTD plugin settings: {settings}")
-        datetofetch = self._determine_date(settings)
-        logger.info(f"WPOTD plugin datetofetch: {datetofetch}")
+        dimensions = device_config.get_resolution()
+        if device_config.get_config("orientation") == "vertical":
+            dimensions = dimensions[::-1]
+        thumb_size = self._get_thumb_size(dimensions)
+
+        if settings.get("randomizeWpotd") == "true":
+            image = Image.open(self.random_pool.take(thumb_size))
+        else:
+            datetofetch = self._determine_date(settings)
+            logger.info(f"WPOTD plugin datetofetch: {datetofetch}")
 
-        data = self._fetch_potd(datetofetch)
-        picurl = data["image_src"]
-        logger.info(f"WPOTD plugin Picture URL: {picurl}")
+            data = self._fetch_potd(datetofetch, thumb_size[0])
+            picurl = data["image_src"]
+            logger.info(f"WPOTD plugin Picture URL: {picurl}")
 
-        image = self._download_image(picurl)
+            image = self._download_image(picurl, thumb_size)
         if image is None:
             logger.error("Failed to download WPOTD image.")
             raise RuntimeError("Failed to download WPOTD image.")
         if settings.get("shrinkToFitWpotd") == "true":
-            dimensions = device_config.get_resolution()
-            if device_config.get_config("orientation") == "vertical":
-                dimensions = dimensions[::-1]
             max_width, max_height = dimensions
             image = self._shrink_to_fit(image, max_width, max_height)
             logger.info(f"Image resized to fit device dimensions: {max_width},{max_height}")
 
         return image
 
+    def get_valid_until(self, settings: Dict[str, Any], device_config, current_dt: datetime):
+        # a random picture is expected on every refresh, otherwise the picture only changes daily
+        if settings.get("randomizeWpotd") == "true":
+            return None
+        # a new picture is published every day at midnight UTC
+        return get_next_midnight(current_dt.astimezone(timezone.utc)).astimezone(current_dt.tzinfo)
+
+    def get_data_sources(self, settings: Dict[str, Any], device_config) -> Dict[str, Any]:
+        if settings.get("randomizeWpotd") != "true":
+            return {}
+        dimensions = device_config.get_resolution()
+        if device_config.get_config("orientation") == "vertical":
+            dimensions = dimensions[::-1]
+        # filled on the pool's own thread, not on the fetch workers shared with other plugins
+        return {"random_pool": (self.random_pool.fill_in_background, (self._get_thumb_size(dimensions),), None)}
+
+    def _get_thumb_size(self, dimensions) -> Tuple[int, int]:
+        """Returns the square bounds of the smallest thumbnail width covering the screen in either orientation."""
+        needed = max(dimensions)
+        width = next((w for w in self.THUMB_WIDTHS if w >= needed), self.THUMB_WIDTHS[-1])
+        return (width, width)
+
+    def _resolve_random_potd(self, thumb_size: Tuple[int, int]) -> str:
+        start = datetime(2015, 1, 1)
+        delta_days = (datetime.today() - start).days
+        random_date = (start + timedelta(days=randint(0, delta_days))).date()
+        url = self._fetch_potd(random_date, thumb_size[0])["image_src"]
+        if url.lower().endswith(".svg"):
+            raise RuntimeError(f"POTD of {random_date} is an unsupported SVG image.")
+        return url
+
     def _determine_date(self, settings: Dict[str, Any]) -> date:
         if settings.get("randomizeWpotd") == "true":
             start = datetime(2015, 1, 1)
@@ -74,17 +120,16 @@ class Wpotd(BasePlugin):
         elif settings.get("customDate"):
             return datetime.strptime(settings["customDate"], "%Y-%m-%d").date()
         else:
-            return datetime.today().date()
+            return datetime.now(timezone.utc).date()
 
-    def _download_image(self, url: str) -> Image.Image:
+    def _download_image(self, url: str, thumb_size: Tuple[int, int]) -> Image.Image:
         try:
             if url.lower().endswith(".svg"):
                 logger.warning("SVG format is not supported by Pillow. Skipping image download.")
                 raise RuntimeError("Unsupported image format: SVG.")
 
-            response = self.SESSION.get(url, headers=self.HEADERS, timeout=10)
-            response.raise_for_status()
-            return Image.open(BytesIO(response.content))
+            # kept on disk, today's picture is downloaded once
+            return Image.open(localize_image(url, thumb_size))
         except UnidentifiedImageError as e:
             logger.error(f"Unsupported image format at {url}: {str(e)}")
             raise RuntimeError("Unsupported image format.")
@@ -92,7 +137,7 @@ class Wpotd(BasePlugin):
             logger.error(f"Failed to load WPOTD image from {url}: {str(e)}")
             raise RuntimeError("Failed to load WPOTD image.")
 
-    def _fetch_potd(self, cur_date: date) -> Dict[str, Any]:
+    def _fetch_potd(self, cur_date: date, thumb_width: int) -> Dict[str, Any]:
         title = f"Template:POTD/{cur_date.isoformat()}"
         params = {
             "action": "query",
@@ -102,41 +147,53 @@ class Wpotd(BasePlugin):
             "titles": title
         }
 
-        data = self._make_request(params)
-        try:
-            filename = data["query"]["pages"][0]["images"][0]["title"]
-        except (KeyError, IndexError) as e:
-            logger.error(f"Failed to retrieve POTD filename for {cur_date}: {e}")
-            raise RuntimeError("Failed to retrieve POTD filename.")
+        def fetch_potd():
+            data = self._make_request(params)
+            try:
+                filename = data["query"]["pages"][0]["images"][0]["title"]
+            except (KeyError, IndexError) as e:
+                logger.error(f"Failed to retrieve POTD filename for {cur_date}: {e}")
+                raise RuntimeError("Failed to retrieve POTD filename.")
+
+            return {
+                "filename": filename,
+                "image_src": self._fetch_image_src(filename, thumb_width)
+            }
 
-        image_src = self._fetch_image_src(filename)
+        # today's picture may still be edited, past ones are final
+        ttl = self.TODAY_CACHE_SECONDS if cur_date >= datetime.now(timezone.utc).date() else self.PAST_CACHE_SECONDS
+        potd = self.get_cached_data(f"potd_{cur_date.isoformat()}_{thumb_width}", fetch_potd, ttl)
 
         return {
-            "filename": filename,
-            "image_src": image_src,
+            "filename": potd["filename"],
+            "image_src": potd["image_src"],
             "image_page_url": f"https://en.wikipedia.org/wiki/{title}",
             "date": cur_date
         }
 
-    def _fetch_image_src(self, filename: str) -> str:
+    def _fetch_image_src(self, filename: str, thumb_width: int) -> str:
+        """Returns the URL of a thumbnail thumb_width wide, or of the original when it is smaller. Thumbnails of
+        SVG files are PNGs."""
         params = {
             "action": "query",
             "format": "json",
             "prop": "imageinfo",
             "iiprop": "url",
+            "iiurlwidth": thumb_width,
             "titles": filename
         }
         data = self._make_request(params)
         try:
             page = next(iter(data["query"]["pages"].values()))
-            return page["imageinfo"][0]["url"]
+            image_info = page["imageinfo"][0]
+            return image_info.get("thumburl") or image_info["url"]
         except (KeyError, IndexError, StopIteration) as e:
             logger.error(f"Failed to retrieve image URL for {filename}: {e}")
             raise RuntimeError("Failed to retrieve image URL.")
 
     def _make_request(self, params: Dict[str, Any]) -> Dict[str, Any]:
         try:
-            response = self.SESSION.get(self.API_URL, params=params, headers=self.HEADERS, timeout=10)
+            response = self.http.get(self.API_URL, params=params, headers=self.HEADERS, timeout=10)
             response.raise_for_status()
             return response.json()
         except Exception as e:
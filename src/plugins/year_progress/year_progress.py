@@ -1,6 +1,6 @@
 from plugins.base_plugin.base_plugin import BasePlugin
 from PIL import Image
-from datetime import datetime, timezone
+from datetime import datetime, timezone, timedelta
 import logging
 import pytz
 
@@ -20,6 +20,25 @@ class YearProgress(BasePlugin):
         tz = pytz.timezone(timezone)
         current_time = datetime.now(tz)
 
+        year_percent, days_left, _ = YearProgress.get_progress(current_time, tz)
+        template_params = {
+            "year": current_time.year,
+            "year_percent": year_percent,
+            "days_left": days_left,
+            "plugin_settings": settings
+        }
+        
+        image = self.render_image(dimensions, "year_progress.html", "year_progress.css", template_params)
+        return image
+
+    def get_valid_until(self, settings, device_config, current_dt):
+        tz = pytz.timezone(device_config.get_config("timezone", default="America/New_York"))
+        _, _, next_change = YearProgress.get_progress(current_dt.astimezone(tz), tz)
+        return next_change
+
+    @staticmethod
+    def get_progress(current_time, tz):
+        """Returns the rounded year percentage, the rounded days left and the time either value next changes."""
         start_of_year = datetime(current_time.year, 1, 1, tzinfo=tz)
         start_of_next_year = datetime(current_time.year + 1, 1, 1, tzinfo=tz)
 
@@ -27,12 +46,12 @@ class YearProgress(BasePlugin):
         days_left = (start_of_next_year - current_time).total_seconds() / (24 * 3600)
         elapsed_days = (current_time - start_of_year).total_seconds() / (24 * 3600)
 
-        template_params = {
-            "year": current_time.year,
-            "year_percent": round((elapsed_days / total_days) * 100),
-            "days_left": round(days_left),
-            "plugin_settings": settings
-        }
-        
-        image = self.render_image(dimensions, "year_progress.html", "year_progress.css", template_params)
-        return image
\ No newline at end of file
+        year_percent = round((elapsed_days / total_days) * 100)
+        rounded_days_left = round(days_left)
+
+        # the rounded values change when the underlying fractions cross the next half step
+        next_percent_change = start_of_year + timedelta(days=(year_percent + 0.5) * total_days / 100)
+        next_days_left_change = start_of_next_year - timedelta(days=rounded_days_left - 0.5)
+        next_change = min(next_percent_change, next_days_left_change, start_of_next_year)
+
+        return year_percent, rounded_days_left, next_change
\ No newline at end of file
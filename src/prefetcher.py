@@ -0,0 +1,98 @@
+import time
+import logging
+import threading
+from datetime import datetime, timezone, timedelta
+from plugins.plugin_registry import get_plugin_instance
+from scheduler import RefreshScheduler
+from utils.data_cache import prefetching
+
+logger = logging.getLogger(__name__)
+
+# how long before a plugin instance is due its data sources are fetched
+PREFETCH_LEAD_SECONDS = 120
+# prefetched data must stay fresh this long after the due time, covering a late or slow refresh
+PREFETCH_MARGIN_SECONDS = 60
+# longest sleep between timeline checks, so schedule changes are picked up even without a wake up
+MAX_SLEEP_SECONDS = 300
+
+class Prefetcher:
+    """Background worker fetching plugin data ahead of need.
+
+    It follows the refresh scheduler's timeline and, PREFETCH_LEAD_SECONDS before each plugin instance is due,
+    runs the data sources the plugin registered through BasePlugin.get_data_sources. The data lands in the shared
+    data cache, so the refresh at the due time only renders. Each instance is prefetched once per due time.
+    """
+
+    def __init__(self, device_config, scheduler, lead_seconds=PREFETCH_LEAD_SECONDS):
+        self.device_config = device_config
+        self.scheduler = scheduler
+        self.lead_seconds = lead_seconds
+        self.thread = None
+        self.condition = threading.Condition()
+        self.running = False
+        # scheduler key -> due timestamp the instance was last prefetched for
+        self.prefetched = {}
+
+    def start(self):
+        if not self.thread or not self.thread.is_alive():
+            self.running = True
+            self.thread = threading.Thread(target=self._run, daemon=True, name="prefetcher")
+            self.thread.start()
+
+    def stop(self):
+        with self.condition:
+            self.running = False
+            self.condition.notify_all()
+        if self.thread:
+            self.thread.join()
+
+    def wake(self):
+        """Notifies the worker that the schedule changed."""
+        with self.condition:
+            self.condition.notify_all()
+
+    def _run(self):
+        while True:
+            with self.condition:
+                self.condition.wait(timeout=self._get_sleep_time())
+                if not self.running:
+                    break
+            try:
+                self._prefetch_upcoming()
+            except Exception:
+                logger.exception("Exception during prefetch")
+
+    def _get_sleep_time(self):
+        """Seconds until the next instance enters the prefetch window."""
+        now_dt = datetime.now(timezone.utc)
+        horizon_dt = now_dt + timedelta(seconds=self.lead_seconds + MAX_SLEEP_SECONDS)
+        for due_dt, _, plugin_instance in self.scheduler.get_upcoming(horizon_dt):
+            if self.prefetched.get(RefreshScheduler.get_key(plugin_instance)) != due_dt.timestamp():
+                return min(max((due_dt - now_dt).total_seconds() - self.lead_seconds, 1), MAX_SLEEP_SECONDS)
+        return MAX_SLEEP_SECONDS
+
+    def _prefetch_upcoming(self):
+        now_dt = datetime.now(timezone.utc)
+        upcoming = self.scheduler.get_upcoming(now_dt + timedelta(seconds=self.lead_seconds))
+        for due_dt, _, plugin_instance in upcoming:
+            key = RefreshScheduler.get_key(plugin_instance)
+            if due_dt <= now_dt or self.prefetched.get(key) == due_dt.timestamp():
+                # instances already due are being refreshed, fetching for them would only race the refresh
+                continue
+            self.prefetched[key] = due_dt.timestamp()
+            self._prefetch(plugin_instance, due_dt)
+
+        # forget instances that were removed from the schedule
+        for key in set(self.prefetched) - set(self.scheduler.entries):
+            del self.prefetched[key]
+
+    def _prefetch(self, plugin_instance, due_dt):
+        plugin_config = self.device_config.get_plugin(plugin_instance.plugin_id)
+        if plugin_config is None:
+            return
+        plugin = get_plugin_instance(plugin_config)
+        start = time.monotonic()
+        with prefetching(due_dt.timestamp() + PREFETCH_MARGIN_SECONDS):
+            plugin.prefetch_data(dict(plugin_instance.settings), self.device_config)
+        logger.debug(f"Prefetched plugin instance data. | plugin_instance: {plugin_instance.name} | "
+                     f"due: {due_dt.isoformat()} | duration: {time.monotonic() - start:.2f}s")
@@ -1,17 +1,24 @@
 import threading
 import time
+import copy
 import os
 import logging
 import psutil
 import pytz
-from datetime import datetime, timezone
+from datetime import datetime, timezone, timedelta
 from plugins.plugin_registry import get_plugin_instance
-from utils.image_utils import compute_image_hash
+from utils.image_utils import compute_image_hash, add_stale_badge
+from utils.data_cache import track_stale_data
 from model import RefreshInfo, PlaylistManager
+from scheduler import RefreshScheduler
+from prefetcher import Prefetcher
 from PIL import Image
 
 logger = logging.getLogger(__name__)
 
+# Extra delay added to computed wakeups so the due check never runs a moment too early
+WAKEUP_SLACK_SECONDS = 1
+
 class RefreshTask:
     """Handles the logic for refreshing the display using a backgroud thread."""
 
@@ -24,11 +31,21 @@ class RefreshTask:
         self.condition = threading.Condition(self.lock)
         self.running = False
         self.manual_update_request = ()
+        # serializes manual updates requested concurrently by web server threads
+        self.manual_update_lock = threading.Lock()
 
         self.refresh_event = threading.Event()
         self.refresh_event.set()
         self.refresh_result = {}
 
+        # next due time of every plugin instance, resynced from the playlists after config edits
+        self.scheduler = RefreshScheduler()
+        self.schedule_dirty = True
+        # fetches plugin data in the background shortly before instances are due
+        self.prefetcher = Prefetcher(device_config, self.scheduler)
+        # set when connectivity returns so images rendered from stale data are regenerated
+        self.resync_stale = False
+
     def start(self):
         """Starts the background thread for refreshing the display."""
         if not self.thread or not self.thread.is_alive():
@@ -36,12 +53,14 @@ class RefreshTask:
             self.thread = threading.Thread(target=self._run, daemon=True)
             self.running = True
             self.thread.start()
+            self.prefetcher.start()
 
     def stop(self):
         """Stops the refresh task by notifying the background thread to exit."""
         with self.condition:
             self.running = False
             self.condition.notify_all()  # Wake the thread to let it exit
+        self.prefetcher.stop()
         if self.thread:
             logger.info("Stopping refresh task")
             self.thread.join()
@@ -49,12 +68,12 @@ class RefreshTask:
     def _run(self):
         """Background task that manages the periodic refresh of the display.
 
-        This function runs in a loop, sleeping for a configured duration (`plugin_cycle_interval_seconds`) or until
-        manually triggered via `manual_update()`. Detrmines the next plugin to refresh based on active playlists and 
-        updates the display accordingly.
+        This function runs in a loop, sleeping until the next scheduled event (the plugin cycle interval elapsing or
+        the active playlist changing) or until manually triggered via `manual_update()`. Detrmines the next plugin to
+        refresh based on active playlists and updates the display accordingly.
 
         Workflow:
-        1. Waits for the configured sleep duration or until notified of a manual update.
+        1. Waits until the next scheduled event or until notified of a manual update.
         2. Checks if a manual update has been requested:
         - If so, refreshes the specified plugin immediately.
         3. Otherwise, determines the next plugin to refresh based on the active playlist and generates an image.
@@ -71,81 +90,109 @@ class RefreshTask:
         - Captures and logs any unexpected errors during execution to prevent the thread from exiting.
         """
         while True:
+            manual_request = False
             try:
+                # the condition only guards the requests below, the refresh itself runs without it so config edits
+                # and manual update requests never wait on a batch of plugin refreshes
                 with self.condition:
-                    sleep_time = self.device_config.get_config("plugin_cycle_interval_seconds", default=60*60)
+                    sleep_time = self._get_sleep_time()
 
-                    # Wait for sleep_time or until notified
-                    self.condition.wait(timeout=sleep_time)
-                    self.refresh_result = {}
-                    self.refresh_event.clear()
+                    # Wait for sleep_time or until notified, unless a request arrived during the previous refresh
+                    if self.running and not (self.manual_update_request or self.resync_stale):
+                        self.condition.wait(timeout=sleep_time)
 
                     # Exit if `stop()` is called
                     if not self.running:
                         break
 
-                    playlist_manager = self.device_config.get_playlist_manager()
-                    latest_refresh = self.device_config.get_refresh_info()
-                    current_dt = self._get_current_datetime()
+                    refresh_action = self.manual_update_request or None
+                    self.manual_update_request = ()
+                    manual_request = refresh_action is not None
+                    resync_stale = self.resync_stale
+                    self.resync_stale = False
 
-                    refresh_action = None
-                    if self.manual_update_request:
-                        # handle immediate update request
-                        logger.info("Manual update requested")
-                        refresh_action = self.manual_update_request
-                        self.manual_update_request = ()
-                    else:
+                playlist_manager = self.device_config.get_playlist_manager()
+                latest_refresh = self.device_config.get_refresh_info()
+                current_dt = self._get_current_datetime()
 
-                        if self.device_config.get_config("log_system_stats"):
-                            self.log_system_stats()
+                if manual_request:
+                    # handle immediate update request
+                    logger.info("Manual update requested")
+                else:
 
+                    if self.device_config.get_config("log_system_stats"):
+                        self.log_system_stats()
+
+                    displayed_stale = None
+                    if resync_stale:
+                        displayed_stale = self._schedule_stale_instances(playlist_manager, latest_refresh, current_dt)
+
+                    # keep the due plugin instances of the active playlist fresh, whether or not they are displayed next
+                    self._refresh_due_instances(current_dt)
+
+                    if displayed_stale and not displayed_stale[1].stale_since:
+                        # redisplay the resynced image right away instead of waiting for the next cycle
+                        refresh_action = PlaylistRefresh(*displayed_stale)
+                    else:
                         # handle refresh based on playlists
                         logger.info(f"Running interval refresh check. | current_time: {current_dt.strftime('%Y-%m-%d %H:%M:%S')}")
-                        playlist, plugin_instance = self._determine_next_plugin(playlist_manager, latest_refresh, current_dt)
+                        with self.device_config.writer():
+                            playlist, plugin_instance = self._determine_next_plugin(playlist_manager, latest_refresh, current_dt)
                         if plugin_instance:
                             refresh_action = PlaylistRefresh(playlist, plugin_instance)
 
-                    if refresh_action:
-                        plugin_config = self.device_config.get_plugin(refresh_action.get_plugin_id())
-                        if plugin_config is None:
-                            logger.error(f"Plugin config not found for '{refresh_action.get_plugin_id()}'.")
-                            continue
+                if refresh_action:
+                    plugin_config = self.device_config.get_plugin(refresh_action.get_plugin_id())
+                    if plugin_config is None:
+                        logger.error(f"Plugin config not found for '{refresh_action.get_plugin_id()}'.")
+                        continue
+                    if isinstance(refresh_action, PlaylistRefresh):
+                        refresh_action, plugin, image = self._execute_playlist_refresh(refresh_action, current_dt)
+                    else:
                         plugin = get_plugin_instance(plugin_config)
                         image = refresh_action.execute(plugin, self.device_config, current_dt)
-                        image_hash = compute_image_hash(image)
-
-                        refresh_info = refresh_action.get_refresh_info()
-                        refresh_info.update({"refresh_time": current_dt.isoformat(), "image_hash": image_hash})
-                        # check if image is the same as current image
-                        if image_hash != latest_refresh.image_hash:
-                            logger.info(f"Updating display. | refresh_info: {refresh_info}")
-                            self.display_manager.display_image(image, image_settings=plugin.config.get("image_settings", []))
-                        else:
-                            logger.info(f"Image already displayed, skipping refresh. | refresh_info: {refresh_info}")
-
-                        # update latest refresh data in the device config
+                    image_hash = compute_image_hash(image)
+
+                    refresh_info = refresh_action.get_refresh_info()
+                    refresh_info.update({"refresh_time": current_dt.isoformat(), "image_hash": image_hash})
+                    # check if image is the same as current image
+                    if image_hash != latest_refresh.image_hash:
+                        logger.info(f"Updating display. | refresh_info: {refresh_info}")
+                        self.display_manager.display_image(image, image_settings=plugin.config.get("image_settings", []))
+                    else:
+                        logger.info(f"Image already displayed, skipping refresh. | refresh_info: {refresh_info}")
+
+                    if isinstance(refresh_action, PlaylistRefresh):
+                        self.scheduler.update(refresh_action.playlist, refresh_action.plugin_instance, current_dt)
+
+                    # journal the latest refresh data in the runtime state store
+                    with self.device_config.writer():
                         self.device_config.refresh_info = RefreshInfo(**refresh_info)
-                        self.device_config.write_config()
+                        self.device_config.write_runtime_state()
 
             except Exception as e:
                 logger.exception('Exception during refresh')
-                self.refresh_result["exception"] = e  # Capture exception
+                if manual_request:
+                    self.refresh_result["exception"] = e  # Capture exception
             finally:
-                self.refresh_event.set()
+                # only the thread waiting in manual_update() is interested in the result
+                if manual_request or not self.running:
+                    self.refresh_event.set()
 
     def manual_update(self, refresh_action):
         """Manually triggers an update for the specified plugin id and plugin settings by notifying the background process."""
         if self.running:
-            with self.condition:
-                self.manual_update_request = refresh_action
-                self.refresh_result = {}
-                self.refresh_event.clear()
+            with self.manual_update_lock:
+                with self.condition:
+                    self.manual_update_request = refresh_action
+                    self.refresh_result = {}
+                    self.refresh_event.clear()
 
-                self.condition.notify_all()  # Wake the thread to process manual update
+                    self.condition.notify_all()  # Wake the thread to process manual update
 
-            self.refresh_event.wait()
-            if self.refresh_result.get("exception"):
-                raise self.refresh_result.get("exception")
+                self.refresh_event.wait()
+                if self.refresh_result.get("exception"):
+                    raise self.refresh_result.get("exception")
         else:
             logger.warn("Background refresh task is not running, unable to do a manual update")
 
@@ -153,15 +200,161 @@ class RefreshTask:
         """Notify the background thread that config has changed (e.g., interval updated)."""
         if self.running:
             with self.condition:
+                self.schedule_dirty = True
                 self.condition.notify_all()
 
+    def handle_reconnect(self):
+        """Called by the connectivity monitor when the device is back online. Instances rendered from stale data
+        while offline are regenerated."""
+        if self.running:
+            with self.condition:
+                self.resync_stale = True
+                self.condition.notify_all()
+
+    def _schedule_stale_instances(self, playlist_manager, latest_refresh_info, current_dt):
+        """Makes every instance whose latest image was rendered from stale data due now. Returns the (playlist,
+        plugin_instance) currently displayed if it is one of them, otherwise None."""
+        displayed = None
+        for playlist in playlist_manager.playlists:
+            for plugin_instance in playlist.plugins:
+                if not plugin_instance.stale_since:
+                    continue
+                logger.info(f"Back online, resyncing plugin instance. | plugin_instance: {plugin_instance.name}")
+                self.scheduler.schedule(playlist, plugin_instance, current_dt)
+                if (latest_refresh_info.playlist == playlist.name and
+                        latest_refresh_info.plugin_instance == plugin_instance.name):
+                    displayed = (playlist, plugin_instance)
+        return displayed
+
     def _get_current_datetime(self):
         """Retrieves the current datetime based on the device's configured timezone."""
         tz_str = self.device_config.get_config("timezone", default="UTC")
         return datetime.now(pytz.timezone(tz_str))
 
+    def _get_next_cycle_datetime(self, current_dt):
+        """Returns when the plugin cycle interval next elapses, or None if the display has never been refreshed."""
+        latest_refresh_dt = self.device_config.get_refresh_info().get_refresh_datetime()
+        if not latest_refresh_dt:
+            return None
+        plugin_cycle_interval = self.device_config.get_config("plugin_cycle_interval_seconds", default=3600)
+        next_cycle_dt = latest_refresh_dt + timedelta(seconds=plugin_cycle_interval)
+        if next_cycle_dt <= current_dt:
+            # overdue cycles that were skipped (EG: empty playlist) are retried a full interval later
+            next_cycle_dt = current_dt + timedelta(seconds=plugin_cycle_interval)
+        return next_cycle_dt
+
+    def _get_sleep_time(self):
+        """Returns the number of seconds until the next scheduled event: the plugin cycle interval elapsing, the
+        active playlist changing or a plugin instance becoming due, capped at the plugin cycle interval."""
+        current_dt = self._get_current_datetime()
+        plugin_cycle_interval = self.device_config.get_config("plugin_cycle_interval_seconds", default=3600)
+        next_event_dts = [current_dt + timedelta(seconds=plugin_cycle_interval)]
+
+        with self.device_config.lock:
+            if self.schedule_dirty:
+                self.scheduler.sync(self.device_config.get_playlist_manager(), current_dt)
+                self.schedule_dirty = False
+            next_cycle_dt = self._get_next_cycle_datetime(current_dt)
+            next_transition_dt = self.device_config.get_playlist_manager().get_next_transition(current_dt)
+        next_due_dt = self.scheduler.get_next_due_dt(current_dt.tzinfo)
+        # the schedule may have changed since the prefetcher last looked at it
+        self.prefetcher.wake()
+        next_event_dts.extend(dt for dt in (next_cycle_dt, next_transition_dt, next_due_dt) if dt)
+
+        sleep_time = max((min(next_event_dts) - current_dt).total_seconds(), 0) + WAKEUP_SLACK_SECONDS
+        logger.debug(f"Sleeping until next scheduled event. | sleep_time: {sleep_time:.0f}s")
+        return sleep_time
+
+    def _refresh_due_instances(self, current_dt):
+        """Regenerates every due plugin instance of the active playlist, or of a playlist becoming active before the
+        instance is next due, independently of the display rotation. The images are saved so the instance can be
+        displayed later without regenerating. Instances of other playlists only have their data prefetched, they
+        are regenerated once displayed. Failed instances are retried later."""
+        due_instances = self.scheduler.pop_due(current_dt)
+        if due_instances:
+            with self.device_config.lock:
+                playlist_manager = self.device_config.get_playlist_manager()
+                active_playlist = playlist_manager.determine_active_playlist(current_dt)
+
+        for playlist, plugin_instance in due_instances:
+            try:
+                plugin_config = self.device_config.get_plugin(plugin_instance.plugin_id)
+                if plugin_config is None:
+                    # handled as a failure, so the instance stays scheduled and is retried once the breaker closes
+                    raise RuntimeError(f"Plugin config not found for '{plugin_instance.plugin_id}'.")
+                plugin = get_plugin_instance(plugin_config)
+                next_due_dt = plugin_instance.get_next_scheduled_dt(current_dt)
+                if not self._is_active_before(playlist_manager, active_playlist, playlist, current_dt, next_due_dt):
+                    # not displayed before it is due again, so an image rendered now would never be shown
+                    with self.device_config.lock:
+                        settings = copy.deepcopy(plugin_instance.settings)
+                    plugin.prefetch_data(settings, self.device_config)
+                    if next_due_dt is None:
+                        self.scheduler.remove(plugin_instance)
+                    else:
+                        self.scheduler.schedule(playlist, plugin_instance, next_due_dt)
+                    continue
+                PlaylistRefresh(playlist, plugin_instance).execute(plugin, self.device_config, current_dt)
+                self.scheduler.update(playlist, plugin_instance, current_dt)
+            except Exception:
+                logger.exception(f"Failed to refresh plugin instance. | plugin_instance: {plugin_instance.name}")
+                with self.device_config.writer():
+                    if not plugin_instance.is_breaker_open(current_dt):
+                        plugin_instance.record_failure(current_dt)
+                # retried once the circuit breaker closes
+                self.scheduler.update(playlist, plugin_instance, current_dt)
+
+        if due_instances:
+            self.device_config.write_runtime_state()
+
+    def _is_active_before(self, playlist_manager, active_playlist, playlist, current_dt, until_dt):
+        """Returns whether playlist is active now or becomes active before until_dt, within a day if it is None."""
+        if active_playlist and active_playlist.name == playlist.name:
+            return True
+        with self.device_config.lock:
+            transitions = playlist_manager.get_transitions(current_dt, until_dt or current_dt + timedelta(days=1))
+        return any(next_playlist and next_playlist.name == playlist.name for _, next_playlist in transitions)
+
+    def get_schedule(self, horizon=timedelta(days=1)):
+        """Returns the upcoming display refresh, playlist transitions and plugin instance refreshes as a dictionary."""
+        current_dt = self._get_current_datetime()
+        until_dt = current_dt + horizon
+        with self.device_config.lock:
+            playlist_manager = self.device_config.get_playlist_manager()
+            next_cycle_dt = self._get_next_cycle_datetime(current_dt) or current_dt
+            active_playlist = playlist_manager.determine_active_playlist(current_dt)
+            transitions = playlist_manager.get_transitions(current_dt, until_dt)
+
+            plugin_refreshes = []
+            for playlist in playlist_manager.playlists:
+                for plugin_instance in playlist.plugins:
+                    next_refresh_dt = plugin_instance.get_next_refresh_dt(current_dt)
+                    plugin_refreshes.append({
+                        "playlist": playlist.name,
+                        "plugin_id": plugin_instance.plugin_id,
+                        "plugin_instance": plugin_instance.name,
+                        "next_refresh": max(next_refresh_dt, current_dt).isoformat() if next_refresh_dt else None,
+                        "failure_count": plugin_instance.failure_count,
+                        "breaker_open_until": plugin_instance.breaker_open_until.isoformat()
+                            if plugin_instance.is_breaker_open(current_dt) else None
+                    })
+
+        plugin_refreshes.sort(key=lambda r: r["next_refresh"] or "")
+        return {
+            "current_time": current_dt.isoformat(),
+            "active_playlist": active_playlist.name if active_playlist else None,
+            "next_display_refresh": min([next_cycle_dt] + [dt for dt, _ in transitions]).isoformat(),
+            "playlist_transitions": [
+                {"time": dt.isoformat(), "playlist": playlist.name if playlist else None} for dt, playlist in transitions
+            ],
+            "plugin_refreshes": plugin_refreshes
+        }
+
     def _determine_next_plugin(self, playlist_manager, latest_refresh_info, current_dt):
-        """Determines the next plugin to refresh based on the active playlist, plugin cycle interval, and current time."""
+        """Determines the next plugin to refresh based on the active playlist, plugin cycle interval, and current time.
+
+        A change of active playlist triggers a refresh immediately rather than waiting for the cycle interval."""
+        previous_playlist = playlist_manager.active_playlist
         playlist = playlist_manager.determine_active_playlist(current_dt)
         if not playlist:
             playlist_manager.active_playlist = None
@@ -176,16 +369,50 @@ class RefreshTask:
         latest_refresh_dt = latest_refresh_info.get_refresh_datetime()
         plugin_cycle_interval = self.device_config.get_config("plugin_cycle_interval_seconds", default=3600)
         should_refresh = PlaylistManager.should_refresh(latest_refresh_dt, plugin_cycle_interval, current_dt)
+        if previous_playlist is not None and playlist.name != previous_playlist:
+            logger.info(f"Active playlist changed. | previous_playlist: {previous_playlist} | active_playlist: {playlist.name}")
+            should_refresh = True
 
         if not should_refresh:
             latest_refresh_str = latest_refresh_dt.strftime('%Y-%m-%d %H:%M:%S') if latest_refresh_dt else "None"
             logger.info(f"Not time to update display. | latest_update: {latest_refresh_str} | plugin_cycle_interval: {plugin_cycle_interval}")
             return None, None
 
-        plugin = playlist.get_next_plugin()
+        plugin = self._get_next_healthy_plugin(playlist, current_dt)
         logger.info(f"Determined next plugin. | active_playlist: {playlist.name} | plugin_instance: {plugin.name}")
 
         return playlist, plugin
+
+    def _get_next_healthy_plugin(self, playlist, current_dt):
+        """Advances the playlist, passing over instances whose circuit breaker is open while another instance can be
+        shown. If every instance is failing, the last one tried is returned and shows its last good image."""
+        plugin_instance = playlist.get_next_plugin()
+        for _ in range(len(playlist.plugins) - 1):
+            if not plugin_instance.is_breaker_open(current_dt):
+                break
+            logger.info(f"Skipping plugin instance with open circuit breaker. | plugin_instance: {plugin_instance.name} | "
+                        f"retry_after: {plugin_instance.breaker_open_until.strftime('%Y-%m-%d %H:%M:%S')}")
+            plugin_instance = playlist.get_next_plugin()
+        return plugin_instance
+
+    def _execute_playlist_refresh(self, refresh_action, current_dt):
+        """Executes a playlist refresh. When the instance fails, the next healthy instance of the playlist is tried
+        right away so a broken upstream doesn't cost a whole cycle. Returns (refresh_action, plugin, image)."""
+        playlist = refresh_action.playlist
+        for attempt in range(len(playlist.plugins)):
+            plugin_config = self.device_config.get_plugin(refresh_action.get_plugin_id())
+            try:
+                if plugin_config is None:
+                    raise RuntimeError(f"Plugin config not found for '{refresh_action.get_plugin_id()}'.")
+                plugin = get_plugin_instance(plugin_config)
+                return refresh_action, plugin, refresh_action.execute(plugin, self.device_config, current_dt)
+            except Exception:
+                if attempt == len(playlist.plugins) - 1:
+                    raise
+                logger.exception(f"Failed to refresh plugin instance, trying the next one. | plugin_instance: {refresh_action.plugin_instance.name}")
+                self.scheduler.update(playlist, refresh_action.plugin_instance, current_dt)
+                with self.device_config.writer():
+                    refresh_action = PlaylistRefresh(playlist, self._get_next_healthy_plugin(playlist, current_dt))
     
     def log_system_stats(self):
         metrics = {
@@ -275,12 +502,50 @@ class PlaylistRefresh(RefreshAction):
         # Check if a refresh is needed based on the plugin instance's criteria
         if self.plugin_instance.should_refresh(current_dt) or self.force:
             logger.info(f"Refreshing plugin instance. | plugin_instance: '{self.plugin_instance.name}'") 
-            # Generate a new image
-            image = plugin.generate_image(self.plugin_instance.settings, device_config)
+            # Generate a new image from a copy of the settings so web server threads never see them mid-update
+            with device_config.lock:
+                original_settings = self.plugin_instance.settings
+                snapshot = copy.deepcopy(original_settings)
+            settings = copy.deepcopy(snapshot)
+            try:
+                with track_stale_data() as stale_data:
+                    image = plugin.generate_image(settings, device_config)
+                    # asked within the block, so plugins can base it on the expiry of the data the image was rendered from
+                    valid_until = None if stale_data.stale_since else plugin.get_valid_until(settings, device_config, current_dt)
+            except Exception:
+                with device_config.writer():
+                    retry_dt = self.plugin_instance.record_failure(current_dt)
+                logger.warning(f"Plugin instance refresh failed, opening circuit breaker. | plugin_instance: {self.plugin_instance.name} | "
+                               f"failure_count: {self.plugin_instance.failure_count} | retry_after: {retry_dt.strftime('%Y-%m-%d %H:%M:%S')}")
+                raise
+
+            stale_since = None
+            if stale_data.stale_since:
+                # rendered from cached data that could not be refreshed, mark it and don't declare it valid
+                stale_since = datetime.fromtimestamp(stale_data.stale_since, current_dt.tzinfo)
+                time_format = "%H:%M" if stale_since.date() == current_dt.date() else "%b %d %H:%M"
+                image = add_stale_badge(image, f"Stale since {stale_since.strftime(time_format)}")
             image.save(plugin_image_path)
-            self.plugin_instance.latest_refresh_time = current_dt.isoformat()
+            with device_config.writer():
+                # values the plugin stored in its settings for the next refresh are kept, as documented for plugins.
+                # They are diffed against the settings it rendered from, so edits saved meanwhile are not reverted.
+                updated_settings = {}
+                if self.plugin_instance.settings is original_settings:
+                    updated_settings = {k: v for k, v in settings.items() if k not in snapshot or snapshot[k] != v}
+                elif settings != snapshot:
+                    logger.info(f"Settings replaced during refresh, discarding plugin updates. | plugin_instance: {self.plugin_instance.name}")
+                self.plugin_instance.apply_runtime_state({
+                    "latest_refresh_time": current_dt.isoformat(),
+                    "valid_until": valid_until.isoformat() if valid_until else None,
+                    "settings": updated_settings,
+                    "stale_since": stale_since.isoformat() if stale_since else None
+                })
         else:
             logger.info(f"Not time to refresh plugin instance, using latest image. | plugin_instance: {self.plugin_instance.name}.")
+            if not os.path.exists(plugin_image_path):
+                # EG: the circuit breaker opened before a first successful refresh
+                raise RuntimeError(f"No image available for plugin instance '{self.plugin_instance.name}', "
+                                   f"its refresh failed {self.plugin_instance.failure_count} time(s).")
             # Load the existing image from disk
             with Image.open(plugin_image_path) as img:
                 image = img.copy()
@@ -0,0 +1,111 @@
+import os
+import json
+import logging
+
+logger = logging.getLogger(__name__)
+
+class RuntimeStateStore:
+    """Append-only journal for high-churn scheduler state.
+
+    Each line in the journal is a JSON record of the form {"key": ..., "value": ...}. Loading replays the
+    journal so the last record for a key wins, and a record with "deleted" set removes the key. Writing
+    only appends records for keys whose value actually changed, so a refresh tick costs a few small lines
+    instead of re-serializing the whole device config. Once the journal holds enough superseded records it is
+    compacted into a fresh file containing one record per live key.
+
+    Attributes:
+        path (str): Location of the journal file.
+        state (dict): Current key/value state replayed from the journal.
+    """
+
+    # compact when the journal has this many records and at least COMPACT_RATIO times more than live keys
+    COMPACT_MIN_RECORDS = 256
+    COMPACT_RATIO = 4
+
+    def __init__(self, path):
+        self.path = path
+        self.state = {}
+        self.record_count = 0
+        self.load()
+
+    def load(self):
+        """Replays the journal file into memory, ignoring a truncated trailing record."""
+        self.state = {}
+        self.record_count = 0
+        if not os.path.isfile(self.path):
+            return
+
+        with open(self.path) as f:
+            for line_number, line in enumerate(f, start=1):
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    logger.warning(f"Skipping corrupt runtime state record. | file: {self.path} | line: {line_number}")
+                    continue
+                self._apply(record)
+                self.record_count += 1
+        logger.debug(f"Loaded runtime state. | keys: {len(self.state)} | records: {self.record_count}")
+
+    def get(self, key, default=None):
+        """Returns the stored value for the given key."""
+        return self.state.get(key, default)
+
+    def keys(self, prefix=""):
+        """Returns stored keys, optionally restricted to those starting with prefix."""
+        return [k for k in self.state if k.startswith(prefix)]
+
+    def set(self, key, value):
+        """Stores a value, appending to the journal only if it differs from the current value."""
+        return self.update({key: value})
+
+    def delete(self, key):
+        """Removes a key, appending a tombstone record if it exists."""
+        if key not in self.state:
+            return False
+        self._append([{"key": key, "deleted": True}])
+        return True
+
+    def update(self, values):
+        """Stores several values with a single journal append. Returns the number of keys that changed."""
+        records = [{"key": key, "value": value} for key, value in values.items() if self.state.get(key) != value]
+        if records:
+            self._append(records)
+        return len(records)
+
+    def compact(self):
+        """Rewrites the journal with one record per live key and atomically replaces the old file."""
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w") as f:
+            for key, value in self.state.items():
+                f.write(json.dumps({"key": key, "value": value}) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+        logger.debug(f"Compacted runtime state. | records: {self.record_count} -> {len(self.state)}")
+        self.record_count = len(self.state)
+
+    def _append(self, records):
+        for record in records:
+            self._apply(record)
+
+        with open(self.path, "a") as f:
+            f.write("".join(json.dumps(record) + "\n" for record in records))
+            f.flush()
+            os.fsync(f.fileno())
+        self.record_count += len(records)
+
+        if self.record_count >= self.COMPACT_MIN_RECORDS and \
+                self.record_count >= self.COMPACT_RATIO * max(len(self.state), 1):
+            self.compact()
+
+    def _apply(self, record):
+        key = record.get("key")
+        if key is None:
+            return
+        if record.get("deleted"):
+            self.state.pop(key, None)
+        else:
+            self.state[key] = record.get("value")
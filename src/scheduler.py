@@ -0,0 +1,108 @@
+import heapq
+import logging
+import itertools
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+class RefreshScheduler:
+    """Keeps the next due time of every plugin instance across all playlists in a min-heap.
+
+    Entries are keyed by (plugin_id, instance name), which is unique across playlists. Rescheduling pushes a new
+    heap entry and marks the previous one stale instead of searching for it, so updates cost O(log n) and stale
+    entries are discarded lazily when they reach the top of the heap.
+
+    Attributes:
+        heap (list): Heap of (due_timestamp, sequence, key) tuples, possibly containing stale entries.
+        entries (dict): Maps key to its current (due_timestamp, sequence, playlist, plugin_instance).
+    """
+
+    def __init__(self):
+        self.heap = []
+        self.entries = {}
+        self.counter = itertools.count()
+
+    @staticmethod
+    def get_key(plugin_instance):
+        return (plugin_instance.plugin_id, plugin_instance.name)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def schedule(self, playlist, plugin_instance, due_dt):
+        """Sets the due time of a plugin instance, replacing any previous entry."""
+        key = RefreshScheduler.get_key(plugin_instance)
+        due_ts = due_dt.timestamp()
+        entry = self.entries.get(key)
+        if entry and entry[0] == due_ts and entry[3] is plugin_instance:
+            return
+
+        sequence = next(self.counter)
+        self.entries[key] = (due_ts, sequence, playlist, plugin_instance)
+        heapq.heappush(self.heap, (due_ts, sequence, key))
+
+    def update(self, playlist, plugin_instance, current_dt):
+        """Reschedules a plugin instance from its refresh settings and latest refresh time."""
+        due_dt = plugin_instance.get_next_refresh_dt(current_dt)
+        if due_dt is None:
+            self.remove(plugin_instance)
+        else:
+            self.schedule(playlist, plugin_instance, due_dt)
+
+    def remove(self, plugin_instance):
+        """Removes a plugin instance from the schedule."""
+        self.entries.pop(RefreshScheduler.get_key(plugin_instance), None)
+
+    def sync(self, playlist_manager, current_dt):
+        """Reconciles the schedule with the playlists after a config edit. Only instances whose due time changed
+        are pushed, and instances that no longer exist are dropped."""
+        seen = set()
+        for playlist in playlist_manager.playlists:
+            for plugin_instance in playlist.plugins:
+                seen.add(RefreshScheduler.get_key(plugin_instance))
+                self.update(playlist, plugin_instance, current_dt)
+
+        for key in set(self.entries) - seen:
+            del self.entries[key]
+
+        if len(self.heap) > 2 * len(self.entries) + 16:
+            # drop stale entries so repeated edits don't grow the heap unbounded
+            self.heap = [item for item in self.heap if self._is_current(item)]
+            heapq.heapify(self.heap)
+
+    def get_next_due_dt(self, tz=None):
+        """Returns the earliest due time across all instances, or None if nothing is scheduled."""
+        self._discard_stale()
+        if not self.heap:
+            return None
+        return datetime.fromtimestamp(self.heap[0][0], tz)
+
+    def get_upcoming(self, until_dt):
+        """Returns (due_dt, playlist, plugin_instance) tuples due at or before until_dt, earliest first, without
+        removing them. Only reads the current entries so it can be called from other threads."""
+        until_ts = until_dt.timestamp()
+        upcoming = [entry for entry in list(self.entries.values()) if entry[0] <= until_ts]
+        upcoming.sort(key=lambda entry: (entry[0], entry[1]))
+        return [(datetime.fromtimestamp(due_ts, until_dt.tzinfo), playlist, plugin_instance)
+                for due_ts, _, playlist, plugin_instance in upcoming]
+
+    def pop_due(self, current_dt):
+        """Removes and returns (playlist, plugin_instance) pairs due at or before current_dt, earliest first.
+        Callers are expected to reschedule each instance once it has been refreshed."""
+        current_ts = current_dt.timestamp()
+        due = []
+        self._discard_stale()
+        while self.heap and self.heap[0][0] <= current_ts:
+            _, _, key = heapq.heappop(self.heap)
+            _, _, playlist, plugin_instance = self.entries.pop(key)
+            due.append((playlist, plugin_instance))
+            self._discard_stale()
+        return due
+
+    def _is_current(self, item):
+        entry = self.entries.get(item[2])
+        return entry is not None and entry[1] == item[1]
+
+    def _discard_stale(self):
+        while self.heap and not self._is_current(self.heap[0]):
+            heapq.heappop(self.heap)
@@ -0,0 +1,139 @@
+import time
+import socket
+import logging
+import threading
+import ipaddress
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+# consecutive failed requests to public hosts after which the device is considered offline
+FAILURES_BEFORE_OFFLINE = 3
+# host name suffixes only resolvable on the local network
+PRIVATE_HOST_SUFFIXES = (".local", ".lan", ".home", ".internal", ".home.arpa")
+
+def probe_tcp(host, port, timeout=2):
+    """Returns whether a TCP connection to host:port can be opened."""
+    try:
+        socket.create_connection((host, port), timeout=timeout).close()
+        return True
+    except OSError:
+        return False
+
+def is_private_host(host):
+    """Returns whether host (EG: "192.168.1.10", "nas.local") is on the local network, reachable without internet."""
+    host = host.strip("[]").lower()
+    try:
+        address = ipaddress.ip_address(host)
+        return address.is_private or address.is_loopback or address.is_link_local
+    except ValueError:
+        return host == "localhost" or "." not in host or host.endswith(PRIVATE_HOST_SUFFIXES)
+
+def parse_probe_target(value):
+    """Parses a "host:port" probe target from the device config, returns (host, port) or None."""
+    if not value:
+        return None
+    host, _, port = str(value).rpartition(":")
+    if not host or not port.isdigit():
+        logger.warning(f"Ignoring invalid connectivity probe target '{value}', expected host:port")
+        return None
+    return host.strip("[]"), int(port)
+
+class ConnectivityMonitor:
+    """Tracks whether the device can reach the internet.
+
+    The device goes offline after FAILURES_BEFORE_OFFLINE requests in a row to public hosts failed to connect or timed
+    out, as reported by the HTTP client. Checking is then a flag read, so callers can ask before every request. While
+    offline, a background thread probes for the connection to return, connecting to probe_target (host, port) when
+    configured and otherwise to the host of the latest failed request, and calls the registered listeners once it does.
+    """
+
+    def __init__(self, probe=probe_tcp, check_interval=30, probe_target=None):
+        self.probe = probe
+        self.check_interval = check_interval
+        self.probe_target = probe_target
+        self.online = True
+        self.offline_since = None
+        self.failures = 0
+        self.last_failed_target = None
+        self.listeners = []
+        self.lock = threading.Lock()
+        self.thread = None
+
+    def start(self):
+        """Starts the background thread probing for the connection to return."""
+        if not self.thread or not self.thread.is_alive():
+            self.thread = threading.Thread(target=self._run, daemon=True, name="connectivity")
+            self.thread.start()
+
+    def add_listener(self, listener):
+        """Registers a callable invoked without arguments when the device comes back online."""
+        self.listeners.append(listener)
+
+    def is_online(self):
+        return self.online
+
+    def report_success(self):
+        """Called after a request to a public host got an answer."""
+        with self.lock:
+            self.failures = 0
+            reconnected = self._set_online(True)
+        if reconnected:
+            self._notify()
+
+    def report_failure(self, host, port):
+        """Called after a request to a public host failed to connect or timed out."""
+        with self.lock:
+            self.failures += 1
+            self.last_failed_target = (host, port)
+            if self.failures >= FAILURES_BEFORE_OFFLINE:
+                self._set_online(False)
+
+    def check(self):
+        """Probes the connection, returns whether the device is online."""
+        target = self.probe_target or self.last_failed_target
+        online = target is None or self.probe(*target)
+        with self.lock:
+            reconnected = self._set_online(online)
+            if online:
+                self.failures = 0
+        if reconnected:
+            self._notify()
+        return online
+
+    def get_status(self):
+        return {
+            "online": self.online,
+            "offline_since": self.offline_since.isoformat() if self.offline_since else None
+        }
+
+    def _set_online(self, online):
+        """Updates the state, returns whether the device just came back online. Must hold the lock."""
+        reconnected = online and not self.online
+        if not online and self.online:
+            self.offline_since = datetime.now()
+            logger.warning("Device is offline, plugins will use cached data")
+        elif reconnected:
+            logger.info(f"Device is back online after being offline since {self.offline_since.strftime('%H:%M')}")
+            self.offline_since = None
+        self.online = online
+        return reconnected
+
+    def _notify(self):
+        for listener in self.listeners:
+            try:
+                listener()
+            except Exception:
+                logger.exception("Connectivity listener failed")
+
+    def _run(self):
+        while True:
+            time.sleep(self.check_interval)
+            if not self.online:
+                self.check()
+
+CONNECTIVITY_MONITOR = ConnectivityMonitor()
+
+def get_connectivity_monitor():
+    """Returns the connectivity monitor shared by the app."""
+    return CONNECTIVITY_MONITOR
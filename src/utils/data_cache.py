@@ -0,0 +1,432 @@
+import os
+import json
+import time
+import hashlib
+import logging
+import threading
+import contextvars
+from collections import OrderedDict
+from contextlib import contextmanager
+from concurrent.futures import Future, ThreadPoolExecutor
+from urllib.parse import urlencode, urlsplit, urlunsplit, parse_qsl
+
+logger = logging.getLogger(__name__)
+
+# query parameters holding credentials, left out of cache keys
+SECRET_PARAMS = {"key", "appid", "api_key", "apikey", "access_key", "client_id", "token"}
+
+def get_default_cache_dir():
+    src_dir = os.getenv("SRC_DIR") or os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    return os.path.join(src_dir, "cache", "data")
+
+class QuotaExceededError(RuntimeError):
+    """Raised when data must be fetched but the API quota is exhausted."""
+
+class OfflineError(RuntimeError):
+    """Raised when data must be fetched but the device is offline."""
+
+class StaleDataTracker:
+    """Records the fetch time of the oldest data served from cache in place of a fetch that could not be made
+    (EG: while offline), so the image rendered from it can be marked as stale. Also records when the earliest data
+    read from the cache expires, which may be in the past for stale data served while refreshing in the background."""
+
+    def __init__(self):
+        self.stale_since = None
+        self.expires_at = None
+
+    def record(self, fetched_at):
+        if self.stale_since is None or fetched_at < self.stale_since:
+            self.stale_since = fetched_at
+
+    def record_expiry(self, expires_at):
+        if self.expires_at is None or expires_at < self.expires_at:
+            self.expires_at = expires_at
+
+_stale_data_tracker = contextvars.ContextVar("stale_data_tracker", default=None)
+
+@contextmanager
+def track_stale_data():
+    """Tracks stale data served by the data cache within the block, including on threads started with a copy of
+    the current context. Yields a StaleDataTracker."""
+    tracker = StaleDataTracker()
+    token = _stale_data_tracker.set(tracker)
+    try:
+        yield tracker
+    finally:
+        _stale_data_tracker.reset(token)
+
+def record_stale_data(fetched_at):
+    """Records that data fetched at the epoch time fetched_at was served in place of a fetch that could not be made,
+    for callers outside the data cache (EG: the HTTP client while offline)."""
+    tracker = _stale_data_tracker.get()
+    if tracker is not None:
+        tracker.record(fetched_at)
+
+def get_data_expiry():
+    """Returns the epoch time at which the earliest data read from the data cache within the current
+    track_stale_data block expires, or None if none was read."""
+    tracker = _stale_data_tracker.get()
+    return tracker.expires_at if tracker is not None else None
+
+_fresh_until = contextvars.ContextVar("fresh_until", default=None)
+
+@contextmanager
+def prefetching(until):
+    """Within the block, cached data that expires before until (epoch seconds) is refetched right away instead of
+    being returned, so it is still fresh when read at that time."""
+    token = _fresh_until.set(until)
+    try:
+        yield
+    finally:
+        _fresh_until.reset(token)
+
+def make_request_key(url, params=None):
+    """Returns a cache key identifying a GET request, with parameters sorted and credentials removed, so identical
+    requests made by different plugin instances share one cache entry. Parameters may be in the url or in params."""
+    parts = urlsplit(url)
+    query = parse_qsl(parts.query) + list((params or {}).items())
+    query = sorted((k, str(v)) for k, v in query if k.lower() not in SECRET_PARAMS)
+    base_url = urlunsplit((parts.scheme, parts.netloc, parts.path, "", ""))
+    return f"{base_url}?{urlencode(query)}" if query else base_url
+
+class CacheEntry:
+    """A cached value, or a cached failure when error is set.
+
+    Attributes:
+        data: The cached JSON-serializable data.
+        time (float): Epoch seconds when the data was fetched.
+        ttl (float): Seconds the data stays fresh.
+        stale_ttl (float): Seconds after expiry during which the data may still be served while revalidating.
+        error (str): Failure message for a negative entry.
+    """
+
+    def __init__(self, data, fetched_at, ttl, stale_ttl=0, error=None):
+        self.data = data
+        self.time = fetched_at
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.error = error
+
+    def age(self, now):
+        return now - self.time
+
+    def is_fresh(self, now):
+        return self.age(now) < self.ttl
+
+    def is_usable(self, now):
+        return self.age(now) < self.ttl + self.stale_ttl
+
+    def to_dict(self):
+        return {"time": self.time, "ttl": self.ttl, "stale_ttl": self.stale_ttl, "data": self.data}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data["data"], data["time"], data["ttl"], data.get("stale_ttl", 0))
+
+class DataCache:
+    """Two-tier TTL cache for data fetched by plugins.
+
+    Entries live in an in-memory LRU backed by JSON files on disk, so cached data survives restarts. Each key has its
+    own TTL. Within the optional stale window after expiry, the stale value is returned immediately and a background
+    thread refetches it (stale-while-revalidate). Failed fetches are cached as negative entries for a short time so a
+    broken upstream is not hit on every refresh. Concurrent fetches of the same key are coalesced, the first caller
+    fetches and the others wait for its result (single-flight). When a connectivity monitor is set and reports the
+    device offline, cached data of any age is returned without attempting a fetch.
+    """
+
+    def __init__(self, cache_dir=None, max_memory_entries=128, max_disk_entries=512, refresh_workers=2):
+        self.cache_dir = cache_dir or get_default_cache_dir()
+        self.max_memory_entries = max_memory_entries
+        self.max_disk_entries = max_disk_entries
+        self.memory = OrderedDict()
+        self.negative = {}
+        self.refreshing = set()
+        self.inflight = {}
+        self.lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(max_workers=refresh_workers, thread_name_prefix="cache-refresh")
+        self.disk_writes = 0
+        self.connectivity = None
+        self.stats = {"hits": 0, "stale_hits": 0, "misses": 0, "negative_hits": 0, "refreshes": 0, "errors": 0,
+                      "fetches": 0, "coalesced": 0, "quota_limited": 0, "offline_hits": 0}
+
+    def get(self, key, fetch_fn, ttl, stale_ttl=0, negative_ttl=60, quota=None):
+        """Returns the data cached for key, calling fetch_fn() to fetch it when missing or expired.
+
+        Args:
+            key (str): Cache key, should identify the request (EG: endpoint and parameters).
+            fetch_fn (callable): Returns JSON-serializable data, raises on failure.
+            ttl (float): Seconds the fetched data stays fresh.
+            stale_ttl (float): Seconds after expiry during which stale data is returned while refreshing in the background.
+            negative_ttl (float): Seconds a failure is cached before fetch_fn is retried.
+            quota (TokenBucket): Optional API quota, a token is taken for every fetch. When it is exhausted, cached
+                data of any age is returned instead.
+        """
+        now = time.time()
+        fresh_until = max(now, _fresh_until.get() or 0)
+        entry = self._get_entry(key)
+        if entry and entry.is_fresh(fresh_until):
+            self._count("hits")
+            self._record_expiry(entry.time + entry.ttl)
+            return entry.data
+
+        if self.connectivity is not None and not self.connectivity.is_online():
+            if entry is None:
+                raise OfflineError("Device is offline and no cached data is available.")
+            self._count("offline_hits")
+            self._record_stale(entry)
+            return entry.data
+
+        if entry and entry.is_usable(now) and fresh_until == now:
+            self._count("stale_hits")
+            self._record_expiry(entry.time + entry.ttl)
+            self._refresh_in_background(key, fetch_fn, ttl, stale_ttl, negative_ttl, quota)
+            return entry.data
+
+        negative_entry = self.negative.get(key)
+        if negative_entry and negative_entry.is_fresh(now):
+            self._count("negative_hits")
+            raise RuntimeError(negative_entry.error)
+
+        self._count("misses")
+        try:
+            data = self._fetch(key, fetch_fn, ttl, stale_ttl, negative_ttl, quota)
+            self._record_expiry(time.time() + ttl)
+            return data
+        except QuotaExceededError:
+            if entry is None:
+                raise
+            logger.info(f"API quota exhausted, using data cached {entry.age(now):.0f}s ago for {key}")
+            self._record_stale(entry)
+            return entry.data
+
+    def set(self, key, data, ttl, stale_ttl=0):
+        """Stores data for key in both tiers."""
+        entry = CacheEntry(data, time.time(), ttl, stale_ttl)
+        with self.lock:
+            self.negative.pop(key, None)
+            self._remember(key, entry)
+        self._write_disk(key, entry)
+
+    def invalidate(self, key):
+        """Removes key from both tiers."""
+        with self.lock:
+            self.memory.pop(key, None)
+            self.negative.pop(key, None)
+        try:
+            os.remove(self._get_path(key))
+        except FileNotFoundError:
+            pass
+
+    def get_stats(self):
+        with self.lock:
+            stats = dict(self.stats)
+            stats["memory_entries"] = len(self.memory)
+            lookups = stats["hits"] + stats["stale_hits"] + stats["misses"] + stats["negative_hits"]
+            # share of lookups answered without a request of their own
+            stats["dedup_ratio"] = round(1 - stats["fetches"] / lookups, 3) if lookups else 0.0
+            return stats
+
+    def _fetch(self, key, fetch_fn, ttl, stale_ttl, negative_ttl, quota=None):
+        with self.lock:
+            future = self.inflight.get(key)
+            is_owner = future is None
+            if is_owner:
+                future = Future()
+                self.inflight[key] = future
+
+        if not is_owner:
+            self._count("coalesced")
+            return future.result()
+
+        try:
+            if quota is not None and not quota.try_acquire():
+                raise QuotaExceededError(f"API quota for {quota.name} is exhausted.")
+            self._count("fetches")
+            data = fetch_fn()
+            self.set(key, data, ttl, stale_ttl)
+            future.set_result(data)
+            return data
+        except QuotaExceededError as e:
+            self._count("quota_limited")
+            future.set_exception(e)
+            raise
+        except Exception as e:
+            self._count("errors")
+            logger.warning(f"Failed to fetch data for cache key {key}: {e}")
+            with self.lock:
+                self.negative[key] = CacheEntry(None, time.time(), negative_ttl, error=str(e))
+            future.set_exception(e)
+            raise
+        finally:
+            with self.lock:
+                self.inflight.pop(key, None)
+
+    def _refresh_in_background(self, key, fetch_fn, ttl, stale_ttl, negative_ttl, quota=None):
+        with self.lock:
+            negative_entry = self.negative.get(key)
+            if key in self.refreshing or (negative_entry and negative_entry.is_fresh(time.time())):
+                return
+            self.refreshing.add(key)
+
+        def refresh():
+            try:
+                self._count("refreshes")
+                self._fetch(key, fetch_fn, ttl, stale_ttl, negative_ttl, quota)
+            except Exception:
+                pass  # already logged, the stale entry keeps being served
+            finally:
+                with self.lock:
+                    self.refreshing.discard(key)
+
+        self.executor.submit(refresh)
+
+    def _record_stale(self, entry):
+        record_stale_data(entry.time)
+
+    @staticmethod
+    def _record_expiry(expires_at):
+        tracker = _stale_data_tracker.get()
+        if tracker is not None:
+            tracker.record_expiry(expires_at)
+
+    def _get_entry(self, key):
+        with self.lock:
+            entry = self.memory.get(key)
+            if entry:
+                self.memory.move_to_end(key)
+                return entry
+
+        entry = self._read_disk(key)
+        if entry:
+            with self.lock:
+                self._remember(key, entry)
+        return entry
+
+    def _remember(self, key, entry):
+        self.memory[key] = entry
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.max_memory_entries:
+            self.memory.popitem(last=False)
+
+    def _get_path(self, key):
+        return os.path.join(self.cache_dir, hashlib.sha1(key.encode("utf-8")).hexdigest() + ".json")
+
+    def _read_disk(self, key):
+        path = self._get_path(key)
+        if not os.path.isfile(path):
+            return None
+        try:
+            with open(path) as f:
+                cached = json.load(f)
+            if cached.get("key") != key:
+                return None
+            return CacheEntry.from_dict(cached)
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(f"Failed to read cache file for {key}: {e}")
+            return None
+
+    def _write_disk(self, key, entry):
+        path = self._get_path(key)
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(dict(entry.to_dict(), key=key), f)
+            os.replace(tmp_path, path)
+        except (OSError, TypeError, ValueError) as e:
+            logger.warning(f"Failed to write cache file for {key}: {e}")
+            return
+
+        self.disk_writes += 1
+        if self.disk_writes % 64 == 0:
+            self._prune_disk()
+
+    def _prune_disk(self):
+        """Deletes the least recently written cache files beyond max_disk_entries."""
+        try:
+            paths = [os.path.join(self.cache_dir, f) for f in os.listdir(self.cache_dir) if f.endswith(".json")]
+            if len(paths) <= self.max_disk_entries:
+                return
+            paths.sort(key=os.path.getmtime)
+            for path in paths[:len(paths) - self.max_disk_entries]:
+                os.remove(path)
+        except OSError as e:
+            logger.warning(f"Failed to prune data cache: {e}")
+
+    def _count(self, stat):
+        with self.lock:
+            self.stats[stat] += 1
+
+class GeoCache:
+    """Persistent cache of reverse geocoding results.
+
+    The place name of a fixed location doesn't change, so entries never expire. Coordinates are rounded to
+    COORDINATE_PRECISION decimals (about 1 km) and keyed together with the provider and the language of the result.
+    """
+
+    COORDINATE_PRECISION = 2
+
+    def __init__(self, path=None):
+        self.path = path or os.path.join(os.path.dirname(get_default_cache_dir()), "geo_cache.json")
+        self.lock = threading.Lock()
+        self.names = None
+
+    @staticmethod
+    def get_key(provider, lat, long, language=""):
+        precision = GeoCache.COORDINATE_PRECISION
+        return f"{provider}:{float(lat):.{precision}f},{float(long):.{precision}f}:{language}"
+
+    def get(self, provider, lat, long, language=""):
+        """Returns the cached place name, or None."""
+        with self.lock:
+            return self._load().get(GeoCache.get_key(provider, lat, long, language))
+
+    def set(self, provider, lat, long, name, language=""):
+        with self.lock:
+            names = self._load()
+            key = GeoCache.get_key(provider, lat, long, language)
+            if names.get(key) == name:
+                return
+            names[key] = name
+            self._write()
+
+    def lookup(self, provider, lat, long, lookup_fn, language=""):
+        """Returns the cached place name, calling lookup_fn() on a miss. Empty results are not cached."""
+        name = self.get(provider, lat, long, language)
+        if name is None:
+            name = lookup_fn()
+            if name:
+                self.set(provider, lat, long, name, language)
+        return name
+
+    def _load(self):
+        if self.names is None:
+            self.names = {}
+            if os.path.isfile(self.path):
+                try:
+                    with open(self.path) as f:
+                        self.names = json.load(f)
+                except (OSError, ValueError) as e:
+                    logger.warning(f"Failed to read geo cache {self.path}: {e}")
+        return self.names
+
+    def _write(self):
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(self.names, f, ensure_ascii=False, indent=2)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            logger.warning(f"Failed to write geo cache {self.path}: {e}")
+
+DATA_CACHE = DataCache()
+GEO_CACHE = GeoCache()
+
+def get_data_cache():
+    """Returns the data cache shared by all plugins."""
+    return DATA_CACHE
+
+def get_geo_cache():
+    """Returns the geocoding cache shared by all plugins."""
+    return GEO_CACHE
@@ -0,0 +1,214 @@
+import os
+import json
+import time
+import bisect
+import hashlib
+import logging
+import secrets
+import threading
+
+logger = logging.getLogger(__name__)
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.gif', '.bmp', '.tiff', '.webp', '.heif', '.heic')
+# the folder is rescanned at most this often, images deleted in between are skipped when drawn
+RESCAN_INTERVAL_SECONDS = 10 * 60
+# EXIF orientations rotating the image by 90 degrees, which swaps its width and height
+TRANSPOSED_ORIENTATIONS = (5, 6, 7, 8)
+
+def get_default_index_dir():
+    src_dir = os.getenv("SRC_DIR") or os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    return os.path.join(src_dir, "cache", "image_index")
+
+def get_shape(width, height, orientation=1):
+    """Returns "landscape", "portrait" or "square" for an image as displayed, after its EXIF orientation."""
+    if orientation in TRANSPOSED_ORIENTATIONS:
+        width, height = height, width
+    if width > height:
+        return "landscape"
+    if height > width:
+        return "portrait"
+    return "square"
+
+class FolderIndex:
+    """Persistent index of the images below a folder, storing the mtime, size, dimensions and EXIF orientation of
+    each one, so picking an image does not walk the folder.
+
+    The index is updated incrementally: a directory's mtime changes when entries are added, removed or renamed in
+    it, so a rescan only lists the directories whose mtime changed, and only reads the images in those whose mtime
+    or size changed. read_fn(path) returns the (width, height, orientation) of an image. Images edited in place,
+    without touching their directory, are picked up the next time their directory changes.
+
+    Images are drawn in a shuffled order without repeats: each deck ranks the images by a hash of their path and a
+    random seed, and remembers the rank of the last image drawn. Images added mid-cycle join the current cycle at
+    their rank. Only the seed and the last rank are stored, so drawing does not rewrite the index.
+    """
+
+    def __init__(self, folder, read_fn, cache_dir=None):
+        self.folder = os.path.abspath(folder)
+        self.read_fn = read_fn
+        cache_dir = cache_dir or get_default_index_dir()
+        name = hashlib.sha1(self.folder.encode("utf-8")).hexdigest()[:16]
+        self.index_path = os.path.join(cache_dir, f"{name}.json")
+        self.decks_path = os.path.join(cache_dir, f"{name}_decks.json")
+        # relative directory -> {"mtime": ..., "files": [...], "dirs": [...]}
+        self.dirs = {}
+        # relative image path -> [mtime, size, width, height, orientation]
+        self.images = {}
+        # shape or "all" -> {"seed": ..., "cursor": rank of the last image drawn}
+        self.decks = {}
+        # shape or "all" -> (seed, ranks, paths), rebuilt when the seed or the images change
+        self.orders = {}
+        self.scanned_at = 0
+        self.lock = threading.Lock()
+        self._load()
+
+    def refresh(self, force=False):
+        """Rescans the folder if the last scan is older than RESCAN_INTERVAL_SECONDS."""
+        with self.lock:
+            if force or time.time() - self.scanned_at >= RESCAN_INTERVAL_SECONDS:
+                self._scan()
+
+    def draw(self, shape=None):
+        """Returns the path of the next image in the shuffled deck, or None if there is none. When shape is
+        "landscape" or "portrait", only images of that shape (or square) are drawn."""
+        self.refresh()
+        deck_name = shape or "all"
+        with self.lock:
+            deck = self.decks.get(deck_name)
+            if deck is None:
+                deck = self.decks[deck_name] = {"seed": secrets.token_hex(8), "cursor": ""}
+            for _ in range(2):
+                seed, ranks, paths = self._get_order(deck_name, deck["seed"], shape)
+                i = bisect.bisect_right(ranks, deck["cursor"])
+                while i < len(paths) and not os.path.isfile(os.path.join(self.folder, paths[i])):
+                    # deleted since the last scan
+                    self.scanned_at = 0
+                    i += 1
+                if i < len(paths):
+                    deck["cursor"] = ranks[i]
+                    self._save_decks()
+                    return os.path.join(self.folder, paths[i])
+                # every image was drawn, start a new cycle
+                deck["seed"], deck["cursor"] = secrets.token_hex(8), ""
+            return None
+
+    def _get_order(self, deck_name, seed, shape):
+        order = self.orders.get(deck_name)
+        if order is None or order[0] != seed:
+            ranked = sorted((self._rank(seed, path), path) for path, info in self.images.items()
+                            if self._matches(info, shape))
+            order = (seed, [rank for rank, _ in ranked], [path for _, path in ranked])
+            self.orders[deck_name] = order
+        return order
+
+    @staticmethod
+    def _rank(seed, path):
+        return hashlib.sha1(f"{seed}:{path}".encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def _matches(info, shape):
+        if not shape:
+            return True
+        _, _, width, height, orientation = info
+        return get_shape(width, height, orientation) in (shape, "square")
+
+    def _scan(self):
+        start = time.monotonic()
+        dirs, images = {}, {}
+        read = 0
+        pending = [""]
+        while pending:
+            rel_dir = pending.pop()
+            abs_dir = os.path.join(self.folder, rel_dir)
+            try:
+                mtime = os.stat(abs_dir).st_mtime
+            except OSError as e:
+                logger.warning(f"Failed to scan {abs_dir}: {e}")
+                continue
+
+            entry = self.dirs.get(rel_dir)
+            changed = entry is None or entry["mtime"] != mtime
+            if changed:
+                entry = self._list_dir(abs_dir, mtime)
+            dirs[rel_dir] = entry
+            pending.extend(os.path.join(rel_dir, name) for name in entry["dirs"])
+
+            for name in entry["files"]:
+                path = os.path.join(rel_dir, name)
+                known = self.images.get(path)
+                if not changed:
+                    if known is not None:
+                        images[path] = known
+                    continue
+                try:
+                    stat = os.stat(os.path.join(self.folder, path))
+                except OSError:
+                    continue
+                if known is not None and known[:2] == [stat.st_mtime, stat.st_size]:
+                    images[path] = known
+                    continue
+                try:
+                    width, height, orientation = self.read_fn(os.path.join(self.folder, path))
+                except Exception as e:
+                    logger.warning(f"Skipping unreadable image {path}: {e}")
+                    continue
+                images[path] = [stat.st_mtime, stat.st_size, width, height, orientation]
+                read += 1
+
+        index_changed = dirs != self.dirs or images != self.images
+        self.dirs, self.images = dirs, images
+        self.scanned_at = time.time()
+        if index_changed:
+            self.orders.clear()
+            self._save_index()
+        logger.info(f"Scanned {self.folder}: {len(images)} images, {read} read, "
+                    f"{time.monotonic() - start:.2f}s")
+
+    @staticmethod
+    def _list_dir(abs_dir, mtime):
+        entry = {"mtime": mtime, "files": [], "dirs": []}
+        try:
+            with os.scandir(abs_dir) as it:
+                for child in it:
+                    if child.is_dir(follow_symlinks=False):
+                        entry["dirs"].append(child.name)
+                    elif child.name.lower().endswith(IMAGE_EXTENSIONS) and not child.name.startswith('.'):
+                        entry["files"].append(child.name)
+        except OSError as e:
+            logger.warning(f"Failed to list {abs_dir}: {e}")
+        return entry
+
+    def _load(self):
+        try:
+            with open(self.index_path) as f:
+                data = json.load(f)
+            if data.get("folder") == self.folder:
+                self.dirs, self.images = data["dirs"], data["images"]
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logger.warning(f"Discarding unreadable image index {self.index_path}: {e}")
+        try:
+            with open(self.decks_path) as f:
+                self.decks = json.load(f)
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logger.warning(f"Discarding unreadable image decks {self.decks_path}: {e}")
+
+    def _save_index(self):
+        self._write(self.index_path, {"folder": self.folder, "dirs": self.dirs, "images": self.images})
+
+    def _save_decks(self):
+        self._write(self.decks_path, self.decks)
+
+    @staticmethod
+    def _write(path, data):
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(data, f)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning(f"Failed to save {path}: {e}")
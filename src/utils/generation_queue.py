@@ -0,0 +1,129 @@
+import os
+import json
+import time
+import hashlib
+import shutil
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+# backlogs not used for this long are deleted
+UNUSED_BACKLOG_SECONDS = 30 * 24 * 60 * 60
+
+def get_default_generation_dir():
+    src_dir = os.getenv("SRC_DIR") or os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    return os.path.join(src_dir, "cache", "generated")
+
+def make_key(*parts):
+    """Returns a backlog key identifying the JSON-serializable settings an item is generated from."""
+    return hashlib.sha1(json.dumps(parts, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+
+def save_json(item, path):
+    with open(path, "w") as f:
+        json.dump(item, f)
+
+def load_json(path):
+    with open(path) as f:
+        return json.load(f)
+
+class GenerationQueue:
+    """Generates slow items (EG: AI images) ahead of need and keeps a bounded backlog of them on disk.
+
+    Items are grouped by key, which should identify the settings they were generated for. take() hands out the
+    oldest stored item immediately and tops the backlog up in a background thread, generating synchronously only
+    when the backlog is empty. Items are written with save_fn(item, path) and read with load_fn(path), JSON by
+    default.
+    """
+
+    def __init__(self, name, cache_dir=None, max_backlog=1, suffix=".json", save_fn=save_json, load_fn=load_json):
+        self.name = name
+        self.cache_dir = os.path.join(cache_dir or get_default_generation_dir(), name)
+        self.max_backlog = max_backlog
+        self.suffix = suffix
+        self.save_fn = save_fn
+        self.load_fn = load_fn
+        self.filling = set()
+        self.lock = threading.Lock()
+
+    def take(self, key, generate_fn, refill=True):
+        """Returns a stored item for key, or calls generate_fn() when there is none, then refills the backlog
+        in the background unless refill is False (EG: the item would expire before it is taken)."""
+        item = self._pop(key)
+        if item is None:
+            logger.info(f"No pre-generated {self.name} item available, generating now")
+            item = generate_fn()
+        if refill:
+            self.fill_in_background(key, generate_fn)
+        return item
+
+    def fill(self, key, generate_fn):
+        """Generates items until the backlog for key is full, unless another thread is already filling it. Errors
+        from generate_fn are raised."""
+        with self.lock:
+            if key in self.filling:
+                return
+            self.filling.add(key)
+        try:
+            while self.get_backlog(key) < self.max_backlog:
+                self._store(key, generate_fn())
+        finally:
+            with self.lock:
+                self.filling.discard(key)
+
+    def fill_in_background(self, key, generate_fn):
+        if self.get_backlog(key) >= self.max_backlog:
+            return
+
+        def fill():
+            try:
+                self.fill(key, generate_fn)
+            except Exception as e:
+                logger.warning(f"Failed to pre-generate {self.name} item: {e}")
+
+        threading.Thread(target=fill, daemon=True, name=f"generate-{self.name}").start()
+
+    def get_backlog(self, key):
+        return len(self._list(key))
+
+    def _get_dir(self, key):
+        return os.path.join(self.cache_dir, key)
+
+    def _list(self, key):
+        key_dir = self._get_dir(key)
+        if not os.path.isdir(key_dir):
+            return []
+        return sorted(os.path.join(key_dir, f) for f in os.listdir(key_dir) if f.endswith(self.suffix))
+
+    def _pop(self, key):
+        with self.lock:
+            for path in self._list(key):
+                try:
+                    item = self.load_fn(path)
+                except Exception as e:
+                    logger.warning(f"Discarding unreadable pre-generated item {path}: {e}")
+                    item = None
+                os.remove(path)
+                if item is not None:
+                    return item
+        return None
+
+    def _store(self, key, item):
+        key_dir = self._get_dir(key)
+        if not os.path.isdir(key_dir):
+            self._prune_unused()
+            os.makedirs(key_dir, exist_ok=True)
+        path = os.path.join(key_dir, f"{time.time_ns()}{self.suffix}")
+        tmp_path = f"{path}.tmp"
+        self.save_fn(item, tmp_path)
+        os.replace(tmp_path, path)
+        # the directory mtime records the last use of the backlog
+        os.utime(key_dir)
+
+    def _prune_unused(self):
+        if not os.path.isdir(self.cache_dir):
+            return
+        for name in os.listdir(self.cache_dir):
+            key_dir = os.path.join(self.cache_dir, name)
+            if os.path.isdir(key_dir) and time.time() - os.path.getmtime(key_dir) > UNUSED_BACKLOG_SECONDS:
+                shutil.rmtree(key_dir, ignore_errors=True)
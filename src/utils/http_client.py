@@ -0,0 +1,189 @@
+import copy
+import time
+import logging
+import threading
+from collections import OrderedDict
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from utils.data_cache import record_stale_data
+from utils.connectivity import is_private_host
+
+logger = logging.getLogger(__name__)
+
+# (connect, read) timeout in seconds applied when a caller does not pass one
+DEFAULT_TIMEOUT = (5, 20)
+DEFAULT_HEADERS = {"User-Agent": "InkyPi/0.0 (https://github.com/fatihak/InkyPi/)"}
+
+class OfflineRequestError(requests.exceptions.ConnectionError):
+    """Raised instead of sending a request while the device is offline, so callers fail fast rather than waiting
+    out the timeout."""
+
+class HttpClient:
+    """Shared HTTP client used by all plugins.
+
+    Wraps a single requests.Session so connections are kept alive in per-host pools, applies a default timeout,
+    retries idempotent requests with exponential backoff and revalidates cached GET responses with
+    If-None-Match / If-Modified-Since. A 304 answer is returned to the caller as the cached 200 response, marked
+    with `from_cache = True`. Per-host request counts, latency and bytes received are kept for diagnostics.
+
+    When a connectivity monitor is set, requests to public hosts report whether they could connect to it. While it
+    reports the device offline, those requests raise OfflineRequestError without touching the network, except GETs
+    with a cached response, which is returned as if revalidated. Requests to local network hosts are always sent.
+    """
+
+    RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+
+    def __init__(self, retries=2, backoff_factor=0.5, pool_maxsize=4, max_entry_bytes=1024 * 1024,
+                 max_cache_bytes=8 * 1024 * 1024):
+        self.session = requests.Session()
+        self.session.headers.update(DEFAULT_HEADERS)
+        retry = Retry(
+            total=retries,
+            backoff_factor=backoff_factor,
+            status_forcelist=HttpClient.RETRY_STATUS_CODES,
+            allowed_methods=frozenset(["GET", "HEAD"]),
+            respect_retry_after_header=True,
+            raise_on_status=False
+        )
+        adapter = HTTPAdapter(pool_connections=16, pool_maxsize=pool_maxsize, max_retries=retry)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+        self.max_entry_bytes = max_entry_bytes
+        self.max_cache_bytes = max_cache_bytes
+        self.cache = OrderedDict()
+        self.cache_bytes = 0
+        self.stats = {}
+        self.connectivity = None
+        self.lock = threading.Lock()
+
+    def get(self, url, params=None, conditional=True, **kwargs):
+        """Sends a GET request. Cacheable responses carrying an ETag or Last-Modified header are revalidated on
+        later calls to the same URL, unless conditional is False or the response is streamed."""
+        if not conditional or kwargs.get("stream"):
+            return self.request("GET", url, params=params, **kwargs)
+
+        cache_key = requests.Request("GET", url, params=params).prepare().url
+        with self.lock:
+            cached = self.cache.get(cache_key)
+
+        if cached is not None and not self._is_online(url):
+            logger.debug(f"Offline, using cached response. | url: {cache_key}")
+            record_stale_data(cached.fetched_at)
+            offline = copy.copy(cached)
+            offline.from_cache = True
+            return offline
+
+        headers = dict(kwargs.pop("headers", None) or {})
+        if cached is not None:
+            if cached.headers.get("ETag"):
+                headers["If-None-Match"] = cached.headers["ETag"]
+            if cached.headers.get("Last-Modified"):
+                headers["If-Modified-Since"] = cached.headers["Last-Modified"]
+
+        response = self.request("GET", url, params=params, headers=headers, **kwargs)
+        if response.status_code == 304 and cached is not None:
+            logger.debug(f"Not modified, using cached response. | url: {cache_key}")
+            with self.lock:
+                self.cache.move_to_end(cache_key)
+                cached.fetched_at = time.time()
+            not_modified = copy.copy(cached)
+            not_modified.from_cache = True
+            return not_modified
+
+        response.from_cache = False
+        response.fetched_at = time.time()
+        if self._is_cacheable(response):
+            with self.lock:
+                previous = self.cache.pop(cache_key, None)
+                if previous is not None:
+                    self.cache_bytes -= len(previous.content)
+                self.cache[cache_key] = response
+                self.cache_bytes += len(response.content)
+                while self.cache_bytes > self.max_cache_bytes:
+                    _, evicted = self.cache.popitem(last=False)
+                    self.cache_bytes -= len(evicted.content)
+        return response
+
+    def head(self, url, **kwargs):
+        kwargs.setdefault("allow_redirects", True)
+        return self.request("HEAD", url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request("POST", url, **kwargs)
+
+    def request(self, method, url, **kwargs):
+        """Sends a request through the shared session, applying the default timeout and recording statistics."""
+        kwargs.setdefault("timeout", DEFAULT_TIMEOUT)
+        parts = urlsplit(url)
+        host = parts.netloc
+        monitored = self.connectivity is not None and not is_private_host(parts.hostname or "")
+        if monitored and not self.connectivity.is_online():
+            raise OfflineRequestError(f"Device is offline, not sending {method} request to {host}")
+        start = time.monotonic()
+        try:
+            response = self.session.request(method, url, **kwargs)
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+            self._record(host, time.monotonic() - start, 0, error=True)
+            if monitored:
+                self.connectivity.report_failure(parts.hostname, parts.port or (443 if parts.scheme == "https" else 80))
+            raise
+        except requests.exceptions.RequestException:
+            self._record(host, time.monotonic() - start, 0, error=True)
+            raise
+
+        if monitored:
+            self.connectivity.report_success()
+        received = 0 if kwargs.get("stream") else len(response.content)
+        self._record(host, time.monotonic() - start, received, not_modified=response.status_code == 304)
+        return response
+
+    def get_stats(self):
+        """Returns per-host counters with the average latency in milliseconds."""
+        with self.lock:
+            stats = {}
+            for host, counters in self.stats.items():
+                host_stats = dict(counters)
+                host_stats["avg_latency_ms"] = round(1000 * counters["latency_seconds"] / max(counters["requests"], 1), 1)
+                stats[host] = host_stats
+            return stats
+
+    def clear_cache(self):
+        with self.lock:
+            self.cache.clear()
+            self.cache_bytes = 0
+
+    def _is_online(self, url):
+        if self.connectivity is None or is_private_host(urlsplit(url).hostname or ""):
+            return True
+        return self.connectivity.is_online()
+
+    def _is_cacheable(self, response):
+        if response.status_code != 200:
+            return False
+        if not (response.headers.get("ETag") or response.headers.get("Last-Modified")):
+            return False
+        if "no-store" in response.headers.get("Cache-Control", ""):
+            return False
+        return len(response.content) <= self.max_entry_bytes
+
+    def _record(self, host, latency, received, error=False, not_modified=False):
+        with self.lock:
+            counters = self.stats.setdefault(host, {
+                "requests": 0, "errors": 0, "not_modified": 0, "bytes_received": 0, "latency_seconds": 0.0
+            })
+            counters["requests"] += 1
+            counters["errors"] += int(error)
+            counters["not_modified"] += int(not_modified)
+            counters["bytes_received"] += received
+            counters["latency_seconds"] += latency
+
+HTTP_CLIENT = HttpClient()
+
+def get_http_client():
+    """Returns the HTTP client shared by all plugins."""
+    return HTTP_CLIENT
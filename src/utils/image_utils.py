@@ -1,17 +1,28 @@
-import requests
-from PIL import Image, ImageEnhance, ImageOps, ImageFilter
+from PIL import Image, ImageEnhance, ImageOps, ImageFilter, ImageDraw, ImageFont
 from io import BytesIO
 import os
+import re
+import time
 import logging
 import hashlib
 import tempfile
 import subprocess
 import numpy as np
 
+from utils.app_utils import resolve_path
+from utils.http_client import get_http_client, OfflineRequestError
+from utils.data_cache import record_stale_data
+
 logger = logging.getLogger(__name__)
 
+# remote images referenced by <img> tags and CSS url() in rendered HTML
+REMOTE_IMAGE_PATTERN = re.compile(r"""(?:<img\b[^>]*?\bsrc\s*=\s*["']|url\(\s*["']?)(https?://[^"'()\s]+)""", re.IGNORECASE)
+# localized images are downloaded again after this long
+LOCAL_IMAGE_MAX_AGE_SECONDS = 24 * 60 * 60
+MAX_LOCAL_IMAGES = 256
+
 def get_image(image_url):
-    response = requests.get(image_url)
+    response = get_http_client().get(image_url)
     img = None
     if 200 <= response.status_code < 300 or response.status_code == 304:
         img = Image.open(BytesIO(response.content))
@@ -19,6 +30,57 @@ def get_image(image_url):
         logger.error(f"Received non-200 response from {image_url}: status_code: {response.status_code}")
     return img
 
+def find_remote_images(html_str):
+    """Returns the remote image URLs referenced by <img> tags and CSS url() in html_str, as written in the HTML."""
+    return list(dict.fromkeys(REMOTE_IMAGE_PATTERN.findall(html_str)))
+
+def localize_image(image_url, max_size, cache_dir=None, max_age=LOCAL_IMAGE_MAX_AGE_SECONDS, cover=False):
+    """Downloads a remote image, downscales it to fit within max_size and saves it as a local PNG, reused for
+    max_age seconds. Returns the file path. With cover, the image is only downscaled until it still covers max_size,
+    for images that are cropped to fill the screen."""
+    cache_dir = cache_dir or resolve_path(os.path.join("cache", "images"))
+    mode = "cover" if cover else "fit"
+    name = hashlib.sha1(f"{image_url}|{max_size[0]}x{max_size[1]}|{mode}".encode("utf-8")).hexdigest()
+    path = os.path.join(cache_dir, f"{name}.png")
+    if os.path.isfile(path) and time.time() - os.path.getmtime(path) < max_age:
+        return path
+
+    try:
+        image = get_image(image_url)
+    except OfflineRequestError:
+        if os.path.isfile(path):
+            # an outdated copy beats no image while offline
+            record_stale_data(os.path.getmtime(path))
+            return path
+        raise
+    if image is None:
+        raise RuntimeError(f"Failed to download image {image_url}")
+    # JPEGs are decoded at a reduced scale, still at least max_size
+    image.draft(None, max_size)
+    if image.mode not in ("RGB", "RGBA", "L", "LA", "P"):
+        image = image.convert("RGB")
+    if cover:
+        scale = max(max_size[0] / image.width, max_size[1] / image.height)
+        if scale < 1:
+            image = image.resize((round(image.width * scale), round(image.height * scale)), Image.LANCZOS)
+    else:
+        # keeps the aspect ratio and never enlarges
+        image.thumbnail(max_size)
+
+    os.makedirs(cache_dir, exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    image.save(tmp_path, format="PNG")
+    os.replace(tmp_path, path)
+
+    files = [os.path.join(cache_dir, f) for f in os.listdir(cache_dir) if f.endswith(".png")]
+    if len(files) > MAX_LOCAL_IMAGES:
+        for old_path in sorted(files, key=os.path.getmtime)[:len(files) - MAX_LOCAL_IMAGES]:
+            try:
+                os.remove(old_path)
+            except OSError:
+                pass
+    return path
+
 def change_orientation(image, orientation, inverted=False):
     if orientation == 'horizontal':
         angle = 0
@@ -77,6 +139,25 @@ def apply_image_enhancement(img, image_settings={}):
 
     return img
 
+def add_stale_badge(image, text):
+    """Draws a small black-on-white label with text in the bottom right corner of the image."""
+    image = image.convert("RGB")
+    draw = ImageDraw.Draw(image)
+    font_size = max(12, image.height // 30)
+    try:
+        font = ImageFont.load_default(size=font_size)
+    except TypeError:
+        # Pillow < 10.1 only has the fixed size bitmap font
+        font = ImageFont.load_default()
+
+    left, top, right, bottom = draw.textbbox((0, 0), text, font=font)
+    padding = font_size // 3
+    width, height = right - left + 2 * padding, bottom - top + 2 * padding
+    x, y = image.width - width - padding, image.height - height - padding
+    draw.rectangle((x, y, x + width, y + height), fill="white", outline="black")
+    draw.text((x + padding - left, y + padding - top), text, font=font, fill="black")
+    return image
+
 def compute_image_hash(image):
     """Compute SHA-256 hash of an image."""
     image = image.convert("RGB")
@@ -0,0 +1,129 @@
+import os
+import json
+import logging
+import threading
+from collections import deque
+
+from utils.image_utils import localize_image
+
+logger = logging.getLogger(__name__)
+
+# pictures kept ready per pool
+DEFAULT_POOL_SIZE = 4
+# pooled pictures are kept on disk for this long, the pool is refilled well before
+POOL_IMAGE_MAX_AGE_SECONDS = 7 * 24 * 60 * 60
+
+def get_default_pool_dir():
+    src_dir = os.getenv("SRC_DIR") or os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    return os.path.join(src_dir, "cache", "picture_pools")
+
+class PicturePool:
+    """Keeps a few randomly chosen pictures resolved and downloaded ahead of need, so showing a random picture
+    is a local read.
+
+    resolve_fn(max_size) picks a random picture and returns the URL of an image suited to max_size, raising if the
+    picture can't be shown (EG: it is a video). Images are stored by localize_image, which also evicts old files.
+    The pool itself is saved under cache_dir, so pictures downloaded before a restart are still shown.
+    """
+
+    def __init__(self, name, resolve_fn, size=DEFAULT_POOL_SIZE, cover=False, cache_dir=None):
+        self.name = name
+        self.resolve_fn = resolve_fn
+        self.size = size
+        self.cover = cover
+        self.state_path = os.path.join(cache_dir or get_default_pool_dir(), f"{name}.json")
+        # local paths of the pictures not shown yet
+        self.pictures = deque()
+        self.max_size = None
+        self.filling = False
+        self.lock = threading.Lock()
+        self._load()
+
+    def take(self, max_size):
+        """Returns the local path of a pooled picture and refills the pool in the background. A picture is
+        resolved and downloaded right away when the pool is empty."""
+        path = None
+        with self.lock:
+            self._set_max_size(max_size)
+            while self.pictures and path is None:
+                path = self.pictures.popleft()
+                if not os.path.isfile(path):
+                    # evicted from the image cache
+                    path = None
+            self._save()
+
+        if path is None:
+            logger.info(f"Picture pool {self.name} is empty, fetching a picture now")
+            path = self._fetch_picture(max_size)
+        self.fill_in_background(max_size)
+        return path
+
+    def fill(self, max_size):
+        """Resolves and downloads pictures until the pool is full, unless another thread is already filling it.
+        Pictures that fail are skipped, up to size failures in a row."""
+        with self.lock:
+            if self.filling:
+                return
+            self.filling = True
+        try:
+            self._fill(max_size)
+        finally:
+            with self.lock:
+                self.filling = False
+
+    def fill_in_background(self, max_size):
+        with self.lock:
+            if self.filling or (self.max_size == tuple(max_size) and len(self.pictures) >= self.size):
+                return
+        threading.Thread(target=self.fill, args=(max_size,), daemon=True, name=f"pool-{self.name}").start()
+
+    def _fill(self, max_size):
+        failures = 0
+        while failures < self.size:
+            with self.lock:
+                self._set_max_size(max_size)
+                if len(self.pictures) >= self.size:
+                    return
+            try:
+                path = self._fetch_picture(max_size)
+            except Exception as e:
+                failures += 1
+                logger.warning(f"Failed to add a picture to pool {self.name}: {e}")
+                continue
+            failures = 0
+            with self.lock:
+                if self.max_size == tuple(max_size):
+                    self.pictures.append(path)
+                    self._save()
+
+    def _fetch_picture(self, max_size):
+        image_url = self.resolve_fn(max_size)
+        return localize_image(image_url, max_size, max_age=POOL_IMAGE_MAX_AGE_SECONDS, cover=self.cover)
+
+    def _set_max_size(self, max_size):
+        # pictures downloaded for another screen size are dropped
+        if self.max_size != tuple(max_size):
+            self.pictures.clear()
+            self.max_size = tuple(max_size)
+            self._save()
+
+    def _load(self):
+        try:
+            with open(self.state_path) as f:
+                state = json.load(f)
+            self.max_size = tuple(state["max_size"]) if state.get("max_size") else None
+            self.pictures = deque(path for path in state["pictures"] if os.path.isfile(path))
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logger.warning(f"Discarding unreadable picture pool {self.state_path}: {e}")
+
+    def _save(self):
+        try:
+            os.makedirs(os.path.dirname(self.state_path), exist_ok=True)
+            tmp_path = f"{self.state_path}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump({"max_size": self.max_size, "pictures": list(self.pictures)}, f)
+            os.replace(tmp_path, self.state_path)
+        except OSError as e:
+            logger.warning(f"Failed to save picture pool {self.name}: {e}")
@@ -0,0 +1,162 @@
+import os
+import json
+import time
+import hashlib
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+# (requests, period in seconds) allowed per provider and API key, based on the free plans. Override with the
+# "api_quotas" device setting, EG: {"unsplash": {"requests": 5000, "period": 3600}}
+DEFAULT_QUOTAS = {
+    "qweather": (1000, 24 * 60 * 60),
+    "openweathermap": (1000, 24 * 60 * 60),
+    "open_meteo": (10000, 24 * 60 * 60),
+    "nasa": (1000, 60 * 60),
+    "unsplash": (50, 60 * 60),
+    "github": (5000, 60 * 60),
+    "github_public": (60, 60 * 60),
+    "openai": (100, 24 * 60 * 60)
+}
+# bucket state is written at most this often to spare the SD card
+SAVE_INTERVAL_SECONDS = 60
+
+def get_default_quota_path():
+    src_dir = os.getenv("SRC_DIR") or os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    return os.path.join(src_dir, "cache", "quotas.json")
+
+class TokenBucket:
+    """Allows capacity requests per period, refilling continuously.
+
+    Attributes:
+        name (str): Bucket name, the provider followed by a short hash of the API key.
+        capacity (int): Maximum number of tokens.
+        period (float): Seconds to refill an empty bucket.
+        tokens (float): Tokens currently available.
+        updated (float): Epoch seconds when tokens was last refilled.
+    """
+
+    def __init__(self, name, capacity, period, tokens=None, updated=None, on_change=None):
+        self.name = name
+        self.capacity = capacity
+        self.period = period
+        self.tokens = capacity if tokens is None else min(tokens, capacity)
+        self.updated = updated or time.time()
+        self.on_change = on_change
+        self.lock = threading.Lock()
+
+    def try_acquire(self, count=1):
+        """Takes count tokens if available. Returns False, taking nothing, when the bucket is too low."""
+        with self.lock:
+            self._refill()
+            if self.tokens < count:
+                logger.warning(f"API quota for {self.name} exhausted, {self.get_seconds_until_available(count):.0f}s until the next request")
+                return False
+            self.tokens -= count
+        if self.on_change:
+            self.on_change()
+        return True
+
+    def get_remaining(self):
+        with self.lock:
+            self._refill()
+            return int(self.tokens)
+
+    def get_seconds_until_available(self, count=1):
+        return max(count - self.tokens, 0) * self.period / self.capacity
+
+    def to_dict(self):
+        return {"capacity": self.capacity, "period": self.period, "tokens": self.tokens, "updated": self.updated}
+
+    def _refill(self):
+        now = time.time()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.capacity / self.period)
+        self.updated = now
+
+class QuotaManager:
+    """Token buckets per provider and API key, shared by all plugin instances and persisted across restarts."""
+
+    def __init__(self, path=None, quotas=None):
+        self.path = path or get_default_quota_path()
+        self.quotas = dict(DEFAULT_QUOTAS if quotas is None else quotas)
+        self.buckets = {}
+        self.saved_state = self._load()
+        self.last_save = 0
+        self.lock = threading.Lock()
+
+    def configure(self, overrides):
+        """Applies {provider: {"requests": n, "period": seconds}} overrides to the default quotas."""
+        with self.lock:
+            for provider, quota in (overrides or {}).items():
+                self.quotas[provider] = (int(quota["requests"]), float(quota.get("period", 24 * 60 * 60)))
+            for bucket in self.buckets.values():
+                capacity, period = self.quotas[bucket.name.split(":")[0]]
+                bucket.capacity, bucket.period = capacity, period
+                bucket.tokens = min(bucket.tokens, capacity)
+
+    def get_bucket(self, provider, api_key=None):
+        """Returns the bucket for a provider and API key, or None if the provider has no quota."""
+        if provider not in self.quotas:
+            return None
+        name = provider
+        if api_key:
+            name += ":" + hashlib.sha1(api_key.encode("utf-8")).hexdigest()[:8]
+
+        with self.lock:
+            bucket = self.buckets.get(name)
+            if bucket is None:
+                capacity, period = self.quotas[provider]
+                saved = self.saved_state.get(name, {})
+                bucket = TokenBucket(name, capacity, period, saved.get("tokens"), saved.get("updated"),
+                                     on_change=self._save_soon)
+                self.buckets[name] = bucket
+            return bucket
+
+    def try_acquire(self, provider, api_key=None, count=1):
+        bucket = self.get_bucket(provider, api_key)
+        return bucket is None or bucket.try_acquire(count)
+
+    def get_status(self):
+        """Returns the remaining budget of every bucket used since startup."""
+        with self.lock:
+            buckets = list(self.buckets.values())
+        return [{
+            "name": bucket.name,
+            "remaining": bucket.get_remaining(),
+            "capacity": bucket.capacity,
+            "period": bucket.period
+        } for bucket in sorted(buckets, key=lambda b: b.name)]
+
+    def save(self):
+        with self.lock:
+            self.saved_state.update({name: bucket.to_dict() for name, bucket in self.buckets.items()})
+            self.last_save = time.time()
+            try:
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+                tmp_path = f"{self.path}.tmp"
+                with open(tmp_path, "w") as f:
+                    json.dump(self.saved_state, f)
+                os.replace(tmp_path, self.path)
+            except OSError as e:
+                logger.warning(f"Failed to save API quotas: {e}")
+
+    def _save_soon(self):
+        if time.time() - self.last_save >= SAVE_INTERVAL_SECONDS:
+            self.save()
+
+    def _load(self):
+        if not os.path.isfile(self.path):
+            return {}
+        try:
+            with open(self.path) as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Failed to read API quotas {self.path}: {e}")
+            return {}
+
+QUOTA_MANAGER = QuotaManager()
+
+def get_quota_manager():
+    """Returns the quota manager shared by all plugins."""
+    return QUOTA_MANAGER
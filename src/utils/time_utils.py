@@ -1,4 +1,5 @@
 import logging
+from datetime import timedelta
 
 logger = logging.getLogger(__name__)
 
@@ -12,4 +13,12 @@ def calculate_seconds(interval, unit):
         seconds = interval * 60 * 60 * 24
     else:
         logger.warning(f"Unrecognized unit: {unit}, defaulting to 5 minutes")
-    return seconds
\ No newline at end of file
+    return seconds
+
+def get_next_midnight(current_dt):
+    """Returns the start of the day after current_dt, in the same timezone."""
+    return (current_dt + timedelta(days=1)).replace(hour=0, minute=0, second=0, microsecond=0)
+
+def get_next_minute(current_dt):
+    """Returns the start of the minute after current_dt."""
+    return (current_dt + timedelta(minutes=1)).replace(second=0, microsecond=0)
@@ -0,0 +1,53 @@
+from src.utils.connectivity import (ConnectivityMonitor, FAILURES_BEFORE_OFFLINE, is_private_host,
+                                    parse_probe_target)
+
+class Probe:
+
+    def __init__(self, result):
+        self.result = result
+        self.targets = []
+
+    def __call__(self, host, port):
+        self.targets.append((host, port))
+        return self.result
+
+class TestConnectivityMonitor:
+
+    def test_goes_offline_after_consecutive_failures(self):
+        monitor = ConnectivityMonitor(probe=Probe(False))
+        for _ in range(FAILURES_BEFORE_OFFLINE - 1):
+            monitor.report_failure("api.example.com", 443)
+        assert monitor.is_online()
+
+        monitor.report_success()
+        for _ in range(FAILURES_BEFORE_OFFLINE):
+            monitor.report_failure("api.example.com", 443)
+        assert not monitor.is_online()
+
+    def test_probes_failed_host_and_notifies_on_recovery(self):
+        probe = Probe(False)
+        monitor = ConnectivityMonitor(probe=probe)
+        reconnects = []
+        monitor.add_listener(lambda: reconnects.append(True))
+        for _ in range(FAILURES_BEFORE_OFFLINE):
+            monitor.report_failure("api.example.com", 443)
+
+        assert not monitor.check()
+        probe.result = True
+        assert monitor.check()
+        assert probe.targets == [("api.example.com", 443)] * 2
+        assert monitor.is_online() and reconnects == [True]
+
+    def test_configured_probe_target(self):
+        probe = Probe(True)
+        monitor = ConnectivityMonitor(probe=probe, probe_target=parse_probe_target("1.1.1.1:53"))
+        monitor.report_failure("api.example.com", 443)
+        monitor.check()
+        assert probe.targets == [("1.1.1.1", 53)]
+
+    def test_private_hosts(self):
+        assert is_private_host("192.168.1.10")
+        assert is_private_host("nas.local")
+        assert is_private_host("localhost")
+        assert not is_private_host("api.openweathermap.org")
+        assert not is_private_host("8.8.8.8")
@@ -0,0 +1,188 @@
+import time
+import threading
+
+import pytest
+
+from src.utils.data_cache import (DataCache, GeoCache, OfflineError, QuotaExceededError, make_request_key,
+                                  prefetching, track_stale_data)
+from src.utils.quota import TokenBucket
+
+class Fetcher:
+
+    def __init__(self, *results):
+        self.results = list(results)
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        result = self.results.pop(0)
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+class Offline:
+
+    def is_online(self):
+        return False
+
+class TestDataCache:
+
+    def test_fresh_hit_skips_fetch(self, tmp_path):
+        cache = DataCache(str(tmp_path))
+        fetch = Fetcher({"temp": 20})
+        assert cache.get("weather", fetch, ttl=60) == {"temp": 20}
+        assert cache.get("weather", fetch, ttl=60) == {"temp": 20}
+        assert fetch.calls == 1
+
+    def test_disk_tier_survives_restart(self, tmp_path):
+        DataCache(str(tmp_path)).get("weather", Fetcher({"temp": 20}), ttl=60)
+
+        fetch = Fetcher()
+        assert DataCache(str(tmp_path)).get("weather", fetch, ttl=60) == {"temp": 20}
+        assert fetch.calls == 0
+
+    def test_expired_entry_is_refetched(self, tmp_path):
+        cache = DataCache(str(tmp_path))
+        fetch = Fetcher(1, 2)
+        cache.get("key", fetch, ttl=0)
+        assert cache.get("key", fetch, ttl=0) == 2
+
+    def test_stale_while_revalidate(self, tmp_path):
+        cache = DataCache(str(tmp_path))
+        cache.set("key", "old", ttl=0, stale_ttl=60)
+
+        fetch = Fetcher("new")
+        assert cache.get("key", fetch, ttl=0, stale_ttl=60) == "old"
+        cache.executor.shutdown(wait=True)
+        assert fetch.calls == 1
+        assert cache.memory["key"].data == "new"
+
+    def test_negative_caching(self, tmp_path):
+        cache = DataCache(str(tmp_path))
+        fetch = Fetcher(RuntimeError("upstream down"), "ok")
+        with pytest.raises(RuntimeError):
+            cache.get("key", fetch, ttl=60, negative_ttl=60)
+        with pytest.raises(RuntimeError, match="upstream down"):
+            cache.get("key", fetch, ttl=60, negative_ttl=60)
+        assert fetch.calls == 1
+
+        cache.negative["key"].time = time.time() - 61
+        assert cache.get("key", fetch, ttl=60, negative_ttl=60) == "ok"
+
+    def test_memory_tier_is_bounded(self, tmp_path):
+        cache = DataCache(str(tmp_path), max_memory_entries=2)
+        for key in ["a", "b", "c"]:
+            cache.set(key, key, ttl=60)
+        assert list(cache.memory) == ["b", "c"]
+        assert cache.get("a", Fetcher(), ttl=60) == "a"
+
+    def test_concurrent_fetches_are_coalesced(self, tmp_path):
+        cache = DataCache(str(tmp_path))
+        started = threading.Event()
+        release = threading.Event()
+        calls = []
+
+        def slow_fetch():
+            calls.append(1)
+            started.set()
+            release.wait(5)
+            return "shared"
+
+        results = []
+        owner = threading.Thread(target=lambda: results.append(cache.get("key", slow_fetch, ttl=60)))
+        owner.start()
+        started.wait(5)
+        waiter = threading.Thread(target=lambda: results.append(cache.get("key", slow_fetch, ttl=60)))
+        waiter.start()
+        while cache.get_stats()["coalesced"] == 0:
+            time.sleep(0.01)
+        release.set()
+        owner.join()
+        waiter.join()
+
+        assert results == ["shared", "shared"]
+        assert len(calls) == 1
+
+    def test_request_key_normalization(self):
+        first = make_request_key("https://api.example.com/v7/now", {"location": "1,2", "key": "secret", "unit": "m"})
+        second = make_request_key("https://api.example.com/v7/now", {"unit": "m", "location": "1,2", "key": "other"})
+        assert first == second
+        assert "secret" not in first
+        assert make_request_key("https://api.example.com/v7/now?unit=m&key=abc", {"location": "1,2"}) == first
+
+    def test_exhausted_quota_serves_cached_data(self, tmp_path):
+        cache = DataCache(str(tmp_path))
+        quota = TokenBucket("qweather", 1, 24 * 60 * 60)
+        cache.get("key", Fetcher("first"), ttl=0, quota=quota)
+
+        fetch = Fetcher("second")
+        assert cache.get("key", fetch, ttl=0, quota=quota) == "first"
+        assert fetch.calls == 0
+        with pytest.raises(QuotaExceededError):
+            cache.get("other", fetch, ttl=0, quota=quota)
+
+    def test_prefetch_refetches_data_expiring_before_use(self, tmp_path):
+        cache = DataCache(str(tmp_path))
+        fetch = Fetcher(1, 2)
+        cache.get("key", fetch, ttl=60, stale_ttl=600)
+
+        with prefetching(time.time() + 30):
+            assert cache.get("key", fetch, ttl=60, stale_ttl=600) == 1
+        with prefetching(time.time() + 120):
+            assert cache.get("key", fetch, ttl=60, stale_ttl=600) == 2
+        assert fetch.calls == 2
+        assert cache.get("key", Fetcher(), ttl=60) == 2
+
+    def test_offline_serves_last_known_good_data(self, tmp_path):
+        cache = DataCache(str(tmp_path))
+        cache.get("key", Fetcher("cached"), ttl=0)
+        cache.connectivity = Offline()
+
+        fetch = Fetcher()
+        with track_stale_data() as stale_data:
+            assert cache.get("key", fetch, ttl=0) == "cached"
+            with pytest.raises(OfflineError):
+                cache.get("other", fetch, ttl=0)
+        assert fetch.calls == 0
+        assert stale_data.stale_since is not None
+
+    def test_fresh_data_is_not_stale(self, tmp_path):
+        cache = DataCache(str(tmp_path))
+        with track_stale_data() as stale_data:
+            cache.get("key", Fetcher("fresh"), ttl=60)
+            cache.get("key", Fetcher(), ttl=60)
+        assert stale_data.stale_since is None
+
+    def test_tracks_expiry_of_data_read(self, tmp_path):
+        cache = DataCache(str(tmp_path))
+        cache.get("short", Fetcher("fresh"), ttl=60)
+        start = time.time()
+        with track_stale_data() as stale_data:
+            cache.get("short", Fetcher(), ttl=60)
+            cache.get("long", Fetcher("fetched"), ttl=600)
+        assert start < stale_data.expires_at <= start + 60
+
+    def test_stale_hit_tracks_past_expiry(self, tmp_path):
+        cache = DataCache(str(tmp_path))
+        cache.get("key", Fetcher("stale"), ttl=0, stale_ttl=600)
+        with track_stale_data() as stale_data:
+            assert cache.get("key", Fetcher("refreshed"), ttl=60, stale_ttl=600) == "stale"
+        assert stale_data.expires_at <= time.time()
+
+class TestGeoCache:
+
+    def test_lookup_is_persisted_by_rounded_coordinates(self, tmp_path):
+        path = str(tmp_path / "geo_cache.json")
+        fetch = Fetcher("Beijing")
+        assert GeoCache(path).lookup("qweather", "39.9042", "116.4074", fetch, "en") == "Beijing"
+
+        cache = GeoCache(path)
+        assert cache.lookup("qweather", 39.9049, 116.4071, fetch, "en") == "Beijing"
+        assert fetch.calls == 1
+        assert cache.get("qweather", 39.9042, 116.4074, "zh") is None
+
+    def test_empty_result_is_not_cached(self, tmp_path):
+        cache = GeoCache(str(tmp_path / "geo_cache.json"))
+        fetch = Fetcher("", "Paris")
+        assert cache.lookup("openweathermap", 48.85, 2.35, fetch) == ""
+        assert cache.lookup("openweathermap", 48.85, 2.35, fetch) == "Paris"
@@ -0,0 +1,69 @@
+import os
+
+from src.utils.folder_index import FolderIndex, get_shape
+
+class Reader:
+
+    def __init__(self, sizes=None):
+        self.sizes = sizes or {}
+        self.paths = []
+
+    def __call__(self, path):
+        self.paths.append(os.path.basename(path))
+        return self.sizes.get(os.path.basename(path), (800, 480, 1))
+
+def make_folder(tmp_path, *names):
+    folder = tmp_path / "photos"
+    for name in names:
+        (folder / name).parent.mkdir(parents=True, exist_ok=True)
+        (folder / name).write_bytes(b"")
+    return folder
+
+class TestFolderIndex:
+
+    def test_draws_every_image_once_per_cycle(self, tmp_path):
+        folder = make_folder(tmp_path, "a.jpg", "b.png", "2024/c.jpg", ".hidden.jpg", "notes.txt")
+        index = FolderIndex(str(folder), Reader(), str(tmp_path / "index"))
+
+        drawn = [os.path.relpath(index.draw(), folder) for _ in range(3)]
+        assert sorted(drawn) == ["2024/c.jpg", "a.jpg", "b.png"]
+        assert index.draw() is not None
+
+    def test_rescan_only_reads_new_images(self, tmp_path):
+        folder = make_folder(tmp_path, "a.jpg", "2024/b.jpg")
+        FolderIndex(str(folder), Reader(), str(tmp_path / "index")).refresh()
+
+        (folder / "2024" / "c.jpg").write_bytes(b"")
+        os.utime(folder / "2024", (0, 0))
+        reader = Reader()
+        index = FolderIndex(str(folder), reader, str(tmp_path / "index"))
+        index.refresh()
+        assert reader.paths == ["c.jpg"]
+        assert len(index.images) == 3
+
+    def test_deck_position_survives_restart(self, tmp_path):
+        folder = make_folder(tmp_path, "a.jpg", "b.jpg")
+        first = FolderIndex(str(folder), Reader(), str(tmp_path / "index")).draw()
+        second = FolderIndex(str(folder), Reader(), str(tmp_path / "index")).draw()
+        assert {first, second} == {str(folder / "a.jpg"), str(folder / "b.jpg")}
+
+    def test_draw_filters_by_shape(self, tmp_path):
+        folder = make_folder(tmp_path, "wide.jpg", "tall.jpg", "rotated.jpg")
+        sizes = {"tall.jpg": (480, 800, 1), "rotated.jpg": (800, 480, 6)}
+        index = FolderIndex(str(folder), Reader(sizes), str(tmp_path / "index"))
+
+        drawn = {os.path.basename(index.draw("portrait")) for _ in range(2)}
+        assert drawn == {"tall.jpg", "rotated.jpg"}
+        assert os.path.basename(index.draw("landscape")) == "wide.jpg"
+
+    def test_skips_deleted_images(self, tmp_path):
+        folder = make_folder(tmp_path, "a.jpg", "b.jpg")
+        index = FolderIndex(str(folder), Reader(), str(tmp_path / "index"))
+        index.refresh()
+        os.remove(folder / "a.jpg")
+        assert index.draw() == str(folder / "b.jpg")
+
+    def test_get_shape(self):
+        assert get_shape(800, 480) == "landscape"
+        assert get_shape(800, 480, 8) == "portrait"
+        assert get_shape(500, 500) == "square"
@@ -0,0 +1,74 @@
+import itertools
+
+import pytest
+
+from src.utils.generation_queue import GenerationQueue, make_key
+
+class Generator:
+
+    def __init__(self):
+        self.counter = itertools.count(1)
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        return {"text": f"response {next(self.counter)}"}
+
+class TestGenerationQueue:
+
+    def test_take_serves_pre_generated_items_in_order(self, tmp_path):
+        queue = GenerationQueue("ai_text", str(tmp_path), max_backlog=2)
+        generate = Generator()
+        queue.fill("key", generate)
+        assert queue.get_backlog("key") == 2
+
+        queue.fill_in_background = lambda key, generate_fn: None
+        assert queue.take("key", generate) == {"text": "response 1"}
+        assert queue.take("key", generate) == {"text": "response 2"}
+        assert generate.calls == 2
+
+    def test_take_generates_when_empty_and_refills(self, tmp_path):
+        queue = GenerationQueue("ai_text", str(tmp_path))
+        generate = Generator()
+        refills = []
+        queue.fill_in_background = lambda key, generate_fn: refills.append(key)
+
+        assert queue.take("key", generate) == {"text": "response 1"}
+        assert refills == ["key"]
+
+    def test_take_without_refill(self, tmp_path):
+        queue = GenerationQueue("ai_text", str(tmp_path))
+        refills = []
+        queue.fill_in_background = lambda key, generate_fn: refills.append(key)
+
+        assert queue.take("key", Generator(), refill=False) == {"text": "response 1"}
+        assert refills == []
+
+    def test_backlog_survives_restart(self, tmp_path):
+        GenerationQueue("ai_text", str(tmp_path)).fill("key", Generator())
+
+        queue = GenerationQueue("ai_text", str(tmp_path))
+        queue.fill_in_background = lambda key, generate_fn: None
+        generate = Generator()
+        assert queue.take("key", generate) == {"text": "response 1"}
+        assert generate.calls == 0
+
+    def test_fill_raises_generation_errors(self, tmp_path):
+        queue = GenerationQueue("ai_text", str(tmp_path))
+
+        def fail():
+            raise RuntimeError("Open AI quota exhausted, try again later.")
+
+        with pytest.raises(RuntimeError):
+            queue.fill("key", fail)
+        assert queue.get_backlog("key") == 0
+        # the failed fill does not block the next one
+        queue.fill("key", Generator())
+        assert queue.get_backlog("key") == 1
+
+    def test_keys_separate_settings(self, tmp_path):
+        queue = GenerationQueue("ai_text", str(tmp_path))
+        first, second = make_key("gpt-4o", "a haiku"), make_key("gpt-4o", "a limerick")
+        assert first != second
+        queue.fill(first, Generator())
+        assert queue.get_backlog(second) == 0
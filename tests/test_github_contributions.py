@@ -0,0 +1,114 @@
+import os
+import sys
+import copy
+from datetime import date, datetime, timedelta
+
+import pytest
+
+pytest.importorskip("numpy")
+pytest.importorskip("requests")
+# plugins import their helpers relative to src, as when the app runs
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+from plugins.github.github_contributions import calculate_metrics, parse_contributions
+
+COLORS = ["#ebedf0", "#9be9a8", "#40c463", "#30a14e", "#216e39"]
+
+def make_data(counts, end=None):
+    """Returns a contribution calendar response with one day per count, the last one on end (default today)."""
+    end = end or date.today()
+    days = [{"date": (end - timedelta(days=len(counts) - 1 - i)).isoformat(), "contributionCount": count}
+            for i, count in enumerate(counts)]
+    weeks = [{"contributionDays": days[i:i + 7]} for i in range(0, len(days), 7)]
+    return {"data": {"user": {"contributionsCollection": {"contributionCalendar": {"weeks": weeks}}}}}
+
+# the pure Python implementation the NumPy one replaced
+
+def reference_parse_contributions(data, colors):
+    weeks = data["data"]["user"]["contributionsCollection"]["contributionCalendar"]["weeks"]
+
+    grid = [[day for day in week["contributionDays"]] for week in weeks]
+    max_contrib = max(day["contributionCount"] for week in grid for day in week)
+
+    def get_color(count):
+        if max_contrib == 0 or count == 0:
+            return colors[0]
+        level = int((count / max_contrib) * (len(colors) - 1))
+        return colors[max(1, level)]
+
+    for week in grid:
+        for day in week:
+            day["color"] = get_color(day["contributionCount"])
+
+    month_positions = []
+    seen_months = set()
+    for i, week in enumerate(weeks):
+        dt = datetime.strptime(week["contributionDays"][0]["date"], "%Y-%m-%d")
+        month_year = f"{dt.strftime('%b')}-{dt.year}"
+        if month_year not in seen_months:
+            month_positions.append({"name": dt.strftime("%b"), "index": i})
+            seen_months.add(month_year)
+
+    if month_positions:
+        month_positions.pop(0)
+
+    return grid, month_positions
+
+def reference_calculate_metrics(data):
+    weeks = data["data"]["user"]["contributionsCollection"]["contributionCalendar"]["weeks"]
+    days = sorted((day for week in weeks for day in week["contributionDays"]), key=lambda d: d["date"])
+
+    total = sum(day["contributionCount"] for day in days)
+    streak, longest_streak, current_streak = 0, 0, 0
+    today = date.today()
+    yesterday = today - timedelta(days=1)
+    in_current_streak = False
+
+    for day in days:
+        day_date = date.fromisoformat(day["date"])
+        if day["contributionCount"] > 0:
+            streak += 1
+            longest_streak = max(longest_streak, streak)
+            if day_date in (today, yesterday) or in_current_streak:
+                current_streak = streak
+                in_current_streak = True
+        else:
+            streak = 0
+            in_current_streak = False
+
+    return [
+        {"title": "Contributions", "value": total},
+        {"title": "Current Streak", "value": current_streak},
+        {"title": "Longest Streak", "value": longest_streak},
+    ]
+
+CALENDARS = {
+    "streak through today": [1, 2, 0, 3, 3, 3, 3, 0, 0, 1, 1, 5, 2, 2],
+    "streak ending yesterday": [4, 0, 1, 1, 7, 2, 0, 1, 1, 1, 2, 3, 3, 0],
+    "streak ended before yesterday": [2, 2, 2, 2, 0, 1, 0, 0, 0],
+    "all zero year": [0] * 365,
+    "busy year": [(i * 7) % 11 for i in range(365)],
+}
+
+class TestContributions:
+
+    @pytest.mark.parametrize("name", CALENDARS)
+    def test_metrics_match_reference(self, name):
+        data = make_data(CALENDARS[name])
+        assert calculate_metrics(copy.deepcopy(data)) == reference_calculate_metrics(copy.deepcopy(data))
+
+    @pytest.mark.parametrize("name", CALENDARS)
+    def test_grid_matches_reference(self, name):
+        data = make_data(CALENDARS[name])
+        assert parse_contributions(copy.deepcopy(data), COLORS) == \
+            reference_parse_contributions(copy.deepcopy(data), COLORS)
+
+    def test_streak_ending_yesterday_is_current(self):
+        metrics = calculate_metrics(make_data(CALENDARS["streak ending yesterday"]))
+        assert metrics[1] == {"title": "Current Streak", "value": 6}
+
+    def test_all_zero_year(self):
+        data = make_data(CALENDARS["all zero year"])
+        assert [metric["value"] for metric in calculate_metrics(data)] == [0, 0, 0]
+        grid, _ = parse_contributions(data, COLORS)
+        assert {day["color"] for week in grid for day in week} == {COLORS[0]}
@@ -1,6 +1,7 @@
 import pytest
+from datetime import datetime, timedelta
 
-from src.model import Playlist
+from src.model import Playlist, PlaylistManager
 
 class TestPlaylist:
 
@@ -49,4 +50,55 @@ class TestPlaylist:
         playlist = Playlist("Test Playlist", start, end)
         assert playlist.is_active(current) == expected
         assert playlist.get_priority() == priority
-        
\ No newline at end of file
+        
+class TestPlaylistManagerTimeline:
+
+    @staticmethod
+    def at(time_str):
+        return datetime.strptime(f"2025-01-01 {time_str}", "%Y-%m-%d %H:%M")
+
+    def make_manager(self, windows):
+        return PlaylistManager([Playlist(name, start, end) for name, start, end in windows])
+
+    @pytest.mark.parametrize(
+        "current,expected",
+        [
+            ("00:00", "Night"),
+            ("02:59", "Night"),
+            ("03:00", "Default"),
+            ("09:00", "Work"),
+            ("14:59", "Work"),
+            ("15:00", "Default"),
+            ("21:00", "Night"),
+            ("23:59", "Night"),
+        ]
+    )
+    def test_active_playlist(self, current, expected):
+        manager = self.make_manager([("Default", "00:00", "24:00"), ("Work", "09:00", "15:00"), ("Night", "21:00", "03:00")])
+        assert manager.determine_active_playlist(self.at(current)).name == expected
+
+    def test_active_playlist_matches_priority_sort(self):
+        manager = self.make_manager([("A", "06:00", "18:00"), ("B", "12:00", "20:00"), ("C", "22:00", "02:00")])
+        for minute in range(0, 24 * 60):
+            current = self.at(f"{minute // 60:02d}:{minute % 60:02d}")
+            active = [p for p in manager.playlists if p.is_active(current.strftime("%H:%M"))]
+            active.sort(key=lambda p: p.get_priority())
+            expected = active[0] if active else None
+            assert manager.determine_active_playlist(current) is expected
+
+    def test_next_transition(self):
+        manager = self.make_manager([("Default", "00:00", "24:00"), ("Night", "21:00", "03:00")])
+        assert manager.get_next_transition(self.at("12:30")) == self.at("21:00")
+        assert manager.get_next_transition(self.at("21:00")) == self.at("03:00") + timedelta(days=1)
+        assert manager.get_next_transition(self.at("01:00")) == self.at("03:00")
+
+    def test_no_transition_for_all_day_playlist(self):
+        manager = self.make_manager([("Default", "00:00", "24:00")])
+        assert manager.get_next_transition(self.at("12:30")) is None
+        assert manager.get_transitions(self.at("12:30"), self.at("12:30") + timedelta(days=1)) == []
+
+    def test_timeline_rebuilt_after_update(self):
+        manager = self.make_manager([("Default", "00:00", "24:00"), ("Work", "09:00", "15:00")])
+        assert manager.determine_active_playlist(self.at("16:00")).name == "Default"
+        manager.update_playlist("Work", "Work", "09:00", "17:00")
+        assert manager.determine_active_playlist(self.at("16:00")).name == "Work"
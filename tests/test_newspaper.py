@@ -0,0 +1,31 @@
+import os
+import sys
+
+import pytest
+
+pytest.importorskip("PIL")
+pytest.importorskip("requests")
+# plugins import their helpers relative to src, as when the app runs
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+from PIL import Image
+
+from utils import image_utils
+from utils.image_utils import localize_image, resize_image
+from plugins.newspaper.newspaper import get_localized_size
+
+class TestNewspaper:
+
+    @pytest.mark.parametrize("resolution", [(800, 480), (480, 800)])
+    def test_localized_front_page_is_never_upscaled(self, tmp_path, monkeypatch, resolution):
+        # a scanned front page, several thousand pixels tall
+        monkeypatch.setattr(image_utils, "get_image", lambda url: Image.new("RGB", (2550, 4200), "white"))
+
+        path = localize_image("https://cdn.example.com/NY_NYT.jpg", get_localized_size(resolution),
+                              cache_dir=str(tmp_path), cover=True)
+        with Image.open(path) as image:
+            assert image.width >= max(resolution)
+            assert image.width < 2550
+            # the display keeps the full width and crops the height
+            displayed = resize_image(image, (800, 480), ["keep-width"])
+        assert displayed.size == (800, 480)
@@ -0,0 +1,46 @@
+import time
+
+from src.utils.quota import QuotaManager, TokenBucket
+
+class TestTokenBucket:
+
+    def test_empties_and_refills(self):
+        bucket = TokenBucket("unsplash", 2, 3600)
+        assert bucket.try_acquire()
+        assert bucket.try_acquire()
+        assert not bucket.try_acquire()
+
+        bucket.updated -= 1800
+        assert bucket.get_remaining() == 1
+        assert bucket.try_acquire()
+
+    def test_count_is_all_or_nothing(self):
+        bucket = TokenBucket("openai", 3, 3600)
+        assert not bucket.try_acquire(4)
+        assert bucket.get_remaining() == 3
+
+class TestQuotaManager:
+
+    def test_buckets_are_per_api_key(self, tmp_path):
+        manager = QuotaManager(str(tmp_path / "quotas.json"), {"unsplash": (1, 3600)})
+        assert manager.try_acquire("unsplash", "key-a")
+        assert not manager.try_acquire("unsplash", "key-a")
+        assert manager.try_acquire("unsplash", "key-b")
+        assert manager.try_acquire("unknown")
+
+    def test_state_survives_restart(self, tmp_path):
+        path = str(tmp_path / "quotas.json")
+        manager = QuotaManager(path, {"nasa": (10, 24 * 60 * 60)})
+        manager.get_bucket("nasa", "secret").try_acquire(4)
+        manager.save()
+        assert "secret" not in open(path).read()
+
+        restarted = QuotaManager(path, {"nasa": (10, 24 * 60 * 60)})
+        assert restarted.get_bucket("nasa", "secret").get_remaining() == 6
+
+    def test_configure_overrides_defaults(self, tmp_path):
+        manager = QuotaManager(str(tmp_path / "quotas.json"), {"unsplash": (50, 3600)})
+        bucket = manager.get_bucket("unsplash")
+        manager.configure({"unsplash": {"requests": 5, "period": 3600}})
+        assert bucket.capacity == 5
+        assert manager.get_status()[0]["remaining"] == 5
@@ -0,0 +1,65 @@
+import json
+
+from src.runtime_state import RuntimeStateStore
+from src.model import PluginInstance
+
+class TestRuntimeStateStore:
+
+    def test_replays_last_value(self, tmp_path):
+        path = tmp_path / "state.jsonl"
+        store = RuntimeStateStore(str(path))
+        store.set("refresh_info", {"plugin_id": "clock"})
+        store.set("refresh_info", {"plugin_id": "weather"})
+        store.set("playlist:Default", {"current_plugin_index": 2})
+        store.delete("playlist:Default")
+
+        reloaded = RuntimeStateStore(str(path))
+        assert reloaded.get("refresh_info") == {"plugin_id": "weather"}
+        assert reloaded.get("playlist:Default") is None
+
+    def test_unchanged_values_are_not_appended(self, tmp_path):
+        path = tmp_path / "state.jsonl"
+        store = RuntimeStateStore(str(path))
+        assert store.update({"a": 1, "b": 2}) == 2
+        assert store.update({"a": 1, "b": 3}) == 1
+        assert len(path.read_text().splitlines()) == 3
+
+    def test_ignores_truncated_record(self, tmp_path):
+        path = tmp_path / "state.jsonl"
+        path.write_text(json.dumps({"key": "a", "value": 1}) + "\n" + '{"key": "b", "val')
+        store = RuntimeStateStore(str(path))
+        assert store.get("a") == 1
+        assert store.get("b") is None
+
+    def test_compaction(self, tmp_path):
+        path = tmp_path / "state.jsonl"
+        store = RuntimeStateStore(str(path))
+        for i in range(RuntimeStateStore.COMPACT_MIN_RECORDS + 10):
+            store.set("counter", i)
+
+        assert len(path.read_text().splitlines()) < RuntimeStateStore.COMPACT_MIN_RECORDS
+        assert RuntimeStateStore(str(path)).get("counter") == RuntimeStateStore.COMPACT_MIN_RECORDS + 9
+
+class TestPluginInstanceRuntimeState:
+
+    def test_runtime_fields_excluded_from_config(self):
+        instance = PluginInstance("image_upload", "Photos", {"image_index": 3, "randomize": "false"},
+                                  {"interval": 60}, latest_refresh_time="2025-01-01T00:00:00+00:00")
+        # stored by the plugin during a refresh
+        instance.apply_runtime_state({"latest_refresh_time": instance.latest_refresh_time,
+                                      "settings": {"image_index": 3}})
+
+        config_dict = instance.to_dict(include_runtime=False)
+        assert "latest_refresh_time" not in config_dict
+        assert config_dict["plugin_settings"] == {"randomize": "false"}
+
+        restored = PluginInstance.from_dict(config_dict)
+        restored.apply_runtime_state(instance.get_runtime_state())
+        assert restored.to_dict() == instance.to_dict()
+
+    def test_any_key_changed_by_plugin_is_journaled(self):
+        instance = PluginInstance("custom", "Counter", {"color": "red"}, {"interval": 60})
+        instance.apply_runtime_state({"settings": {"index": 4}})
+
+        assert instance.get_runtime_state()["settings"] == {"index": 4}
+        assert instance.to_dict(include_runtime=False)["plugin_settings"] == {"color": "red"}
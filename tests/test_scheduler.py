@@ -0,0 +1,130 @@
+from datetime import datetime, timedelta, timezone
+
+from src.model import Playlist, PlaylistManager, PluginInstance
+from src.scheduler import RefreshScheduler
+
+NOW = datetime(2025, 1, 1, 12, 0, tzinfo=timezone.utc)
+
+def make_instance(name, refresh, latest_refresh_dt=None):
+    latest_refresh_time = latest_refresh_dt.isoformat() if latest_refresh_dt else None
+    return PluginInstance("clock", name, {}, refresh, latest_refresh_time=latest_refresh_time)
+
+class TestPluginInstanceNextRefresh:
+
+    def test_interval(self):
+        instance = make_instance("A", {"interval": 300}, NOW)
+        assert instance.get_next_refresh_dt(NOW) == NOW + timedelta(seconds=300)
+        assert not instance.should_refresh(NOW + timedelta(seconds=299))
+        assert instance.should_refresh(NOW + timedelta(seconds=300))
+
+    def test_scheduled(self):
+        instance = make_instance("A", {"scheduled": "07:00"}, NOW)
+        assert instance.get_next_refresh_dt(NOW) == datetime(2025, 1, 2, 7, 0, tzinfo=timezone.utc)
+
+        instance = make_instance("A", {"scheduled": "13:30"}, NOW)
+        assert instance.get_next_refresh_dt(NOW) == datetime(2025, 1, 1, 13, 30, tzinfo=timezone.utc)
+        assert not instance.should_refresh(datetime(2025, 1, 1, 13, 29, tzinfo=timezone.utc))
+
+    def test_valid_until_postpones_refresh(self):
+        instance = make_instance("A", {"interval": 300}, NOW)
+        instance.apply_runtime_state({"latest_refresh_time": NOW.isoformat(),
+                                      "valid_until": (NOW + timedelta(hours=2)).isoformat()})
+        assert instance.get_next_refresh_dt(NOW) == NOW + timedelta(hours=2)
+
+        # a hint shorter than the interval never causes extra refreshes
+        instance.apply_runtime_state({"latest_refresh_time": NOW.isoformat(),
+                                      "valid_until": (NOW + timedelta(seconds=60)).isoformat()})
+        assert instance.get_next_refresh_dt(NOW) == NOW + timedelta(seconds=300)
+
+    def test_next_scheduled_ignores_latest_refresh(self):
+        instance = make_instance("A", {"interval": 300, "scheduled": "12:02"}, NOW - timedelta(days=1))
+        assert instance.get_next_scheduled_dt(NOW) == NOW + timedelta(minutes=2)
+        assert instance.get_next_scheduled_dt(NOW + timedelta(minutes=2)) == NOW + timedelta(minutes=7)
+        assert make_instance("A", {}).get_next_scheduled_dt(NOW) is None
+
+    def test_never_refreshed(self):
+        instance = make_instance("A", {"interval": 300})
+        assert instance.should_refresh(NOW)
+
+class TestCircuitBreaker:
+
+    def test_backoff_doubles_up_to_max(self):
+        instance = make_instance("A", {"interval": 60}, NOW)
+        assert instance.record_failure(NOW) == NOW + timedelta(seconds=PluginInstance.BREAKER_BASE_SECONDS)
+        assert instance.record_failure(NOW) == NOW + timedelta(seconds=2 * PluginInstance.BREAKER_BASE_SECONDS)
+        for _ in range(20):
+            instance.record_failure(NOW)
+        assert instance.breaker_open_until == NOW + timedelta(seconds=PluginInstance.BREAKER_MAX_SECONDS)
+        assert instance.is_breaker_open(NOW)
+
+    def test_open_breaker_postpones_refresh(self):
+        instance = make_instance("A", {"interval": 60})
+        instance.record_failure(NOW)
+        instance.record_failure(NOW)
+        assert not instance.should_refresh(NOW)
+        assert instance.get_next_refresh_dt(NOW) == NOW + timedelta(seconds=2 * PluginInstance.BREAKER_BASE_SECONDS)
+
+    def test_state_persists_until_success(self):
+        instance = make_instance("A", {"interval": 60}, NOW)
+        instance.record_failure(NOW)
+
+        restored = make_instance("A", {"interval": 60}, NOW)
+        restored.apply_runtime_state(instance.get_runtime_state())
+        assert restored.failure_count == 1
+        assert restored.is_breaker_open(NOW)
+
+        restored.apply_runtime_state({"latest_refresh_time": NOW.isoformat()})
+        assert restored.failure_count == 0
+        assert not restored.is_breaker_open(NOW)
+
+class TestRefreshScheduler:
+
+    def make_manager(self):
+        playlists = [Playlist("Day", "00:00", "24:00"), Playlist("Night", "21:00", "03:00")]
+        playlists[0].plugins = [make_instance("Weather", {"interval": 300}, NOW),
+                                make_instance("Daily", {"scheduled": "07:00"}, NOW)]
+        playlists[1].plugins = [make_instance("Late", {"interval": 60}, NOW)]
+        return PlaylistManager(playlists)
+
+    def test_orders_instances_across_playlists(self):
+        manager = self.make_manager()
+        scheduler = RefreshScheduler()
+        scheduler.sync(manager, NOW)
+
+        assert scheduler.get_next_due_dt(timezone.utc) == NOW + timedelta(seconds=60)
+        due = scheduler.pop_due(NOW + timedelta(seconds=300))
+        assert [instance.name for _, instance in due] == ["Late", "Weather"]
+        assert scheduler.get_next_due_dt(timezone.utc) == datetime(2025, 1, 2, 7, 0, tzinfo=timezone.utc)
+
+    def test_sync_applies_edits(self):
+        manager = self.make_manager()
+        scheduler = RefreshScheduler()
+        scheduler.sync(manager, NOW)
+
+        manager.get_playlist("Night").delete_plugin("clock", "Late")
+        manager.find_plugin("clock", "Weather").refresh = {"interval": 30}
+        scheduler.sync(manager, NOW)
+
+        assert len(scheduler) == 2
+        due = scheduler.pop_due(NOW + timedelta(seconds=60))
+        assert [instance.name for _, instance in due] == ["Weather"]
+
+    def test_upcoming_does_not_consume_entries(self):
+        manager = self.make_manager()
+        scheduler = RefreshScheduler()
+        scheduler.sync(manager, NOW)
+
+        upcoming = scheduler.get_upcoming(NOW + timedelta(seconds=300))
+        assert [(due_dt, instance.name) for due_dt, _, instance in upcoming] == [
+            (NOW + timedelta(seconds=60), "Late"), (NOW + timedelta(seconds=300), "Weather")]
+        assert len(scheduler.pop_due(NOW + timedelta(seconds=300))) == 2
+
+    def test_reschedule_replaces_entry(self):
+        manager = self.make_manager()
+        scheduler = RefreshScheduler()
+        scheduler.sync(manager, NOW)
+
+        playlist = manager.get_playlist("Night")
+        late = playlist.find_plugin("clock", "Late")
+        scheduler.schedule(playlist, late, NOW + timedelta(hours=1))
+        assert [instance.name for _, instance in scheduler.pop_due(NOW + timedelta(seconds=300))] == ["Weather"]